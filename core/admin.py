@@ -1,5 +1,14 @@
-from django.contrib import admin
-from .models import Plant, CommonName, Phytochemical
+import tempfile
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import Plant, CommonName, Phytochemical, Reference, CompoundProperties, DatasetRelease, ChangeLog
+from .bulk import backfill_from_mapping, merge_duplicate_compounds, move_phytochemicals
+from . import releases, snapshot
 from django.db.models import Count
 
 
@@ -13,7 +22,7 @@ class CommonNameInline(admin.TabularInline):
 class PhytochemicalInline(admin.TabularInline):
     model = Phytochemical
     extra = 1
-    autocomplete_fields = ['plant']
+    autocomplete_fields = ['plant', 'reference']
 
 
 @admin.register(Plant)
@@ -25,6 +34,7 @@ class PlantAdmin(admin.ModelAdmin):
         'phytochemicals_count',
     )
     inlines = [CommonNameInline, PhytochemicalInline]
+    actions = ['merge_duplicates']
 
     # 🔹 IMPORTANT: annotate queryset
     def get_queryset(self, request):
@@ -42,6 +52,15 @@ class PlantAdmin(admin.ModelAdmin):
     phytochemicals_count.admin_order_field = 'phytochemicals_total'
     phytochemicals_count.short_description = "Number of Phytochemicals"
 
+    @admin.action(description="Merge case-insensitive duplicate compounds")
+    def merge_duplicates(self, request, queryset):
+        totals = merge_duplicate_compounds(plant_ids=queryset.values('pk'))
+        messages.success(
+            request,
+            f"Merged {totals['merged']} duplicate phytochemical(s), "
+            f"back-filled {totals['references']} reference(s)."
+        )
+
 
 
 # --- Common Name Admin ---
@@ -52,43 +71,289 @@ class CommonNameAdmin(admin.ModelAdmin):
     list_filter = ('plant',)
 
 
+# --- Reference Admin ---
+@admin.register(Reference)
+class ReferenceAdmin(admin.ModelAdmin):
+    search_fields = ('text', 'key')
+    list_display = ('text', 'key')
+
+
+# --- Compound Properties Admin ---
+@admin.register(CompoundProperties)
+class CompoundPropertiesAdmin(admin.ModelAdmin):
+    # Loaded from PubChem dumps with `load_pubchem`
+    search_fields = ('cid', 'inchikey', 'molecular_formula')
+    list_display = ('cid', 'molecular_formula', 'molecular_weight', 'inchikey', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+
+# --- Change Log Admin ---
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    # Append-only: written by core.changelog, never edited or deleted here
+    list_display = ('created_at', 'action', 'model', 'object_id', 'source', 'user')
+    list_filter = ('action', 'model', 'source')
+    search_fields = ('=object_id', 'source', 'user')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# --- Dataset Release Admin ---
+@admin.register(DatasetRelease)
+class DatasetReleaseAdmin(admin.ModelAdmin):
+    # Created by `publish_release`; only the notes are editable here
+    list_display = ('version', 'is_live', 'published_at', 'rolled_back_at', 'plants', 'phytochemicals', 'notes')
+    readonly_fields = ('version', 'created_at', 'published_at', 'rolled_back_at', 'data_version', 'plants', 'phytochemicals')
+    actions = ['make_live']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(boolean=True, description="Live")
+    def is_live(self, obj):
+        return obj.version == snapshot.current_version()
+
+    @admin.action(description="Make the selected release live")
+    def make_live(self, request, queryset):
+        if queryset.count() != 1:
+            messages.error(request, "Select exactly one release.")
+            return
+        release = queryset.get()
+        if not snapshot.exists(release.version):
+            messages.error(request, f"The snapshot of release {release} has been pruned.")
+            return
+        releases.activate(release)
+        messages.success(request, f"Release {release} is now live.")
+
+
 # --- Phytochemical Admin ---
+class PhytochemicalActionForm(ActionForm):
+    target_plant = forms.ModelChoiceField(
+        queryset=Plant.objects.order_by('scientific_name'),
+        required=False,
+        label="Target plant",
+    )
+
+
+class MappingUploadForm(forms.Form):
+    mapping = forms.FileField(
+        label="Mapping CSV",
+        help_text="Phytochemicals, CID and Reference columns, optionally Plant Name (as for bulk_cleanup backfill)",
+    )
+
+
 @admin.register(Phytochemical)
 class PhytochemicalAdmin(admin.ModelAdmin):
     search_fields = ('compound_name', 'cid', 'plant__scientific_name')
     list_display = ('compound_name', 'plant', 'cid', 'reference')
+    list_select_related = ('plant', 'reference')
     list_filter = ('plant',)
-    autocomplete_fields = ['plant']
+    autocomplete_fields = ['plant', 'reference']
+    action_form = PhytochemicalActionForm
+    actions = ['merge_duplicates', 'move_to_plant']
+
+    @admin.action(description="Merge case-insensitive duplicates within their plants")
+    def merge_duplicates(self, request, queryset):
+        totals = merge_duplicate_compounds(plant_ids=queryset.values('plant_id'))
+        messages.success(
+            request,
+            f"Merged {totals['merged']} duplicate phytochemical(s), "
+            f"back-filled {totals['references']} reference(s)."
+        )
+
+    @admin.action(description="Move selected phytochemicals to the target plant")
+    def move_to_plant(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        target = form.cleaned_data['target_plant'] if form.is_valid() else None
+        if target is None:
+            messages.error(request, "Choose a target plant to move the phytochemicals to.")
+            return
+
+        totals = move_phytochemicals(queryset, target)
+        messages.success(
+            request,
+            f"Moved {totals['moved']} phytochemical(s) to {target}; "
+            f"dropped {totals['dropped']} already present there."
+        )
+
+    # ---------- BACK-FILL ----------
+    def get_urls(self):
+        return [
+            path(
+                'backfill/',
+                self.admin_site.admin_view(self.backfill_view),
+                name='core_phytochemical_backfill',
+            ),
+        ] + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {'can_backfill': self.has_change_permission(request), **(extra_context or {})}
+        return super().changelist_view(request, extra_context)
+
+    def backfill_view(self, request):
+        """Fill empty CIDs and missing references from an uploaded mapping file."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = MappingUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # read_mapping takes a path; the upload may only be in memory
+            with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+                for chunk in form.cleaned_data['mapping'].chunks():
+                    f.write(chunk)
+                f.flush()
+                totals = backfill_from_mapping(f.name)
+            messages.success(
+                request,
+                f"Back-filled {totals['cids']} CID(s) and {totals['references']} reference(s)."
+            )
+            return redirect('admin:core_phytochemical_changelist')
+
+        return TemplateResponse(request, 'admin/core/phytochemical/backfill.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Back-fill CIDs and references",
+            'form': form,
+        })
 
 
 
 
 
 # admin.py
+import os
+import re
 from django.contrib import admin, messages
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.urls import path, reverse
 from .models import CSVUpload, Plant, CommonName, Phytochemical
 
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
 @admin.register(CSVUpload)
 class CSVUploadAdmin(admin.ModelAdmin):
-    list_display = ('file', 'uploaded_at')
-    readonly_fields = ('uploaded_at',)
+    list_display = ('file', 'uploaded_at', 'status', 'rows_committed')
+    readonly_fields = ('uploaded_at', 'status', 'rows_committed', 'current_plant', 'error')
+    actions = ['resume_import']
+
+    class Media:
+        js = ('js/csv_chunked_upload.js',)
+
+    def get_form(self, request, obj=None, **kwargs):
+        # Tell csv_chunked_upload.js where to send chunks and which upload
+        # the finished file belongs to
+        form = super().get_form(request, obj, **kwargs)
+        attrs = form.base_fields['file'].widget.attrs
+        attrs['data-chunk-url'] = reverse('admin:core_csvupload_upload_chunk')
+        if obj is not None:
+            attrs['data-upload-pk'] = obj.pk
+        return form
 
     def save_model(self, request, obj, form, change):
         """
-        Override save to import CSV automatically and show success message.
+        Queue the upload for the ``import_upload --watch`` worker; imports
+        are too long to run in a request.
         """
-        super().save_model(request, obj, form, change)  # Save first
+        # A replaced file starts again from the first row
+        if 'file' in form.changed_data:
+            obj.reset()
 
-        # Import CSV and get totals
-        totals = obj.import_csv()
+        super().save_model(request, obj, form, change)
+        if obj.status == CSVUpload.PENDING:
+            messages.info(request, f"{obj} is queued for import.")
 
-        # Display success message in admin
-        messages.success(
-            request,
-            f"CSV import complete: "
-            f"{totals['plants']} plant(s), "
-            f"{totals['common_names']} common name(s), "
-            f"{totals['phytochemicals']} phytochemical(s) imported."
-        )
+    @admin.action(description="Resume import from the last checkpoint")
+    def resume_import(self, request, queryset):
+        # Only failed uploads: an importing one may still have a worker on
+        # it (take over from a dead one with `import_upload --force <id>`)
+        queued = queryset.filter(status=CSVUpload.FAILED).update(status=CSVUpload.PENDING)
+        messages.info(request, f"{queued} upload(s) queued to resume from their last checkpoint.")
+
+    # ---------- CHUNKED UPLOAD ----------
+    def get_urls(self):
+        return [
+            path(
+                'upload-chunk/',
+                self.admin_site.admin_view(self.upload_chunk_view),
+                name='core_csvupload_upload_chunk',
+            ),
+        ] + super().get_urls()
+
+    def upload_chunk_view(self, request):
+        """
+        Resumable upload: the client appends chunks to a partial file at the
+        offset the server reports (GET), then posts ``complete=1`` to attach
+        it to the CSVUpload being edited (``upload_pk``) or a new one, which
+        is queued for import.
+        """
+        if request.method not in ('GET', 'POST'):
+            return HttpResponseNotAllowed(['GET', 'POST'])
+
+        params = request.POST if request.method == 'POST' else request.GET
+        obj = None
+        if params.get('upload_pk'):
+            obj = self.get_object(request, params['upload_pk'])
+            if obj is None:
+                return HttpResponseBadRequest("Invalid upload_pk")
+            if not self.has_change_permission(request, obj):
+                raise PermissionDenied
+        elif not self.has_add_permission(request):
+            raise PermissionDenied
+
+        upload_id = params.get('upload_id', '')
+        if not UPLOAD_ID_RE.match(upload_id):
+            return HttpResponseBadRequest("Invalid upload_id")
+
+        partial_dir = os.path.join(settings.MEDIA_ROOT, 'data', 'partial')
+        os.makedirs(partial_dir, exist_ok=True)
+        partial = os.path.join(partial_dir, upload_id + '.part')
+        size = os.path.getsize(partial) if os.path.exists(partial) else 0
+
+        if request.method == 'GET':
+            return JsonResponse({'offset': size})
+
+        chunk = request.FILES.get('chunk')
+        if chunk is not None:
+            try:
+                offset = int(params.get('offset', ''))
+            except ValueError:
+                return HttpResponseBadRequest("Invalid offset")
+            if offset != size:
+                # Client and server disagree; the client resumes from ours
+                return JsonResponse({'offset': size}, status=409)
+            with open(partial, 'ab') as f:
+                for piece in chunk.chunks():
+                    f.write(piece)
+            size = os.path.getsize(partial)
+
+        if params.get('complete') != '1':
+            return JsonResponse({'offset': size})
 
+        filename = os.path.basename(params.get('filename', '')) or upload_id + '.csv'
+        name = default_storage.get_available_name('data/' + filename)
+        os.replace(partial, default_storage.path(name))
 
+        if obj is None:
+            obj = CSVUpload(file=name)
+        else:
+            obj.file = name
+            obj.reset()
+        obj.save()
+        messages.info(request, f"{obj} uploaded and queued for import.")
+        return JsonResponse({
+            'offset': size,
+            'url': reverse('admin:core_csvupload_change', args=[obj.pk]),
+        })
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core import checks
+        from . import releases, signals  # noqa: F401
+
+        checks.register(releases.check_search_backend)
+
+        # Map the published snapshot at worker start rather than on the
+        # first search
+        if settings.SEARCH_BACKEND == 'snapshot':
+            from . import snapshot
+            snapshot.current()
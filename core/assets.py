@@ -0,0 +1,41 @@
+"""
+Third-party front-end assets. Each is served from its CDN, or, with
+``SELF_HOSTED_ASSETS``, from the copy ``vendor_assets`` keeps under
+static/vendor/ so WhiteNoise fingerprints, compresses and serves it with
+far-future cache headers.
+"""
+from django.conf import settings
+from django.templatetags.static import static
+
+# name -> (CDN url, path under static/)
+VENDOR_ASSETS = {
+    'bootstrap.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'vendor/bootstrap-5.3.0/css/bootstrap.min.css',
+    ),
+    'fontawesome.css': (
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/7.0.1/css/all.min.css',
+        'vendor/fontawesome-7.0.1/css/all.min.css',
+    ),
+    'datatables.css': (
+        'https://cdn.datatables.net/2.3.6/css/dataTables.dataTables.min.css',
+        'vendor/datatables-2.3.6/css/dataTables.dataTables.min.css',
+    ),
+    'jquery.js': (
+        'https://code.jquery.com/jquery-3.7.1.min.js',
+        'vendor/jquery-3.7.1/jquery.min.js',
+    ),
+    'bootstrap.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'vendor/bootstrap-5.3.0/js/bootstrap.bundle.min.js',
+    ),
+    'datatables.js': (
+        'https://cdn.datatables.net/2.3.6/js/dataTables.min.js',
+        'vendor/datatables-2.3.6/js/dataTables.min.js',
+    ),
+}
+
+
+def asset_url(name):
+    cdn_url, path = VENDOR_ASSETS[name]
+    return static(path) if settings.SELF_HOSTED_ASSETS else cdn_url
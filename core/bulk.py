@@ -0,0 +1,192 @@
+"""
+Set-based cleanup operations shared by the admin actions and the
+``bulk_cleanup`` command. Each runs in one transaction; updates are a
+handful of UPDATE statements instead of one save() per object and, since
+they send no signals, the rows they change are logged to the change log
+explicitly. Deletes go through Django's collector, which loads the doomed
+rows to send the per-object signals that log them; ``changelog.batched()``
+turns those entries into bulk inserts. ``deferred()`` wraps the
+transaction, so the data version is bumped once after it commits.
+"""
+import csv
+
+from django.db import connection, transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Lower
+
+from . import changelog, dataversion
+from .models import Phytochemical, Plant
+from .references import ReferenceCache
+
+
+def _ranked(qs):
+    # Within a (plant, lowercased name) group the row with a CID wins,
+    # then the lowest id
+    return qs.annotate(
+        lname=Lower('compound_name'),
+        has_cid=Case(When(cid='', then=Value(0)), default=Value(1), output_field=IntegerField()),
+    )
+
+
+def merge_duplicate_compounds(plant_ids=None):
+    """
+    Collapse case-insensitive duplicate compounds within each plant. Rows
+    merge into the best row with the same CID, and rows without a CID into
+    the best row of their name; rows with different CIDs are different
+    compounds and are all kept. Each kept row back-fills a missing
+    reference from the rows merged into it. Returns ``{'merged': deleted
+    rows, 'references': back-filled references}``.
+    """
+    rows = _ranked(Phytochemical.objects.all())
+    if plant_ids is not None:
+        rows = rows.filter(plant_id__in=plant_ids)
+
+    siblings = _ranked(Phytochemical.objects.all()).filter(
+        plant=OuterRef('plant'), lname=OuterRef('lname')
+    ).exclude(pk=OuterRef('pk'))
+    better = siblings.filter(
+        Q(has_cid__gt=OuterRef('has_cid')) |
+        Q(has_cid=OuterRef('has_cid'), pk__lt=OuterRef('pk'))
+    )
+    same_cid = Q(cid=OuterRef('cid'))
+    merged = rows.filter(Q(Exists(better), has_cid=0) | Q(Exists(better.filter(same_cid)), has_cid=1))
+
+    # (kept rows, which siblings merge into them): the best row of a name
+    # takes those with its CID or none, other rows with a CID their own CID
+    keepers = [
+        (rows.filter(~Exists(better)), same_cid | Q(cid='')),
+        (rows.filter(Exists(better), ~Exists(better.filter(same_cid)), has_cid=1), same_cid),
+    ]
+
+    with dataversion.deferred(), transaction.atomic(), changelog.source('merge_duplicates'), changelog.batched():
+        filled = 0
+        for kept, merging in keepers:
+            to_fill = Phytochemical.objects.filter(
+                pk__in=kept.filter(
+                    Exists(siblings.filter(merging, reference__isnull=False)), reference__isnull=True
+                ).values('pk')
+            )
+            # update() sends no signals, so the change log is written here
+            before = changelog.before_image(to_fill, ['reference_id'])
+            filled += to_fill.update(reference=Subquery(
+                _ranked(Phytochemical.objects.all())
+                .filter(merging, plant=OuterRef('plant'), lname=Lower(OuterRef('compound_name')))
+                .filter(reference__isnull=False)
+                .order_by('pk')
+                .values('reference')[:1]
+            ))
+            changelog.log_updates(Phytochemical, before, ['reference_id'])
+
+        deleted, _ = Phytochemical.objects.filter(pk__in=merged.values('pk')).delete()
+        dataversion.bump()
+
+    return {'merged': deleted, 'references': filled}
+
+
+def move_phytochemicals(queryset, target_plant):
+    """
+    Re-point the phytochemicals in ``queryset`` at ``target_plant``. Rows the
+    target already has (same compound name and CID) are dropped rather than
+    violating the unique constraint. Returns ``{'moved': n, 'dropped': n}``.
+    """
+    existing = Phytochemical.objects.filter(
+        plant=target_plant,
+        compound_name=OuterRef('compound_name'),
+        cid=OuterRef('cid'),
+    )
+    rows = queryset.exclude(plant=target_plant)
+
+    with dataversion.deferred(), transaction.atomic(), changelog.source('move_phytochemicals'), changelog.batched():
+        dropped, _ = Phytochemical.objects.filter(pk__in=rows.filter(Exists(existing)).values('pk')).delete()
+        to_move = Phytochemical.objects.filter(pk__in=rows.values('pk'))
+        before = changelog.before_image(to_move, ['plant_id'])
+        moved = to_move.update(plant=target_plant)
+        changelog.log_updates(Phytochemical, before, ['plant_id'])
+        dataversion.bump()
+
+    return {'moved': moved, 'dropped': dropped}
+
+
+def read_mapping(path):
+    """
+    Rows of a back-fill mapping CSV as ``(plant name, compound, cid,
+    reference)``; the headers match the import files and 'plant name' is
+    optional.
+    """
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+    except UnicodeDecodeError:
+        with open(path, encoding='latin1', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    for row in rows:
+        row = {k.strip().lower(): (v or '').replace('\xa0', '').strip() for k, v in row.items() if k}
+        compound = row.get('phytochemicals') or row.get('compound name', '')
+        if compound:
+            yield row.get('plant name', ''), compound, row.get('cid', ''), row.get('reference', '')
+
+
+def backfill_from_mapping(path):
+    """
+    Fill empty CIDs and missing references from a mapping file. The mapping
+    is staged into a temporary table and applied with two correlated
+    UPDATEs; plant-specific mapping rows take precedence over global ones.
+    Returns ``{'cids': n, 'references': n}``.
+    """
+    plants = dict(Plant.objects.values_list('scientific_name', 'id'))
+    references = ReferenceCache()
+    mapping = [
+        (plants.get(plant_name), compound, cid, references.resolve(reference))
+        for plant_name, compound, cid, reference in read_mapping(path)
+        if not plant_name or plant_name in plants
+    ]
+
+    qn = connection.ops.quote_name
+    table = qn(Phytochemical._meta.db_table)
+    pick = (
+        "FROM bulk_mapping m "
+        f"WHERE m.lname = LOWER({table}.compound_name) "
+        f"AND (m.plant_id IS NULL OR m.plant_id = {table}.plant_id) AND {{cond}} "
+        "ORDER BY (m.plant_id IS NULL), m.seq"
+    )
+    cid_pick = pick.format(cond="m.cid <> ''")
+    ref_pick = pick.format(cond="m.reference_id IS NOT NULL")
+
+    with dataversion.deferred(), transaction.atomic(), changelog.source('backfill'), connection.cursor() as cursor:
+        # Only rows missing a CID or reference can change
+        before = changelog.before_image(
+            Phytochemical.objects.filter(Q(cid='') | Q(reference__isnull=True)), ['cid', 'reference_id']
+        )
+        cursor.execute(
+            "CREATE TEMPORARY TABLE bulk_mapping "
+            "(seq INTEGER, plant_id BIGINT NULL, lname VARCHAR(255), cid VARCHAR(100), reference_id BIGINT NULL)"
+        )
+        cursor.executemany(
+            "INSERT INTO bulk_mapping (seq, plant_id, lname, cid, reference_id) VALUES (%s, %s, %s, %s, %s)",
+            [(i, *row) for i, row in enumerate(mapping)],
+        )
+        cursor.execute("UPDATE bulk_mapping SET lname = LOWER(lname)")
+        cursor.execute("CREATE INDEX bulk_mapping_lname ON bulk_mapping (lname)")
+
+        cursor.execute(
+            f"UPDATE {table} SET cid = (SELECT m.cid {cid_pick} LIMIT 1) "
+            f"WHERE cid = '' AND EXISTS (SELECT 1 {cid_pick}) "
+            f"AND NOT EXISTS (SELECT 1 FROM {table} q WHERE q.plant_id = {table}.plant_id "
+            f"AND q.compound_name = {table}.compound_name AND q.cid = (SELECT m.cid {cid_pick} LIMIT 1))"
+        )
+        cids = cursor.rowcount
+
+        cursor.execute(
+            f"UPDATE {table} SET reference_id = (SELECT m.reference_id {ref_pick} LIMIT 1) "
+            f"WHERE reference_id IS NULL AND EXISTS (SELECT 1 {ref_pick})"
+        )
+        refs = cursor.rowcount
+
+        # Temporary-table DDL is transactional, so a failure above rolls
+        # it back along with the updates
+        cursor.execute("DROP TABLE bulk_mapping")
+        changelog.log_updates(Phytochemical, before, ['cid', 'reference_id'])
+        dataversion.bump()
+
+    return {'cids': cids, 'references': refs}
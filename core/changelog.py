@@ -0,0 +1,190 @@
+"""
+Append-only change log of Plant, CommonName and Phytochemical writes.
+
+Model signals (see ``core.signals``) record every save and delete; the
+set-based operations in ``core.bulk`` that bypass signals log their rows
+explicitly with ``log_updates``. Entries carry the source of the change,
+set with ``source()`` (the middleware marks admin and web requests, the
+importers their CSVUpload or import run), and the user when known.
+
+Entries are always written inside the caller's transaction, so they
+commit or roll back with the rows they describe and never wait in memory
+after a commit. A ``batched()`` block inside a transaction buffers them
+and bulk-inserts them as it exits, dropping those logged in savepoints
+that rolled back; elsewhere they are written as they are logged. The
+set-based paths (``log_many``, ``log_updates``) bulk-insert theirs.
+
+Consumers that rebuild incrementally read ``changes_since(last id)``.
+"""
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from .models import ChangeLog
+
+BATCH_SIZE = 500
+
+Context = namedtuple('Context', ['source', 'user', 'request'])
+
+_context = ContextVar('changelog_context', default=Context('', '', None))
+_local = threading.local()
+
+
+@contextmanager
+def source(label=None, user=None, request=None):
+    """
+    Attribute changes inside the block to ``label`` (e.g. 'upload:12') and
+    ``user``; unset values are inherited from the enclosing block.
+    """
+    outer = _context.get()
+    token = _context.set(Context(
+        label if label is not None else outer.source,
+        user if user is not None else outer.user,
+        request if request is not None else outer.request,
+    ))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current():
+    """``(source, user)`` for a change made now."""
+    context = _context.get()
+    label, user = context.source, context.user
+    request = context.request
+    if request is not None:
+        if not label:
+            match = getattr(request, 'resolver_match', None)
+            label = 'admin' if match and match.namespace == 'admin' else 'web'
+        if not user and getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            user = request.user.get_username()
+    return label, user
+
+
+def serialize(instance):
+    """JSON-ready ``{column: value}`` of a model instance."""
+    return {f.attname: f.value_from_object(instance) for f in instance._meta.concrete_fields}
+
+
+def _entry(model, object_id, action, data):
+    label, user = current()
+    return ChangeLog(
+        model=model._meta.model_name,
+        object_id=object_id,
+        action=action,
+        data=data,
+        source=label,
+        user=user,
+    )
+
+
+class _Batch(list):
+    """
+    ``(entry, marker)`` pairs of a ``batched()`` block. Entries logged in a
+    savepoint opened inside the block get a no-op on_commit marker, which
+    Django discards if that savepoint rolls back.
+    """
+
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+        self.base = tuple(conn.savepoint_ids)
+        self.markers = {}
+
+    def add(self, entry):
+        sids = tuple(self.conn.savepoint_ids)
+        marker = None
+        if sids != self.base:
+            marker = self.markers.get(sids)
+            if marker is None:
+                marker = self.markers[sids] = lambda: None
+                transaction.on_commit(marker)
+        self.append((entry, marker))
+        # Flushing inside a savepoint would tie earlier entries to it
+        if len(self) >= BATCH_SIZE and sids == self.base:
+            self.flush()
+
+    def flush(self):
+        live = {id(callback[1]) for callback in self.conn.run_on_commit}
+        ChangeLog.objects.bulk_create(
+            [entry for entry, marker in self if marker is None or id(marker) in live],
+            batch_size=BATCH_SIZE,
+        )
+        self.clear()
+        self.markers.clear()
+
+
+@contextmanager
+def batched():
+    """
+    Buffer the entries logged inside the block and bulk-insert them when it
+    exits, still inside the enclosing transaction; discarded if the block
+    raises. Outside a transaction entries are written as they are logged.
+    """
+    conn = transaction.get_connection()
+    if getattr(_local, 'batch', None) is not None or not conn.in_atomic_block:
+        yield
+        return
+    batch = _local.batch = _Batch(conn)
+    try:
+        yield
+    finally:
+        _local.batch = None
+    batch.flush()
+
+
+def log(model, object_id, action, data):
+    entry = _entry(model, object_id, action, data)
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        batch.add(entry)
+    else:
+        entry.save()
+
+
+def log_many(model, changes, action):
+    """Log ``action`` for each ``(object_id, data)`` of ``changes`` in bulk inserts."""
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        for object_id, data in changes:
+            batch.add(_entry(model, object_id, action, data))
+        return
+    entries = []
+    for object_id, data in changes:
+        entries.append(_entry(model, object_id, action, data))
+        if len(entries) >= BATCH_SIZE:
+            ChangeLog.objects.bulk_create(entries)
+            entries = []
+    if entries:
+        ChangeLog.objects.bulk_create(entries)
+
+
+def before_image(queryset, fields):
+    """``{pk: (field values)}`` of ``queryset``, taken before a bulk update."""
+    return {pk: tuple(values) for pk, *values in queryset.values_list('pk', *fields).iterator()}
+
+
+def log_updates(model, before, fields):
+    """Log an update for each row of ``before`` whose ``fields`` changed since."""
+    pks = list(before)
+
+    def changed():
+        for start in range(0, len(pks), BATCH_SIZE):
+            rows = model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).values_list('pk', *fields)
+            for pk, *values in rows:
+                if tuple(values) != before[pk]:
+                    yield pk, dict(zip(fields, values))
+
+    log_many(model, changed(), ChangeLog.UPDATE)
+
+
+def changes_since(last_id=0, models=None):
+    """Entries after ``last_id`` in order, optionally only for ``models``."""
+    qs = ChangeLog.objects.filter(id__gt=last_id).order_by('id')
+    if models:
+        qs = qs.filter(model__in=[m._meta.model_name for m in models])
+    return qs
@@ -0,0 +1,86 @@
+"""
+A cross-process "data changed" stamp.
+
+Writes to the core tables call ``bump()``, which atomically rewrites
+``DATA_VERSION_FILE``; in-process indexes and caches compare
+``data_version()`` against the version they were built from and rebuild
+when it moves. Bulk imports wrap their work in ``deferred()`` so thousands
+of row saves bump the stamp once.
+
+Inside a transaction the stamp is only rewritten once it commits (and not
+at all if it rolls back), so no worker can rebuild from the old rows under
+the new version.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+_state = threading.local()
+_cached = (None, '0')
+
+
+def _path():
+    return os.fspath(settings.DATA_VERSION_FILE)
+
+
+def data_version():
+    """The current data version string ('0' before the first write)."""
+    global _cached
+
+    try:
+        st = os.stat(_path())
+    except FileNotFoundError:
+        return '0'
+
+    stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    if _cached[0] != stat_key:
+        with open(_path()) as f:
+            _cached = (stat_key, f.read().strip() or '0')
+    return _cached[1]
+
+
+def _write():
+    path = _path()
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, path)
+
+
+def bump():
+    """
+    Record that the data changed: postponed inside ``deferred()``, and
+    until commit (once per transaction) inside ``atomic()``.
+    """
+    if getattr(_state, 'depth', 0):
+        _state.pending = True
+        return
+
+    conn = transaction.get_connection()
+    if not conn.in_atomic_block:
+        _write()
+    elif not any(callback[1] is _write for callback in conn.run_on_commit):
+        # Callbacks of rolled-back savepoints are discarded, so this
+        # re-registers after one
+        transaction.on_commit(_write)
+
+
+@contextmanager
+def deferred():
+    """
+    Collapse every ``bump()`` inside the block into one at the end, which
+    inside a transaction still waits for the commit.
+    """
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if not _state.depth and getattr(_state, 'pending', False):
+            _state.pending = False
+            bump()
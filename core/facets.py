@@ -0,0 +1,343 @@
+"""
+Facet counts for search results: by plant, CID present/absent and
+reference source.
+
+Every phytochemical row gets a small integer code per facet, kept in
+NumPy arrays ordered by row id. A query's matches are a boolean mask over
+those rows (cached per query as packed bits), so drilling down is a mask
+intersection and counting a facet is one ``bincount`` of its codes under
+the mask; the full-text match runs once per query and release. When
+searches are served from a snapshot the index is built from that
+snapshot, else from the tables; either way it is rebuilt when the release
+id (see ``core.releases``) moves.
+
+Without numpy there are no counts, and filters are applied as the rows
+are read (``filtered_rows(..., indexed=False)``), which is also how broad
+queries the view won't count are narrowed.
+"""
+import hashlib
+import threading
+from itertools import islice
+from urllib.parse import urlencode
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+from . import releases
+from .models import Phytochemical, Plant, Reference
+from .references import reference_source
+from .search import ResultRow, common_names_subquery, search_queryset
+
+FACETS = {
+    'plant': "Plant",
+    'cid': "PubChem CID",
+    'source': "Reference source",
+}
+# Plant values shown per facet (selected plants are always shown)
+FACET_LIMIT = 20
+
+CID_VALUES = ['present', 'absent']
+CID_LABELS = {'present': "Has CID", 'absent': "No CID"}
+SOURCE_LABELS = {'doi': "DOI", 'text': "Citation text", 'none': "No reference"}
+
+
+class FacetIndex:
+    def __init__(self, rows, plant_names, snap=None):
+        """
+        ``rows`` are ``(id, plant id, cid, reference source)`` ordered by
+        id, the source as ``reference_source`` gives it or 'none';
+        ``plant_names`` maps plant id to name. ``snap`` is the snapshot the
+        rows came from, if any.
+        """
+        if np is None:
+            raise ImproperlyConfigured("Faceted search needs numpy: pip install numpy")
+
+        self.snapshot = snap
+        self.version = releases.release_id(snap)
+
+        self.plant_ids = sorted(plant_names)
+        self.plant_names = [plant_names[pk] for pk in self.plant_ids]
+        self.plant_index = plant_index = {pk: i for i, pk in enumerate(self.plant_ids)}
+
+        ids, plants, cids, sources = [], [], [], []
+        for pk, plant_id, cid, source in rows:
+            ids.append(pk)
+            plants.append(plant_index[plant_id])
+            cids.append(0 if cid else 1)
+            sources.append(source)
+        self.sources = ['none'] + sorted(set(sources) - {'none'})
+        source_index = {s: i for i, s in enumerate(self.sources)}
+
+        self.row_ids = np.array(ids, dtype=np.int64)
+        self.codes = {
+            'plant': np.array(plants, dtype=np.int64),
+            'cid': np.array(cids, dtype=np.int64),
+            'source': np.array([source_index[s] for s in sources], dtype=np.int64),
+        }
+        self.values = {
+            'plant': self.plant_ids,
+            'cid': CID_VALUES,
+            'source': self.sources,
+        }
+
+    @classmethod
+    def from_database(cls):
+        keys = dict(Reference.objects.values_list('id', 'key'))
+        rows = Phytochemical.objects.order_by('id').values_list('id', 'plant_id', 'cid', 'reference_id')
+        return cls(
+            (
+                (pk, plant_id, cid, reference_source(keys[reference_id]) if reference_id else 'none')
+                for pk, plant_id, cid, reference_id in rows.iterator()
+            ),
+            dict(Plant.objects.values_list('id', 'scientific_name')),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        # String id 0 is the empty string, so a row has a CID iff its id
+        # isn't 0, and a source of '' means no reference
+        plant_ids = snap.plant_id
+        if hasattr(snap, 'row_source'):
+            labels = {sid: snap.string(sid) or 'none' for sid in set(snap.row_source)}
+            sources = (labels[sid] for sid in snap.row_source)
+        else:
+            # Snapshots built before sources were stored
+            keys = dict(Reference.objects.values_list('id', 'key'))
+            sources = (reference_source(keys[r]) if r in keys else 'none' for r in snap.row_reference)
+        return cls(
+            zip(snap.row_id, (plant_ids[p] for p in snap.row_plant), snap.row_cid, sources),
+            {pk: snap.string(snap.plant_name[i]) for i, pk in enumerate(plant_ids)},
+            snap,
+        )
+
+    def mask(self, ids):
+        """Boolean row mask with the rows of ``ids`` set."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.row_ids, ids)
+        inside = positions < len(self.row_ids)
+        positions, ids = positions[inside], ids[inside]
+        mask = np.zeros(len(self.row_ids), dtype=bool)
+        mask[positions[self.row_ids[positions] == ids]] = True
+        return mask
+
+    def codes_for(self, facet, values):
+        """Codes of the known ``values`` of ``facet``."""
+        if facet == 'plant':
+            return [self.plant_index[v] for v in values if v in self.plant_index]
+        return [self.values[facet].index(v) for v in values if v in self.values[facet]]
+
+    def narrow(self, mask, filters, skip=None):
+        """``mask`` restricted to ``filters`` (OR within a facet, AND across)."""
+        for facet, values in filters.items():
+            if facet != skip:
+                mask = mask & np.isin(self.codes[facet], self.codes_for(facet, values))
+        return mask
+
+    def label(self, facet, value):
+        if facet == 'plant':
+            return self.plant_names[self.plant_index[value]]
+        if facet == 'cid':
+            return CID_LABELS[value]
+        return SOURCE_LABELS.get(value, value)
+
+    def counts(self, match, filters):
+        """
+        ``{facet: [(value, label, count)]}`` over ``match`` narrowed by the
+        other facets' filters, so values within a facet stay selectable
+        together. Zero counts are left out; plants are capped at FACET_LIMIT.
+        """
+        found = {}
+        for facet in FACETS:
+            under = self.narrow(match, filters, skip=facet)
+            counts = np.bincount(self.codes[facet][under], minlength=len(self.values[facet]))
+            codes = np.flatnonzero(counts)
+            if facet == 'plant':
+                selected = set(self.codes_for(facet, filters.get(facet, [])))
+                order = np.lexsort((codes, -counts[codes]))
+                codes = [c for i, c in enumerate(codes[order].tolist()) if i < FACET_LIMIT or c in selected]
+            found[facet] = [
+                (self.values[facet][c], self.label(facet, self.values[facet][c]), int(counts[c]))
+                for c in codes
+            ]
+        return found
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def available():
+    """Whether facet counts can be computed (they need numpy)."""
+    return np is not None
+
+
+def get_index():
+    """The process-wide FacetIndex, rebuilt whenever the release id moves."""
+    global _index
+
+    snap = releases.live_snapshot()
+    version = releases.release_id(snap)
+    if _index is None or _index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = FacetIndex.from_snapshot(snap) if snap is not None else FacetIndex.from_database()
+    return _index
+
+
+def parse_filters(params):
+    """``{facet: sorted values}`` from request GET params; bad values are dropped."""
+    filters = {}
+    plants = sorted({int(v) for v in params.getlist('plant') if v.isdigit()})
+    if plants:
+        filters['plant'] = plants
+    cids = sorted({v for v in params.getlist('cid') if v in CID_VALUES})
+    if cids:
+        filters['cid'] = cids
+    sources = sorted({v.strip() for v in params.getlist('source') if v.strip()})
+    if sources:
+        filters['source'] = sources
+    return filters
+
+
+def querystring(filters):
+    """``filters`` as ``&facet=value`` pairs to append to a result URL."""
+    pairs = [(facet, value) for facet, values in filters.items() for value in values]
+    return '&' + urlencode(pairs) if pairs else ''
+
+
+def filters_digest(filters):
+    return hashlib.sha1(querystring(filters).encode('utf-8')).hexdigest()
+
+
+def match(index, query):
+    """Row mask of ``query``'s matches in ``index``; the bits are cached per query."""
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    key = f"facets:match:{index.version}:{digest}"
+    packed = cache.get(key)
+    if packed is not None:
+        return np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=len(index.row_ids)).astype(bool)
+
+    if index.snapshot is not None:
+        mask = np.zeros(len(index.row_ids), dtype=bool)
+        mask[index.snapshot.matching_rows(query)] = True
+    else:
+        mask = index.mask(list(search_queryset(query).values_list('id', flat=True).iterator()))
+    cache.set(key, np.packbits(mask).tobytes(), settings.RESULTS_CACHE_TIMEOUT)
+    return mask
+
+
+def facet_counts(query, filters):
+    """``(total rows after filters, counts)`` for ``query``, cached per query and filters."""
+    index = get_index()
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    key = f"facets:counts:{index.version}:{digest}:{filters_digest(filters)}"
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    mask = match(index, query)
+    result = int(index.narrow(mask, filters).sum()), index.counts(mask, filters)
+    cache.set(key, result, settings.RESULTS_CACHE_TIMEOUT)
+    return result
+
+
+def _source_q(source):
+    """Phytochemicals whose reference ``reference_source`` maps to ``source``."""
+    if source == 'none':
+        return Q(reference__isnull=True)
+    if source == 'doi':
+        return Q(reference__key__startswith='doi:')
+    if source == 'text':
+        # Links without a host count as text too
+        return (
+            Q(reference__key__startswith='text:') | Q(reference__key='url:') |
+            Q(reference__key__startswith='url:/') | Q(reference__key__startswith='url:?')
+        )
+    return (
+        Q(reference__key=f'url:{source}') |
+        Q(reference__key__startswith=f'url:{source}/') | Q(reference__key__startswith=f'url:{source}?')
+    )
+
+
+def filter_queryset(qs, filters):
+    """Phytochemical ``qs`` narrowed by ``filters`` in SQL."""
+    if 'plant' in filters:
+        qs = qs.filter(plant_id__in=filters['plant'])
+    if filters.get('cid') == ['present']:
+        qs = qs.exclude(cid='')
+    elif filters.get('cid') == ['absent']:
+        qs = qs.filter(cid='')
+    if 'source' in filters:
+        condition = Q()
+        for source in filters['source']:
+            condition |= _source_q(source)
+        qs = qs.filter(condition)
+    return qs
+
+
+def _snapshot_filter(snap, filters):
+    """Predicate on the row indices of ``snap`` for ``filters``."""
+    plants = set(filters.get('plant', ()))
+    cids = set(filters.get('cid', ()))
+    sources = set(filters.get('source', ()))
+    if not sources:
+        source = None
+    elif hasattr(snap, 'row_source'):
+        def source(i):
+            return snap.string(snap.row_source[i]) or 'none'
+    else:
+        # Snapshots built before sources were stored
+        keys = dict(Reference.objects.values_list('id', 'key'))
+
+        def source(i):
+            return reference_source(keys[snap.row_reference[i]]) if snap.row_reference[i] in keys else 'none'
+
+    def keep(i):
+        return (
+            (not plants or snap.plant_id[snap.row_plant[i]] in plants)
+            and (not cids or ('present' if snap.row_cid[i] else 'absent') in cids)
+            and (source is None or source(i) in sources)
+        )
+    return keep
+
+
+def filtered_rows(query, filters, limit, offset=0, indexed=True):
+    """
+    Up to ``limit`` ResultRows of ``query`` narrowed by ``filters``, by id.
+    With ``indexed`` (and numpy) the FacetIndex masks are used; otherwise
+    only the matches are filtered, in SQL or over the snapshot's rows.
+    """
+    if not indexed or np is None:
+        snap = releases.live_snapshot()
+        if snap is not None:
+            keep = _snapshot_filter(snap, filters)
+            positions = islice((i for i in snap.matching_rows(query) if keep(i)), offset, offset + limit)
+            return [ResultRow._make(snap.row(i)) for i in positions]
+        qs = (
+            filter_queryset(search_queryset(query), filters)
+            .annotate(common_name=common_names_subquery())
+            .order_by('id')
+            .values_list('plant__scientific_name', 'common_name', 'compound_name', 'cid', 'reference_id')
+        )[offset:offset + limit]
+        return [ResultRow._make(row) for row in qs.iterator()]
+
+    index = get_index()
+    positions = np.flatnonzero(index.narrow(match(index, query), filters))[offset:offset + limit]
+    if index.snapshot is not None:
+        return [ResultRow._make(index.snapshot.row(i)) for i in positions.tolist()]
+    ids = index.row_ids[positions].tolist()
+    qs = (
+        Phytochemical.objects
+        .filter(id__in=ids)
+        .annotate(common_name=common_names_subquery())
+        .order_by('id')
+        .values_list('plant__scientific_name', 'common_name', 'compound_name', 'cid', 'reference_id')
+    )
+    return [ResultRow._make(row) for row in qs.iterator()]
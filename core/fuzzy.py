@@ -0,0 +1,133 @@
+"""
+Typo-tolerant "did you mean" suggestions for searches that match nothing.
+
+Candidates come from a trigram index over the distinct plant, common and
+compound names; only the few best-overlapping names are then scored with a
+bounded edit distance. The query may match anywhere inside a name (as
+``icontains`` does), so the distance is taken against the best-matching
+substring of each candidate. When searches are served from a snapshot the
+names come from it, so every suggestion is findable in the live release.
+"""
+import threading
+from array import array
+from collections import Counter
+from itertools import chain
+
+from . import releases
+from .models import CommonName, Phytochemical, Plant
+
+
+MAX_CANDIDATES = 64
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def substring_distance(query, text, max_distance):
+    """
+    Edit distance between ``query`` and the closest substring of ``text``,
+    or ``None`` once it is certain to exceed ``max_distance``.
+    """
+    prev = [0] * (len(text) + 1)
+    for i, qc in enumerate(query, start=1):
+        cur = [i]
+        left = i
+        for j, tc in enumerate(text):
+            value = prev[j] + (qc != tc)
+            if prev[j + 1] + 1 < value:
+                value = prev[j + 1] + 1
+            if left + 1 < value:
+                value = left + 1
+            cur.append(value)
+            left = value
+        if min(cur) > max_distance:
+            return None
+        prev = cur
+    best = min(prev)
+    return best if best <= max_distance else None
+
+
+class FuzzyIndex:
+    def __init__(self, names):
+        self.names = sorted({n for n in names if n})
+        self.keys = [normalize(n) for n in self.names]
+
+        grams = {}
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                grams.setdefault(gram, array('I')).append(i)
+        self.grams = grams
+
+    @classmethod
+    def from_database(cls):
+        return cls(chain(
+            Plant.objects.values_list('scientific_name', flat=True).iterator(),
+            CommonName.objects.values_list('name', flat=True).distinct().iterator(),
+            Phytochemical.objects.values_list('compound_name', flat=True).distinct().iterator(),
+        ))
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        # Every string with a posting list is a searchable name, except
+        # the CIDs
+        offsets = snap.post_offsets
+        cids = set(snap.row_cid)
+        return cls(
+            snap.string(sid)
+            for sid in range(len(offsets) - 1)
+            if offsets[sid + 1] > offsets[sid] and sid not in cids
+        )
+
+    def suggest(self, query, limit=5, max_distance=None):
+        """Up to ``limit`` names within ``max_distance`` edits of ``query``."""
+        query = normalize(query)
+        if len(query) < 3:
+            return []
+        if max_distance is None:
+            max_distance = min(3, max(1, len(query) // 4))
+
+        # q-gram lemma: each edit destroys at most three of the query's trigrams
+        query_grams = trigrams(query)
+        min_shared = max(1, len(query_grams) - 3 * max_distance)
+        shared = Counter(chain.from_iterable(
+            self.grams[g] for g in query_grams if g in self.grams
+        ))
+
+        scored = []
+        for i, count in shared.most_common(MAX_CANDIDATES):
+            if count < min_shared:
+                break
+            distance = substring_distance(query, self.keys[i], max_distance)
+            if distance is not None:
+                scored.append((distance, -count, len(self.keys[i]), self.names[i]))
+
+        scored.sort()
+        return [name for *_, name in scored[:limit]]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_index():
+    """The process-wide FuzzyIndex, rebuilt whenever the release id moves."""
+    global _index, _index_version
+
+    snap = releases.live_snapshot()
+    version = releases.release_id(snap)
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = FuzzyIndex.from_snapshot(snap) if snap is not None else FuzzyIndex.from_database()
+                _index_version = version
+    return _index
+
+
+def suggest(query, limit=5):
+    return get_index().suggest(query, limit)
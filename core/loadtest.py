@@ -0,0 +1,246 @@
+"""
+Load testing of the public search path.
+
+Virtual users (one thread each, Locust-style) replay a weighted mix of
+request kinds against a base URL and record per-request latency and
+status; ``summarize`` turns those into throughput, p50/p95/p99 latency
+and error rates per kind. ``test_server`` serves the project on a local
+port for the run. Terms are drawn from whatever database is current, so
+pair it with ``synthetic.synthetic_database`` to pick the dataset size.
+
+New endpoints are load-tested by adding a function to ``SCENARIOS``.
+"""
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.urls import reverse
+
+from . import querycost
+from .models import CommonName, Phytochemical, Plant
+
+Result = namedtuple('Result', ['kind', 'status', 'seconds', 'bytes'])
+Summary = namedtuple('Summary', ['kind', 'requests', 'errors', 'rate', 'p50', 'p95', 'p99', 'max', 'statuses'])
+
+DEFAULT_MIX = {
+    'short': 25,
+    'long': 20,
+    'cid': 15,
+    'broad': 10,
+    'zero': 10,
+    'similar': 10,
+    'cooccurrence': 10,
+}
+
+
+class Terms:
+    """Names, CIDs and ids sampled from the database for building requests."""
+
+    def __init__(self, sample=500, seed=0):
+        rng = random.Random(seed)
+
+        def pick(values):
+            values = list(values)
+            return rng.sample(values, min(sample, len(values)))
+
+        self.compounds = pick(Phytochemical.objects.values_list('compound_name', flat=True).distinct().iterator())
+        self.cids = pick(Phytochemical.objects.exclude(cid='').values_list('cid', flat=True).distinct().iterator())
+        self.plants = pick(Plant.objects.values_list('id', 'scientific_name').iterator())
+        self.common_names = pick(CommonName.objects.values_list('name', flat=True).iterator())
+
+        # The most frequent four-letter chunks of names match the most rows
+        grams = Counter(
+            name[i:i + 4].lower()
+            for name in self.compounds + [name for _, name in self.plants]
+            for i in range(len(name) - 3)
+            if name[i:i + 4].isalpha()
+        )
+        self.broad = [gram for gram, _ in grams.most_common(20)]
+
+        self.zero = []
+        letters = 'bcdfghjkmnpqvwxz'
+        while len(self.zero) < 20:
+            term = ''.join(rng.choice(letters) for _ in range(6))
+            if not querycost.estimate(term):
+                self.zero.append(term)
+
+
+def search_url(query):
+    return f"{reverse('bmppd_result')}?{urlencode({'q': query})}"
+
+
+def short_query(rng, terms):
+    name = rng.choice(terms.compounds)
+    size = rng.randint(4, 5)
+    start = rng.randint(0, max(0, len(name) - size))
+    return search_url(name[start:start + size].lower())
+
+
+def long_query(rng, terms):
+    if terms.common_names and rng.random() < 0.2:
+        return search_url(rng.choice(terms.common_names))
+    if rng.random() < 0.5:
+        return search_url(rng.choice(terms.plants)[1])
+    return search_url(rng.choice(terms.compounds))
+
+
+def cid_query(rng, terms):
+    return search_url(rng.choice(terms.cids))
+
+
+def broad_query(rng, terms):
+    return search_url(rng.choice(terms.broad))
+
+
+def zero_query(rng, terms):
+    return search_url(rng.choice(terms.zero))
+
+
+def similar_plants(rng, terms):
+    return reverse('similar_plants', args=[rng.choice(terms.plants)[0]])
+
+
+def cooccurrence(rng, terms):
+    compound = rng.choice(terms.cids) if rng.random() < 0.5 else rng.choice(terms.compounds)
+    return f"{reverse('compound_cooccurrence')}?{urlencode({'compound': compound})}"
+
+
+# kind -> function(rng, terms) returning the path to request
+SCENARIOS = {
+    'short': short_query,
+    'long': long_query,
+    'cid': cid_query,
+    'broad': broad_query,
+    'zero': zero_query,
+    'similar': similar_plants,
+    'cooccurrence': cooccurrence,
+}
+
+
+def fetch(url, timeout):
+    """``(status, body bytes)``; status 0 when no response came back."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, len(e.read())
+    except (urllib.error.URLError, OSError):
+        return 0, 0
+
+
+def warm_up(base_url, terms, kinds, timeout=30, seed=0):
+    """Request each kind once, unmeasured, so per-process indexes are built."""
+    rng = random.Random(seed)
+    for kind in kinds:
+        fetch(base_url + SCENARIOS[kind](rng, terms), timeout)
+
+
+def run(base_url, terms, mix=None, users=10, duration=30, max_requests=None, think=0, timeout=30, seed=0):
+    """
+    Run ``users`` virtual users against ``base_url`` for ``duration``
+    seconds (or until ``max_requests`` in total) and return the list of
+    Results. Each user picks a kind by the ``mix`` weights, requests it,
+    then waits up to ``think`` seconds.
+    """
+    mix = {kind: weight for kind, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    kinds, weights = list(mix), list(mix.values())
+    # Build every path up front so URL work doesn't count as latency
+    plans = []
+    for user in range(users):
+        rng = random.Random(seed * 1000 + user)
+        plans.append((rng, [(kind, SCENARIOS[kind](rng, terms)) for kind in rng.choices(kinds, weights, k=256)]))
+
+    results = []
+    lock = threading.Lock()
+    issued = iter(range(max_requests)) if max_requests else None
+    deadline = time.monotonic() + duration
+
+    def user(rng, plan):
+        i = 0
+        while time.monotonic() < deadline:
+            if issued is not None:
+                with lock:
+                    if next(issued, None) is None:
+                        return
+            kind, path = plan[i % len(plan)]
+            i += 1
+            started = time.perf_counter()
+            status, size = fetch(base_url + path, timeout)
+            elapsed = time.perf_counter() - started
+            with lock:
+                results.append(Result(kind, status, elapsed, size))
+            if think:
+                time.sleep(rng.uniform(0, think))
+
+    threads = [threading.Thread(target=user, args=plan, daemon=True) for plan in plans]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def is_error(status):
+    return not 200 <= status < 400
+
+
+def summarize(results, elapsed):
+    """One Summary per kind (in mix order) plus a final 'all' row."""
+    by_kind = {}
+    for result in results:
+        by_kind.setdefault(result.kind, []).append(result)
+
+    def summary(kind, rows):
+        seconds = sorted(r.seconds for r in rows)
+        return Summary(
+            kind=kind,
+            requests=len(rows),
+            errors=sum(is_error(r.status) for r in rows),
+            rate=len(rows) / elapsed if elapsed else 0.0,
+            p50=percentile(seconds, 50),
+            p95=percentile(seconds, 95),
+            p99=percentile(seconds, 99),
+            max=seconds[-1] if seconds else 0.0,
+            statuses=Counter(r.status for r in rows),
+        )
+
+    rows = [summary(kind, by_kind[kind]) for kind in SCENARIOS if kind in by_kind]
+    rows.append(summary('all', results))
+    return rows
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def test_server(host='127.0.0.1', port=0):
+    """
+    Serve the project's WSGI application from a threaded server on
+    ``host:port`` (a free port by default) and yield its base URL.
+    """
+    server = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=False)
+    server.set_app(get_internal_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
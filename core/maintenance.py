@@ -0,0 +1,231 @@
+"""
+Database upkeep for the ``db_maintenance`` command: compaction and planner
+statistics, integrity checks, size/row-count reports and query-plan checks
+of the queries the site runs most. SQLite is the deployed backend;
+PostgreSQL gets the equivalent statements.
+"""
+import re
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import connection
+
+from .models import CompoundProperties, Phytochemical, Plant, Reference
+from .search import MAX_RESULTS, common_names_subquery, search_queryset
+
+Relation = namedtuple('Relation', ['name', 'kind', 'table', 'bytes', 'rows'])
+Plan = namedtuple('Plan', ['label', 'lines', 'scans', 'indexes', 'expect_scan'])
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+SQLITE_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+PG_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+PG_INDEX_RE = re.compile(r'Index (?:Only )?Scan (?:Backward )?using (\w+)')
+
+
+def core_tables():
+    return [model._meta.db_table for model in apps.get_app_config('core').get_models()]
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+# ---------- MAINTENANCE ----------
+
+def vacuum():
+    """Rebuild the database file (SQLite) or reclaim dead tuples (PostgreSQL)."""
+    with connection.cursor() as cursor:
+        if is_postgresql():
+            for table in core_tables():
+                cursor.execute(f"VACUUM {connection.ops.quote_name(table)}")
+        else:
+            cursor.execute("VACUUM")
+
+
+def analyze():
+    """Refresh planner statistics; SQLite also runs ``PRAGMA optimize``."""
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+        if not is_postgresql():
+            cursor.execute("PRAGMA optimize")
+
+
+def integrity_problems(quick=False):
+    """
+    Messages from the integrity and foreign-key checks; empty when healthy.
+    PostgreSQL checks B-tree indexes with amcheck when it is installed.
+    """
+    problems = []
+    with connection.cursor() as cursor:
+        if is_postgresql():
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'amcheck'")
+            if not cursor.fetchone():
+                return ["amcheck extension not installed; index integrity not checked"]
+            cursor.execute(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_class t ON t.oid = i.indrelid JOIN pg_am a ON a.oid = c.relam "
+                "WHERE a.amname = 'btree' AND t.relname = ANY(%s)",
+                [core_tables()],
+            )
+            for (index,) in cursor.fetchall():
+                try:
+                    cursor.execute("SELECT bt_index_check(%s::regclass)", [index])
+                except Exception as e:
+                    problems.append(f"{index}: {e}")
+            return problems
+
+        cursor.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check")
+        problems += [row[0] for row in cursor.fetchall() if row[0] != 'ok']
+        cursor.execute("PRAGMA foreign_key_check")
+        problems += [
+            f"{table} rowid {rowid}: missing {parent} row"
+            for table, rowid, parent, _ in cursor.fetchall()
+        ]
+    return problems
+
+
+# ---------- SIZES ----------
+
+def file_stats():
+    """SQLite ``{'bytes', 'free_bytes'}`` of the whole file; None on PostgreSQL."""
+    if is_postgresql():
+        return None
+    with connection.cursor() as cursor:
+        stats = {}
+        for pragma in ('page_size', 'page_count', 'freelist_count'):
+            cursor.execute(f"PRAGMA {pragma}")
+            stats[pragma] = cursor.fetchone()[0]
+    return {
+        'bytes': stats['page_size'] * stats['page_count'],
+        'free_bytes': stats['page_size'] * stats['freelist_count'],
+    }
+
+
+def relations():
+    """Tables and indexes of the core app with their on-disk size and row counts."""
+    tables = core_tables()
+    found = []
+    with connection.cursor() as cursor:
+        counts = {}
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            counts[table] = cursor.fetchone()[0]
+
+        if is_postgresql():
+            cursor.execute(
+                "SELECT c.relname, c.relkind, COALESCE(t.relname, c.relname), pg_relation_size(c.oid) "
+                "FROM pg_class c LEFT JOIN pg_index i ON i.indexrelid = c.oid "
+                "LEFT JOIN pg_class t ON t.oid = i.indrelid "
+                "WHERE c.relkind IN ('r', 'i') AND COALESCE(t.relname, c.relname) = ANY(%s)",
+                [tables],
+            )
+            rows = [(name, 'table' if kind == 'r' else 'index', table, size) for name, kind, table, size in cursor.fetchall()]
+        else:
+            cursor.execute(
+                "SELECT m.name, m.type, m.tbl_name, COALESCE(SUM(s.pgsize), 0) "
+                "FROM sqlite_master m LEFT JOIN dbstat s ON s.name = m.name "
+                "WHERE m.type IN ('table', 'index') GROUP BY m.name, m.type, m.tbl_name"
+            )
+            rows = [row for row in cursor.fetchall() if row[2] in tables]
+
+    for name, kind, table, size in rows:
+        found.append(Relation(name, kind, table, size, counts[table] if kind == 'table' else None))
+    return sorted(found, key=lambda r: (r.table, r.kind != 'table', r.name))
+
+
+def indexes():
+    """``{index name: (table, unique, [columns])}`` for the core tables."""
+    tables = core_tables()
+    found = {}
+    with connection.cursor() as cursor:
+        if is_postgresql():
+            cursor.execute(
+                "SELECT c.relname, t.relname, i.indisunique, ARRAY("
+                "  SELECT a.attname FROM unnest(i.indkey) WITH ORDINALITY k(attnum, n) "
+                "  JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum ORDER BY k.n"
+                ") FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid "
+                "WHERE t.relname = ANY(%s)",
+                [tables],
+            )
+            return {name: (table, unique, list(columns)) for name, table, unique, columns in cursor.fetchall()}
+        for table in tables:
+            cursor.execute(f"PRAGMA index_list({connection.ops.quote_name(table)})")
+            for row in cursor.fetchall():
+                cursor.execute(f"PRAGMA index_info({connection.ops.quote_name(row[1])})")
+                columns = [info[2] for info in sorted(cursor.fetchall())]
+                found[row[1]] = (table, bool(row[2]), columns)
+    return found
+
+
+def redundant_indexes(found):
+    """
+    ``(index, covering index)`` pairs where a non-unique index's columns
+    are a leading prefix of another index on the same table.
+    """
+    pairs = []
+    for name, (table, unique, columns) in found.items():
+        if unique:
+            continue
+        for other, (other_table, _, other_columns) in found.items():
+            if (other != name and other_table == table and len(other_columns) > len(columns)
+                    and other_columns[:len(columns)] == columns):
+                pairs.append((name, other))
+                break
+    return sorted(pairs)
+
+
+def unused_index_stats():
+    """PostgreSQL indexes never scanned since statistics were reset; None on SQLite."""
+    if not is_postgresql():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexrelname FROM pg_stat_user_indexes WHERE idx_scan = 0 AND relname = ANY(%s)",
+            [core_tables()],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+# ---------- QUERY PLANS ----------
+
+def probe_queries(query='acid'):
+    """
+    ``(label, queryset, scan expected)`` for the hot queries: the search
+    (a substring match, which no B-tree index can serve) and the lookups
+    made per row by the imports and per page by the result renderer.
+    """
+    phytochemical = Phytochemical.objects.order_by('pk').first()
+    plant_id = phytochemical.plant_id if phytochemical else 0
+    return [
+        ('search', search_queryset(query)
+            .annotate(common_name=common_names_subquery())
+            .order_by('id')
+            .values_list('plant__scientific_name', 'common_name', 'compound_name', 'cid', 'reference_id')[:MAX_RESULTS],
+         True),
+        ('import: plant by name', Plant.objects.filter(scientific_name='x'), False),
+        ('import: duplicate compound', Phytochemical.objects.filter(plant_id=plant_id, compound_name__iexact='x'), False),
+        ('import: reference by key', Reference.objects.filter(key='x'), False),
+        ('results: properties by CID', CompoundProperties.objects.filter(cid__in=['1', '2']), False),
+        ('admin: phytochemicals of a plant', Phytochemical.objects.filter(plant_id=plant_id), False),
+    ]
+
+
+def explain(label, queryset, expect_scan):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if is_postgresql():
+            cursor.execute(f"EXPLAIN {sql}", params)
+            lines = [row[0] for row in cursor.fetchall()]
+            scans = sorted({m.group(1) for line in lines for m in PG_SCAN_RE.finditer(line)})
+            used = sorted({m.group(1) for line in lines for m in PG_INDEX_RE.finditer(line)})
+        else:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            lines = [row[3] for row in cursor.fetchall()]
+            scans = sorted({m.group(1) for line in lines if (m := SQLITE_SCAN_RE.match(line))})
+            used = sorted({m.group(1) for line in lines for m in SQLITE_INDEX_RE.finditer(line)})
+    return Plan(label, lines, scans, used, expect_scan)
+
+
+def query_plans(query='acid'):
+    return [explain(*probe) for probe in probe_queries(query)]
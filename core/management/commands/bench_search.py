@@ -0,0 +1,107 @@
+import tempfile
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch, Q
+from django.test import override_settings
+
+from core import snapshot
+from core.models import Phytochemical
+from core.search import MAX_RESULTS, ResultRow, orm_search_rows
+from core.synthetic import synthetic_database
+
+
+def model_rows(query, limit):
+    """The pre-values_list search path: model instances plus prefetched names."""
+    qs = (
+        Phytochemical.objects
+        .filter(
+            Q(plant__scientific_name__icontains=query) |
+            Q(plant__common_names__name__icontains=query) |
+            Q(compound_name__icontains=query) |
+            Q(cid__icontains=query)
+        )
+        .select_related('plant')
+        .prefetch_related(Prefetch('plant__common_names'))
+        .distinct()[:limit]
+    )
+    return [
+        {
+            'plant_name': p.plant.scientific_name,
+            'common_name': ", ".join(c.name for c in p.plant.common_names.all()),
+            'compound_name': p.compound_name,
+            'cid': p.cid,
+            'reference_id': p.reference_id,
+        }
+        for p in qs
+    ]
+
+
+def snapshot_rows(query, limit):
+    return [ResultRow._make(row) for row in snapshot.current().search(query, limit)]
+
+
+def measure(func, query, limit, repeat):
+    """Return (rows, best seconds, peak traced bytes) for ``func``."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func(query, limit)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    rows = func(query, limit)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, best, peak
+
+
+class Command(BaseCommand):
+    help = "Compare allocation and time of the model-instance and values_list search paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['acid', 'aza'])
+        parser.add_argument('--limit', type=int, default=MAX_RESULTS)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--synthetic-plants', type=int, default=0,
+            help="Run against a throwaway database with this many synthetic plants",
+        )
+        parser.add_argument('--compounds-per-plant', type=int, default=160)
+        parser.add_argument(
+            '--snapshot', action='store_true',
+            help="Also build a throwaway snapshot and time the snapshot backend",
+        )
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        repeat = options['repeat']
+
+        if options['synthetic_plants']:
+            db = synthetic_database(options['synthetic_plants'], options['compounds_per_plant'])
+        else:
+            db = nullcontext()
+
+        with db, tempfile.TemporaryDirectory() as tmp, override_settings(SNAPSHOT_DIR=tmp):
+            if options['snapshot']:
+                snapshot.publish()
+
+            for query in options['queries']:
+                old_rows, old_time, old_peak = measure(model_rows, query, limit, repeat)
+                new_rows, new_time, new_peak = measure(orm_search_rows, query, limit, repeat)
+
+                lines = [
+                    f"{query!r}: {len(new_rows)} row(s) (model path {len(old_rows)})",
+                    f"  model instances : {old_time * 1000:8.2f} ms  peak {old_peak / 1024:8.1f} KiB",
+                    f"  values_list     : {new_time * 1000:8.2f} ms  peak {new_peak / 1024:8.1f} KiB",
+                ]
+                if options['snapshot']:
+                    _, snap_time, snap_peak = measure(snapshot_rows, query, limit, repeat)
+                    lines.append(
+                        f"  snapshot        : {snap_time * 1000:8.2f} ms  peak {snap_peak / 1024:8.1f} KiB"
+                    )
+                lines.append(f"  memory saved    : {(old_peak - new_peak) / 1024:8.1f} KiB")
+                self.stdout.write("\n".join(lines))
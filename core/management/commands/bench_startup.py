@@ -0,0 +1,114 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: boot the WSGI application the way a worker
+# does, then time the first byte of each requested path
+PROBE = r"""
+import json, sys, time
+from importlib import import_module
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+module, name = sys.argv[1].rsplit('.', 1)
+application = getattr(import_module(module), name)
+boot = time.perf_counter() - started
+modules = len(sys.modules)
+admin_at_boot = 'core.admin' in sys.modules
+
+from django.conf import settings
+hosts = [h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')]
+requests = []
+for path in sys.argv[2:]:
+    path, _, query = path.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': hosts[0] if hosts else 'localhost'}
+    if getattr(settings, 'SECURE_SSL_REDIRECT', False):
+        environ.update({'wsgi.url_scheme': 'https', 'HTTPS': 'on'})
+    setup_testing_defaults(environ)
+    status = []
+    started = time.perf_counter()
+    body = iter(application(environ, lambda s, h, exc_info=None: status.append(s)))
+    next(body, b'')
+    ttfb = time.perf_counter() - started
+    for _ in body:
+        pass
+    requests.append({'path': environ['PATH_INFO'] + ('?' + query if query else ''), 'status': status[0].split()[0], 'ttfb': ttfb})
+
+print(json.dumps({
+    'boot': boot,
+    'modules': modules,
+    # Whether the ModelAdmins had been imported after boot / after the requests
+    'admin': [admin_at_boot, 'core.admin' in sys.modules],
+    'requests': requests,
+}))
+"""
+
+
+def probe(wsgi_application, paths, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += ['-c', PROBE, wsgi_application, *paths]
+
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=os.environ.copy(), cwd=settings.BASE_DIR)
+    if proc.returncode:
+        raise CommandError(f"Worker probe failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_imports(stderr, top):
+    """Top ``top`` ``(cumulative µs, module)`` pairs from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = "Measure WSGI worker cold start: boot time, modules loaded and first-byte latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/', '/bmppd_result/?q=acid'],
+            help="Paths requested once per worker, in order, after boot",
+        )
+        parser.add_argument('--runs', type=int, default=5, help="Fresh worker processes to start")
+        parser.add_argument(
+            '--importtime', type=int, default=0, metavar='N',
+            help="Also list the N slowest imports (cumulative) of one extra boot",
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        runs = [probe(settings.WSGI_APPLICATION, paths)[0] for _ in range(max(options['runs'], 1))]
+
+        boots = [r['boot'] for r in runs]
+        lines = [
+            f"{len(runs)} worker(s), {settings.WSGI_APPLICATION}",
+            f"  boot            : median {statistics.median(boots) * 1000:8.1f} ms  min {min(boots) * 1000:8.1f} ms",
+            f"  modules loaded  : {runs[0]['modules']}",
+            f"  admin imported  : after boot {'yes' if runs[0]['admin'][0] else 'no'}, "
+            f"after requests {'yes' if runs[0]['admin'][1] else 'no'}",
+        ]
+        for i, path in enumerate(paths):
+            ttfbs = [r['requests'][i]['ttfb'] for r in runs]
+            first = runs[0]['requests'][i]
+            label = f"{'first' if i == 0 else 'then'} {first['path']} [{first['status']}]"
+            lines.append(
+                f"  {label:<40}: median {statistics.median(ttfbs) * 1000:8.1f} ms  min {min(ttfbs) * 1000:8.1f} ms"
+            )
+        self.stdout.write("\n".join(lines))
+
+        if options['importtime']:
+            _, stderr = probe(settings.WSGI_APPLICATION, paths, importtime=True)
+            self.stdout.write("slowest imports (cumulative):")
+            for micros, module in slowest_imports(stderr, options['importtime']):
+                self.stdout.write(f"  {micros / 1000:8.1f} ms  {module}")
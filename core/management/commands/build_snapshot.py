@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile Plant/CommonName/Phytochemical into a memory-mapped search snapshot without "
+        "publishing it (publish_release and rollback_release change what is live)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help="Version name (default: timestamp)")
+
+    def handle(self, *args, **options):
+        version, counts = snapshot.build(options['name'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built snapshot {version}: "
+            f"{counts['plants']} plant(s), {counts['rows']} phytochemical(s), {counts['strings']} string(s). "
+            f"It is not live; use publish_release to publish a release."
+        ))
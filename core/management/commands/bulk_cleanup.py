@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import backfill_from_mapping, merge_duplicate_compounds, move_phytochemicals
+from core.models import Phytochemical, Plant
+
+
+def get_plant(name):
+    try:
+        return Plant.objects.get(scientific_name=name)
+    except Plant.DoesNotExist:
+        raise CommandError(f"Unknown plant: {name}")
+
+
+class Command(BaseCommand):
+    help = "Set-based cleanup: merge duplicate compounds, move phytochemicals, back-fill CIDs/references"
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='operation', required=True)
+
+        merge = sub.add_parser('merge-duplicates', help="Merge case-insensitive duplicate compounds within plants")
+        merge.add_argument('--plant', action='append', default=[], help="Limit to this plant (repeatable)")
+
+        move = sub.add_parser('move', help="Move phytochemicals from one plant to another")
+        move.add_argument('source', help="Scientific name of the source plant")
+        move.add_argument('target', help="Scientific name of the target plant")
+        move.add_argument('--compound', action='append', default=[], help="Only these compounds (repeatable)")
+
+        backfill = sub.add_parser('backfill', help="Fill empty CIDs and references from a mapping CSV")
+        backfill.add_argument('mapping', help="CSV with Phytochemicals, CID, Reference and optional Plant Name columns")
+
+    def handle(self, *args, **options):
+        operation = options['operation']
+
+        if operation == 'merge-duplicates':
+            plant_ids = [get_plant(name).pk for name in options['plant']] or None
+            totals = merge_duplicate_compounds(plant_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f"Merged {totals['merged']} duplicate phytochemical(s), "
+                f"back-filled {totals['references']} reference(s)"
+            ))
+
+        elif operation == 'move':
+            source = get_plant(options['source'])
+            target = get_plant(options['target'])
+            qs = Phytochemical.objects.filter(plant=source)
+            if options['compound']:
+                qs = qs.filter(compound_name__in=options['compound'])
+            totals = move_phytochemicals(qs, target)
+            self.stdout.write(self.style.SUCCESS(
+                f"Moved {totals['moved']} phytochemical(s) to {target}; "
+                f"dropped {totals['dropped']} already present there"
+            ))
+
+        elif operation == 'backfill':
+            try:
+                totals = backfill_from_mapping(options['mapping'])
+            except FileNotFoundError:
+                raise CommandError(f"Mapping file not found: {options['mapping']}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Back-filled {totals['cids']} CID(s) and {totals['references']} reference(s)"
+            ))
@@ -0,0 +1,105 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import maintenance
+
+# Suggest --vacuum when this share of an SQLite file is free pages
+FRAGMENTATION_WARNING = 0.10
+
+
+def human(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = "VACUUM/ANALYZE the database, check integrity, report sizes and check the hot query plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum', action='store_true', help="Also VACUUM (rewrites the SQLite file; locks it meanwhile)")
+        parser.add_argument('--report-only', action='store_true', help="Only check and report; change nothing")
+        parser.add_argument('--quick', action='store_true', help="SQLite quick_check instead of the full integrity_check")
+        parser.add_argument('--query', default='acid', help="Search term used for the search query plan")
+
+    def handle(self, *args, **options):
+        write = not options['report_only']
+
+        # ---------- MAINTENANCE ----------
+        if write and options['vacuum']:
+            started = time.perf_counter()
+            maintenance.vacuum()
+            self.stdout.write(f"VACUUM done in {time.perf_counter() - started:.1f} s")
+        if write:
+            started = time.perf_counter()
+            maintenance.analyze()
+            self.stdout.write(f"ANALYZE / optimize done in {time.perf_counter() - started:.1f} s")
+
+        # ---------- INTEGRITY ----------
+        problems = maintenance.integrity_problems(quick=options['quick'])
+        if problems:
+            self.stdout.write(self.style.ERROR("Integrity check found problems:"))
+            for problem in problems[:50]:
+                self.stdout.write(f"  {problem}")
+        else:
+            self.stdout.write(self.style.SUCCESS("Integrity check: ok"))
+
+        # ---------- SIZES ----------
+        stats = maintenance.file_stats()
+        if stats:
+            free = stats['free_bytes'] / stats['bytes'] if stats['bytes'] else 0
+            self.stdout.write(f"\nDatabase file: {human(stats['bytes'])}, {human(stats['free_bytes'])} free ({free:.0%})")
+            if free > FRAGMENTATION_WARNING:
+                self.stdout.write(self.style.WARNING("  Many free pages; run with --vacuum to compact the file"))
+
+        self.stdout.write("\nTables and indexes:")
+        for rel in maintenance.relations():
+            rows = f"{rel.rows:>10} rows" if rel.rows is not None else ''
+            name = rel.name if rel.kind == 'table' else f"  {rel.name}"
+            self.stdout.write(f"  {name:<58} {human(rel.bytes):>10} {rows}")
+
+        # ---------- QUERY PLANS ----------
+        self.stdout.write("\nQuery plans:")
+        used = set()
+        for plan in maintenance.query_plans(options['query']):
+            used.update(plan.indexes)
+            self.stdout.write(f"  {plan.label}:")
+            for line in plan.lines:
+                self.stdout.write(f"      {line}")
+            if plan.scans and plan.expect_scan:
+                self.stdout.write(
+                    f"    note: full scan of {', '.join(plan.scans)} is inherent to substring search; "
+                    "SEARCH_BACKEND=snapshot avoids it"
+                )
+            elif plan.scans:
+                self.stdout.write(self.style.WARNING(
+                    f"    MISSING INDEX? full scan of {', '.join(plan.scans)}"
+                ))
+
+        # ---------- INDEX HEALTH ----------
+        indexes = maintenance.indexes()
+        redundant = maintenance.redundant_indexes(indexes)
+        if redundant:
+            self.stdout.write("\nRedundant indexes (leading columns of another index):")
+            for name, covering in redundant:
+                self.stdout.write(self.style.WARNING(f"  {name} is covered by {covering}"))
+
+        idle = sorted(
+            name for name, (table, unique, _) in indexes.items()
+            if not unique and name not in used
+        )
+        if idle:
+            self.stdout.write("\nNon-unique indexes no probed query used (check before dropping; admin and FKs may need them):")
+            for name in idle:
+                self.stdout.write(f"  {name} on {indexes[name][0]}")
+
+        never_scanned = maintenance.unused_index_stats()
+        if never_scanned:
+            self.stdout.write("\nIndexes with no scans since statistics were reset (pg_stat_user_indexes):")
+            for name in never_scanned:
+                self.stdout.write(f"  {name}")
+
+        if problems:
+            raise CommandError(f"{len(problems)} integrity problem(s)")
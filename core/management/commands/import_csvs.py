@@ -1,15 +1,26 @@
 import csv
+import io
 import os
 import logging
-from django.core.management.base import BaseCommand
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connection
 from core.models import Plant, CommonName, Phytochemical
+from core.references import ReferenceCache
+from core.profiling import PhaseTimer, QueryCounter
+from core import changelog, dataversion
+from core.management.commands.validate_csvs import REPORT_DIR, validate_files
 
 DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
 DETAILED_LOG_FILE = os.path.join(settings.BASE_DIR, 'phytochemical_import.log')
 SUMMARY_LOG_FILE = os.path.join(settings.BASE_DIR, 'phytochemical_summary.log')
 DUPLICATE_LOG_FILE = os.path.join(settings.BASE_DIR, 'phytochemical_duplicates.log')
 
+PHASES = ['decode', 'parse', 'normalise', 'lookup', 'db_write', 'logging']
+
 
 def clean_text(val):
     if not val:
@@ -17,11 +28,45 @@ def clean_text(val):
     return val.replace('\xa0', '').strip()
 
 
+def queued(logger, *handlers):
+    """
+    Put ``handlers`` behind a QueueHandler so logging from the row loop only
+    enqueues records; a QueueListener thread does the file/console I/O.
+    """
+    records = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(records))
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
 class Command(BaseCommand):
     help = "Import phytochemical CSV files with case-insensitive duplicate detection"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', action='store_true',
+            help="Report time per phase, rows/sec and queries per file",
+        )
+        parser.add_argument(
+            '--validate', action='store_true',
+            help="Validate every file first (see validate_csvs) and import nothing if any row is rejected",
+        )
+
+    @dataversion.deferred()
     def handle(self, *args, **kwargs):
 
+        # ---------- VALIDATION ----------
+        if kwargs.get('validate'):
+            paths = sorted(
+                os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.lower().endswith('.csv')
+            )
+            rejected = validate_files(paths, REPORT_DIR, self.stdout)
+            if rejected:
+                raise CommandError(
+                    f"Validation rejected {rejected} row(s); nothing imported. See the reports in {REPORT_DIR}"
+                )
+
         # ---------- MAIN LOGGER ----------
         logger = logging.getLogger('phytochemical_import')
         logger.setLevel(logging.INFO)
@@ -29,8 +74,7 @@ class Command(BaseCommand):
 
         fh = logging.FileHandler(DETAILED_LOG_FILE, mode='w', encoding='utf-8')
         fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logger.addHandler(fh)
-        logger.addHandler(logging.StreamHandler())
+        listeners = [queued(logger, fh, logging.StreamHandler())]
 
         # ---------- SUMMARY LOGGER ----------
         summary_logger = logging.getLogger('phytochemical_summary')
@@ -39,7 +83,7 @@ class Command(BaseCommand):
 
         sh = logging.FileHandler(SUMMARY_LOG_FILE, mode='w', encoding='utf-8')
         sh.setFormatter(logging.Formatter('%(message)s'))
-        summary_logger.addHandler(sh)
+        listeners.append(queued(summary_logger, sh))
 
         # ---------- DUPLICATE LOGGER ----------
         dup_logger = logging.getLogger('phytochemical_duplicates')
@@ -48,7 +92,28 @@ class Command(BaseCommand):
 
         dh = logging.FileHandler(DUPLICATE_LOG_FILE, mode='w', encoding='utf-8')
         dh.setFormatter(logging.Formatter('%(message)s'))
-        dup_logger.addHandler(dh)
+        listeners.append(queued(dup_logger, dh))
+
+        # ---------- QUERY COUNTER ----------
+        queries = QueryCounter()
+
+        # ---------- CHANGE LOG ----------
+        # Rows written by this run are logged as coming from it
+        run = f"import:{time.strftime('%Y%m%dT%H%M%S')}"
+        summary_logger.info(f"Change log source: {run}")
+
+        try:
+            with connection.execute_wrapper(queries), changelog.source(run):
+                self.import_files(logger, summary_logger, dup_logger, queries, kwargs.get('profile', False))
+        finally:
+            # Flush queued records before the command exits
+            for listener in listeners:
+                listener.stop()
+
+    def import_files(self, logger, summary_logger, dup_logger, queries, profile):
+
+        # ---------- REFERENCE CACHE ----------
+        references = ReferenceCache()
 
         # ---------- GLOBAL TOTALS ----------
         plants_created = 0
@@ -56,6 +121,12 @@ class Command(BaseCommand):
         phytochem_created_total = 0
         phytochem_existing_total = 0
 
+        # ---------- PROFILING ----------
+        overall = PhaseTimer(profile)
+        overall_rows = 0
+        overall_started = time.perf_counter()
+        queries.count = 0
+
         files = sorted(f for f in os.listdir(DATA_DIR) if f.lower().endswith('.csv'))
         if not files:
             logger.warning("No CSV files found.")
@@ -74,21 +145,25 @@ class Command(BaseCommand):
             phytochem_existing = 0
             rows_without_compound = []
 
+            timer = PhaseTimer(profile)
+            file_started = time.perf_counter()
+            file_queries = queries.count
+
             # ---------- READ CSV ----------
-            try:
-                with open(file_path, encoding='utf-8-sig', newline='') as f:
-                    reader = csv.DictReader(f)
-                    rows = [
-                        row for row in reader
-                        if any(v and v.strip() for v in row.values())
-                    ]
-            except UnicodeDecodeError:
-                with open(file_path, encoding='latin1', newline='') as f:
-                    reader = csv.DictReader(f)
-                    rows = [
-                        row for row in reader
-                        if any(v and v.strip() for v in row.values())
-                    ]
+            with timer.phase('decode'):
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+                try:
+                    text = raw.decode('utf-8-sig')
+                except UnicodeDecodeError:
+                    text = raw.decode('latin1')
+
+            with timer.phase('parse'):
+                reader = csv.DictReader(io.StringIO(text, newline=''))
+                rows = [
+                    row for row in reader
+                    if any(v and v.strip() for v in row.values())
+                ]
 
             total_rows = len(rows)
             if total_rows == 0:
@@ -97,35 +172,40 @@ class Command(BaseCommand):
 
             # ---------- ROW LOOP ----------
             for i, row in enumerate(rows, start=1):
-                row = {k.strip().lower(): v for k, v in row.items()}
+                with timer.phase('normalise'):
+                    row = {k.strip().lower(): v for k, v in row.items()}
 
-                plant_name = clean_text(row.get('plant name'))
-                common_name = clean_text(row.get('common name'))
-                compound = clean_text(row.get('phytochemicals'))
-                cid = clean_text(row.get('cid'))
-                reference = clean_text(row.get('reference'))
+                    plant_name = clean_text(row.get('plant name'))
+                    common_name = clean_text(row.get('common name'))
+                    compound = clean_text(row.get('phytochemicals'))
+                    cid = clean_text(row.get('cid'))
+                    reference = clean_text(row.get('reference'))
 
                 # ----- PLANT -----
                 if plant_name:
-                    current_plant, created = Plant.objects.get_or_create(
-                        scientific_name=plant_name
-                    )
+                    with timer.phase('lookup'):
+                        current_plant, created = Plant.objects.get_or_create(
+                            scientific_name=plant_name
+                        )
                     if created:
                         plants_created += 1
-                        logger.info(f"Created Plant: {plant_name}")
+                        with timer.phase('logging'):
+                            logger.info(f"Created Plant: {plant_name}")
 
                 if not current_plant:
                     continue
 
                 # ----- COMMON NAME -----
                 if common_name:
-                    cn, created = CommonName.objects.get_or_create(
-                        plant=current_plant,
-                        name=common_name
-                    )
+                    with timer.phase('lookup'):
+                        cn, created = CommonName.objects.get_or_create(
+                            plant=current_plant,
+                            name=common_name
+                        )
                     if created:
                         common_names_created += 1
-                        logger.info(f"Row {i}: Added Common Name: {common_name}")
+                        with timer.phase('logging'):
+                            logger.info(f"Row {i}: Added Common Name: {common_name}")
 
                 # ----- NO COMPOUND -----
                 if not compound:
@@ -135,40 +215,45 @@ class Command(BaseCommand):
                 rows_with_compound += 1
 
                 # ---------- CASE-INSENSITIVE LOOKUP ----------
-                existing = Phytochemical.objects.filter(
-                    plant=current_plant,
-                    compound_name__iexact=compound
-                ).first()
+                with timer.phase('lookup'):
+                    existing = Phytochemical.objects.filter(
+                        plant=current_plant,
+                        compound_name__iexact=compound
+                    ).first()
 
                 if existing:
                     phytochem_existing += 1
                     phytochem_existing_total += 1
 
                     # ----- DUPLICATE LOG (FOR CLEANUP) -----
-                    dup_logger.info(
-                        f"FILE={filename} | ROW={i} | PLANT={current_plant.scientific_name} | "
-                        f"INCOMING='{compound}' | EXISTING='{existing.compound_name}' | "
-                        f"PHYTOCHEM_ID={existing.id}"
-                    )
+                    with timer.phase('logging'):
+                        dup_logger.info(
+                            f"FILE={filename} | ROW={i} | PLANT={current_plant.scientific_name} | "
+                            f"INCOMING='{compound}' | EXISTING='{existing.compound_name}' | "
+                            f"PHYTOCHEM_ID={existing.id}"
+                        )
 
                     # Update reference if missing
-                    if not existing.reference and reference:
-                        existing.reference = reference
-                        existing.save()
+                    if not existing.reference_id and reference:
+                        with timer.phase('db_write'):
+                            existing.reference_id = references.resolve(reference)
+                            existing.save(update_fields=['reference'])
 
                     continue
 
                 # ---------- CREATE NEW PHYTOCHEM ----------
                 try:
-                    Phytochemical.objects.create(
-                        plant=current_plant,
-                        compound_name=compound,
-                        cid=cid,
-                        reference=reference
-                    )
+                    with timer.phase('db_write'):
+                        Phytochemical.objects.create(
+                            plant=current_plant,
+                            compound_name=compound,
+                            cid=cid,
+                            reference_id=references.resolve(reference)
+                        )
                     phytochem_created += 1
                     phytochem_created_total += 1
-                    logger.info(f"Row {i}: Added Phytochemical: {compound}")
+                    with timer.phase('logging'):
+                        logger.info(f"Row {i}: Added Phytochemical: {compound}")
 
                 except Exception as e:
                     logger.error(f"Row {i}: DB error for {compound}: {e}")
@@ -188,6 +273,17 @@ class Command(BaseCommand):
 
             summary_logger.info(", ".join(summary_parts))
 
+            # ---------- FILE PROFILE ----------
+            if profile:
+                self.report_profile(
+                    filename, timer, total_rows,
+                    time.perf_counter() - file_started,
+                    queries.count - file_queries,
+                    summary_logger,
+                )
+                overall.merge(timer)
+                overall_rows += total_rows
+
         # ---------- FINAL TOTAL ----------
         logger.info("\nIMPORT COMPLETE")
         logger.info(f"Plants created: {plants_created}")
@@ -201,4 +297,22 @@ class Command(BaseCommand):
         summary_logger.info(f"Phytochemicals created: {phytochem_created_total}")
         summary_logger.info(f"Phytochemicals already existed: {phytochem_existing_total}")
 
-
+        if profile:
+            self.report_profile(
+                "ALL FILES", overall, overall_rows,
+                time.perf_counter() - overall_started,
+                queries.count,
+                summary_logger,
+            )
+
+    def report_profile(self, label, timer, rows, elapsed, query_count, summary_logger):
+        lines = [
+            f"--- PROFILE {label}: {rows} rows in {elapsed:.3f} s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/sec), "
+            f"{query_count} queries ({query_count / rows if rows else 0:.1f}/row)"
+        ]
+        lines += timer.report(PHASES)
+
+        for line in lines:
+            self.stdout.write(line)
+            summary_logger.info(line)
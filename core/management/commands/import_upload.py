@@ -0,0 +1,70 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CSVUpload
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import (or resume importing) CSVUploads from their last committed checkpoint. "
+        "The admin only queues uploads; run this with --watch as a long-lived worker "
+        "(e.g. under systemd or supervisor) to import them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="CSVUpload ids (default: all queued)")
+        parser.add_argument('--chunk-size', type=int, help="Rows per transaction")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Also take over the given uploads if they are marked as importing "
+                 "(after the worker importing them died)",
+        )
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help="Keep running, checking for queued uploads every SECONDS",
+        )
+
+    def handle(self, *args, **options):
+        if options['force'] and not options['ids']:
+            raise CommandError("--force needs the ids of the uploads to take over")
+
+        if options['watch'] is None:
+            failed = self.import_queued(options)
+            if failed:
+                raise CommandError(f"{failed} upload(s) failed; see their errors in the admin")
+            return
+
+        while True:
+            self.import_queued(options)
+            time.sleep(options['watch'])
+
+    def import_queued(self, options):
+        """Import each queued (or each given) upload; returns how many failed."""
+        if options['ids']:
+            uploads = CSVUpload.objects.exclude(status=CSVUpload.COMPLETE).filter(pk__in=options['ids'])
+        else:
+            uploads = CSVUpload.objects.filter(status=CSVUpload.PENDING)
+
+        failed = 0
+        for upload in uploads.order_by('pk'):
+            self.stdout.write(f"{upload} (resuming after row {upload.rows_committed})")
+            try:
+                totals = upload.import_csv(chunk_size=options['chunk_size'], force=options['force'])
+            except CSVUpload.AlreadyImporting:
+                self.stdout.write("  skipped: another process is importing it")
+                continue
+            except Exception:
+                # import_csv has recorded the error on the upload
+                logger.exception("CSV import of %s failed", upload)
+                self.stderr.write(f"  failed after row {upload.rows_committed}: {upload.error}")
+                failed += 1
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"  {totals['plants']} plant(s), {totals['common_names']} common name(s), "
+                f"{totals['phytochemicals']} phytochemical(s) imported"
+            ))
+        return failed
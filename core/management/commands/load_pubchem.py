@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.pubchem import load_properties, open_dump, read_properties
+
+
+class Command(BaseCommand):
+    help = "Load PubChem property dumps (CSV/TSV, optionally .gz) into CompoundProperties"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Local property dump files")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per upsert")
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Keep every CID in the dump, not just those used by a phytochemical",
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            started = time.perf_counter()
+            try:
+                with open_dump(path) as f:
+                    written = load_properties(
+                        read_properties(f),
+                        batch_size=options['batch_size'],
+                        only_known=not options['all'],
+                    )
+            except FileNotFoundError:
+                raise CommandError(f"Dump not found: {path}")
+            except ValueError as e:
+                raise CommandError(f"{path}: {e}")
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: upserted {written} compound(s) in {time.perf_counter() - started:.1f} s"
+            ))
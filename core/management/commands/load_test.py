@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core import loadtest, snapshot
+from core.synthetic import synthetic_database
+
+
+def parse_mix(text):
+    """'short=30,cid=10' -> {'short': 30, 'cid': 10}."""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in loadtest.SCENARIOS:
+            raise CommandError(f"Unknown request kind {kind!r}; use {', '.join(loadtest.SCENARIOS)}")
+        try:
+            mix[kind] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight in {part!r}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = "Replay a mix of searches and API calls from concurrent users and report throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+        parser.add_argument('--requests', type=int, default=0, help="Stop after this many requests in total")
+        parser.add_argument('--think', type=float, default=0, help="Up to this many seconds between a user's requests")
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--mix', type=parse_mix, default=dict(loadtest.DEFAULT_MIX),
+            help=f"Weighted request kinds, default {','.join(f'{k}={v}' for k, v in loadtest.DEFAULT_MIX.items())}",
+        )
+        parser.add_argument(
+            '--url',
+            help="Load an already running server at this base URL instead of a local one "
+                 "(terms still come from the local database)",
+        )
+        parser.add_argument(
+            '--synthetic-plants', type=int, default=0,
+            help="Run against a throwaway database with this many synthetic plants",
+        )
+        parser.add_argument('--compounds-per-plant', type=int, default=160)
+        parser.add_argument('--rate-limit', action='store_true', help="Keep search rate limiting on (local server)")
+        parser.add_argument('--cold', action='store_true', help="Disable the result cache (local server)")
+
+    def handle(self, *args, **options):
+        mix = options['mix']
+
+        with ExitStack() as stack:
+            tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            if options['synthetic_plants']:
+                # Own version stamp and snapshot directory so nothing built
+                # from the synthetic data is mistaken for the real data
+                stack.enter_context(override_settings(
+                    DATA_VERSION_FILE=os.path.join(tmp, 'data_version'),
+                    SNAPSHOT_DIR=os.path.join(tmp, 'snapshots'),
+                ))
+                counts = stack.enter_context(synthetic_database(
+                    options['synthetic_plants'], options['compounds_per_plant'],
+                    seed=options['seed'], path=os.path.join(tmp, 'loadtest.sqlite3'),
+                ))
+                self.stdout.write(
+                    f"Synthetic data: {counts['plants']} plants, {counts['phytochemicals']} phytochemicals"
+                )
+                if settings.SEARCH_BACKEND == 'snapshot':
+                    snapshot.publish()
+
+            terms = loadtest.Terms(seed=options['seed'])
+            if not terms.compounds or not terms.plants:
+                raise CommandError("The database has no plants or compounds to search for")
+
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+            else:
+                overrides = {
+                    'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, '127.0.0.1'],
+                    'SECURE_SSL_REDIRECT': False,
+                    'RATELIMIT_ENABLED': settings.RATELIMIT_ENABLED and options['rate_limit'],
+                }
+                if options['cold']:
+                    overrides['CACHES'] = {
+                        **settings.CACHES,
+                        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                    }
+                stack.enter_context(override_settings(**overrides))
+                base_url = stack.enter_context(loadtest.test_server())
+                loadtest.warm_up(base_url, terms, mix, options['timeout'], options['seed'])
+
+            self.stdout.write(
+                f"{options['users']} user(s) against {base_url} for "
+                f"{options['requests'] or ''}{' requests or ' if options['requests'] else ''}{options['duration']:g} s"
+            )
+            started = time.perf_counter()
+            results = loadtest.run(
+                base_url, terms, mix,
+                users=options['users'],
+                duration=options['duration'],
+                max_requests=options['requests'] or None,
+                think=options['think'],
+                timeout=options['timeout'],
+                seed=options['seed'],
+            )
+            elapsed = time.perf_counter() - started
+
+        lines = [f"  {'kind':<13} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} "
+                 f"{'p99 ms':>8} {'max ms':>8}  statuses"]
+        for row in loadtest.summarize(results, elapsed):
+            error_rate = row.errors / row.requests if row.requests else 0
+            statuses = ' '.join(f"{status or 'fail'}:{n}" for status, n in sorted(row.statuses.items()))
+            lines.append(
+                f"  {row.kind:<13} {row.requests:>8} {row.rate:>8.1f} {error_rate:>7.1%} "
+                f"{row.p50 * 1000:>8.1f} {row.p95 * 1000:>8.1f} {row.p99 * 1000:>8.1f} {row.max * 1000:>8.1f}  {statuses}"
+            )
+        self.stdout.write("\n".join(lines))
+        if not options['url']:
+            self.stdout.write(
+                "The local server shares this process with the load generator; use --url against "
+                "a production-like server (e.g. gunicorn) for absolute numbers."
+            )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import releases
+
+
+class Command(BaseCommand):
+    help = "Check the live tables, compile them into a dataset release and make it current"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help="Release version (default: timestamp)")
+        parser.add_argument('--notes', default='', help="What changed in this release")
+        parser.add_argument('--keep', type=int, default=3, help="Number of snapshot files to keep")
+        parser.add_argument(
+            '--max-shrink', type=float, default=None,
+            help="Largest share of plants/phytochemicals a release may drop (default RELEASE_MAX_SHRINK)",
+        )
+        parser.add_argument('--check', action='store_true', help="Only run the checks; publish nothing")
+        parser.add_argument('--force', action='store_true', help="Publish even if the checks find problems")
+
+    def handle(self, *args, **options):
+        problems = releases.problems(options['max_shrink'])
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(f"  {problem}"))
+        if options['check']:
+            if problems:
+                raise CommandError(f"{len(problems)} problem(s); not ready to publish")
+            self.stdout.write(self.style.SUCCESS("Ready to publish"))
+            return
+        if problems and not options['force']:
+            raise CommandError(f"{len(problems)} problem(s); fix them or publish with --force")
+
+        previous = releases.current_release()
+        release = releases.publish(options['name'], options['notes'], options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Published release {release.version}: "
+            f"{release.plants} plant(s), {release.phytochemicals} phytochemical(s)"
+            + (f" (was {previous.version})" if previous else "")
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import releases, snapshot
+from core.models import DatasetRelease
+
+
+class Command(BaseCommand):
+    help = "Make the previous dataset release (or a given one) current again"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', metavar='VERSION', help="Activate this release instead of the previous one")
+        parser.add_argument('--list', action='store_true', help="List releases and exit")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            live = snapshot.current_version()
+            for release in DatasetRelease.objects.all()[:50]:
+                state = 'live' if release.version == live else (
+                    'rolled back' if release.rolled_back_at else
+                    'published' if release.published_at else 'unpublished'
+                )
+                if not snapshot.exists(release.version):
+                    state += ', pruned'
+                self.stdout.write(
+                    f"  {release.version:<22} {state:<20} {release.plants:>6} plants "
+                    f"{release.phytochemicals:>8} phytochemicals  {release.notes}"
+                )
+            return
+
+        if options['to']:
+            release = DatasetRelease.objects.filter(version=options['to']).first()
+            if release is None:
+                raise CommandError(f"No release {options['to']!r}")
+            if not snapshot.exists(release.version):
+                raise CommandError(f"The snapshot of release {release.version} has been pruned")
+            releases.activate(release)
+        else:
+            release = releases.rollback()
+            if release is None:
+                raise CommandError("There is no earlier release to roll back to")
+        self.stdout.write(self.style.SUCCESS(f"Release {release.version} is now current"))
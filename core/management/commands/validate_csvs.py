@@ -0,0 +1,58 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core import validation
+
+DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
+REPORT_DIR = validation.REPORT_DIR
+
+
+def validate_files(paths, out_dir, stdout):
+    """Validate ``paths``, write their reports and return the number of rejected rows."""
+    rejected = 0
+    for path in paths:
+        try:
+            result = validation.validate_csv(path)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        except ValueError as e:
+            # Malformed CSV (e.g. a row with more fields than the header)
+            stdout.write(f"{os.path.basename(path)}: unreadable - {e}")
+            rejected += 1
+            continue
+
+        rejected += len(result.rejected)
+        warnings = int((result.issues['severity'] == 'warning').sum())
+        stdout.write(
+            f"{os.path.basename(path)}: {len(result.frame)} rows, "
+            f"{len(result.rejected)} rejected, {warnings} warning(s)"
+        )
+        for line in validation.summary(result):
+            stdout.write(f"  {line}")
+        for written in validation.write_reports(result, out_dir):
+            stdout.write(f"  wrote {written}")
+    return rejected
+
+
+class Command(BaseCommand):
+    help = "Check import CSVs (CID format, duplicates, orphan rows, encoding) without touching the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="CSV files (default: every CSV in data/)")
+        parser.add_argument('--out', default=REPORT_DIR, help="Directory for the issues/rejected-rows files")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any row is rejected")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or sorted(
+            os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.lower().endswith('.csv')
+        )
+        if not paths:
+            raise CommandError("No CSV files found.")
+
+        rejected = validate_files(paths, options['out'], self.stdout)
+        if rejected and options['strict']:
+            raise CommandError(f"{rejected} row(s) rejected; see the reports in {options['out']}")
+        self.stdout.write(self.style.SUCCESS(f"Validated {len(paths)} file(s), {rejected} row(s) rejected"))
@@ -0,0 +1,76 @@
+import os
+import posixpath
+import re
+from urllib.parse import urljoin, urlsplit
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.assets import VENDOR_ASSETS
+
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+
+def css_dependencies(css, cdn_url, path):
+    """``(url, static path)`` of the relative files (fonts, images) ``css`` refers to."""
+    for ref in CSS_URL_RE.findall(css):
+        if ref.startswith(('data:', '#', '/')) or urlsplit(ref).scheme:
+            continue
+        ref = urlsplit(ref).path
+        yield urljoin(cdn_url, ref), posixpath.normpath(posixpath.join(posixpath.dirname(path), ref))
+
+
+class Command(BaseCommand):
+    help = "Download the CDN assets (and the fonts their CSS refers to) into static/vendor/"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Download files that already exist")
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report missing files; exit with an error if any are",
+        )
+
+    def handle(self, *args, **options):
+        static_dir = settings.STATICFILES_DIRS[0]
+        missing = []
+
+        for name, (cdn_url, path) in VENDOR_ASSETS.items():
+            pending = [(cdn_url, path)]
+            while pending:
+                url, rel = pending.pop()
+                target = os.path.join(static_dir, *rel.split('/'))
+
+                if options['check']:
+                    if not os.path.exists(target):
+                        missing.append(rel)
+                    elif rel.endswith('.css'):
+                        with open(target, encoding='utf-8') as f:
+                            pending.extend(css_dependencies(f.read(), url, rel))
+                    continue
+
+                if os.path.exists(target) and not options['force']:
+                    with open(target, 'rb') as f:
+                        data = f.read()
+                else:
+                    try:
+                        with urlopen(url, timeout=30) as response:
+                            data = response.read()
+                    except OSError as e:
+                        raise CommandError(f"Could not fetch {url}: {e}")
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with open(target, 'wb') as f:
+                        f.write(data)
+                    self.stdout.write(f"{rel} ({len(data)} bytes)")
+
+                if rel.endswith('.css'):
+                    pending.extend(css_dependencies(data.decode('utf-8'), url, rel))
+
+        if missing:
+            raise CommandError("Missing vendored assets:\n  " + "\n  ".join(missing))
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS("All vendored assets present"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Vendored assets up to date; set SELF_HOSTED_ASSETS=True and run collectstatic"
+            ))
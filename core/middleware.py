@@ -0,0 +1,12 @@
+from . import changelog
+
+
+class ChangeSourceMiddleware:
+    """Attribute core model changes made by a request to it (see core.changelog)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with changelog.source(request=request):
+            return self.get_response(request)
@@ -0,0 +1,107 @@
+import re
+from urllib.parse import urlsplit
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A frozen copy of core.references as of this migration, so later changes to
+# the live key rules don't change what it does
+DOI_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)?(10\.\d{4,9}/\S+)$', re.IGNORECASE)
+URL_RE = re.compile(r'^(?:https?://|www\.)\S+$', re.IGNORECASE)
+
+
+def clean_reference(text):
+    if not text:
+        return ''
+    return ' '.join(text.replace('\xa0', ' ').split())
+
+
+def normalize_reference(text):
+    text = clean_reference(text)
+    if not text:
+        return ''
+
+    m = DOI_RE.match(text)
+    if m:
+        return 'doi:' + m.group(1).rstrip('.').lower()
+
+    if URL_RE.match(text):
+        parts = urlsplit(text if '://' in text else 'http://' + text)
+        host = parts.netloc.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        key = host + parts.path.rstrip('/')
+        if parts.query:
+            key += '?' + parts.query
+        return 'url:' + key
+
+    return 'text:' + text.casefold()
+
+
+def populate_references(apps, schema_editor):
+    Phytochemical = apps.get_model('core', 'Phytochemical')
+    Reference = apps.get_model('core', 'Reference')
+
+    # Group phytochemical ids by normalised reference key
+    texts = {}
+    ids_by_key = {}
+    rows = Phytochemical.objects.exclude(reference='').values_list('id', 'reference')
+    for pk, raw in rows.iterator():
+        key = normalize_reference(raw)
+        if not key:
+            continue
+        texts.setdefault(key, clean_reference(raw))
+        ids_by_key.setdefault(key, []).append(pk)
+
+    Reference.objects.bulk_create(
+        [Reference(key=key, text=text) for key, text in texts.items()],
+        batch_size=500,
+    )
+    ref_ids = dict(Reference.objects.values_list('key', 'id'))
+
+    for key, pks in ids_by_key.items():
+        for start in range(0, len(pks), 500):
+            Phytochemical.objects.filter(id__in=pks[start:start + 500]).update(
+                reference_link_id=ref_ids[key]
+            )
+
+
+def restore_reference_text(apps, schema_editor):
+    Phytochemical = apps.get_model('core', 'Phytochemical')
+    Reference = apps.get_model('core', 'Reference')
+
+    for ref_id, text in Reference.objects.values_list('id', 'text').iterator():
+        Phytochemical.objects.filter(reference_link_id=ref_id).update(reference=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_csvupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.TextField(unique=True)),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='phytochemical',
+            name='reference_link',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='phytochemicals', to='core.reference'),
+        ),
+        migrations.RunPython(populate_references, restore_reference_text),
+        migrations.RemoveField(
+            model_name='phytochemical',
+            name='reference',
+        ),
+        migrations.RenameField(
+            model_name='phytochemical',
+            old_name='reference_link',
+            new_name='reference',
+        ),
+    ]
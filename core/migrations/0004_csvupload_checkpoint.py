@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_complete(apps, schema_editor):
+    # Uploads from before checkpoints were imported in full on save
+    CSVUpload = apps.get_model('core', 'CSVUpload')
+    CSVUpload.objects.update(status='complete')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvupload',
+            name='current_plant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.plant'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='rows_committed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('importing', 'Importing'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_complete, migrations.RunPython.noop),
+    ]
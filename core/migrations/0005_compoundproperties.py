@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_csvupload_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompoundProperties',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cid', models.CharField(max_length=100, unique=True)),
+                ('molecular_formula', models.CharField(blank=True, max_length=255)),
+                ('molecular_weight', models.FloatField(blank=True, null=True)),
+                ('inchikey', models.CharField(blank=True, max_length=27)),
+                ('smiles', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'compound properties',
+            },
+        ),
+    ]
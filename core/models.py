@@ -18,11 +18,22 @@ class CommonName(models.Model):
         return self.name
 
 
+class Reference(models.Model):
+    # Normalised DOI/URL/text key (see core.references.normalize_reference)
+    key = models.TextField(unique=True)
+    text = models.TextField()
+
+    def __str__(self):
+        return self.text
+
+
 class Phytochemical(models.Model):
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='phytochemicals')
     compound_name = models.CharField(max_length=255)
     cid = models.CharField(max_length=100, blank=True)
-    reference = models.TextField(blank=True)
+    reference = models.ForeignKey(
+        Reference, on_delete=models.SET_NULL, null=True, blank=True, related_name='phytochemicals'
+    )
 
     class Meta:
         unique_together = ('plant', 'compound_name', 'cid')
@@ -31,92 +42,268 @@ class Phytochemical(models.Model):
         return self.compound_name
 
 
+class CompoundProperties(models.Model):
+    # PubChem properties by CID, loaded from local dumps (see core.pubchem)
+    cid = models.CharField(max_length=100, unique=True)
+    molecular_formula = models.CharField(max_length=255, blank=True)
+    molecular_weight = models.FloatField(null=True, blank=True)
+    inchikey = models.CharField(max_length=27, blank=True)
+    smiles = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'compound properties'
+
+    def __str__(self):
+        return f"CID {self.cid}"
+
+
+class DatasetRelease(models.Model):
+    # A published search snapshot (see core.releases); the snapshot
+    # directory's CURRENT pointer says which release is live
+    version = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    rolled_back_at = models.DateTimeField(null=True, blank=True)
+    # Data version stamp of the tables the snapshot was compiled from
+    data_version = models.CharField(max_length=32, blank=True)
+    plants = models.PositiveIntegerField(default=0)
+    phytochemicals = models.PositiveIntegerField(default=0)
+    notes = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return self.version
+
+
+class ChangeLog(models.Model):
+    # Append-only history of Plant/CommonName/Phytochemical writes (see
+    # core.changelog); ``data`` holds the row after an insert or update and
+    # before a delete
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    model = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    data = models.JSONField(default=dict)
+    # What made the change ('admin', 'upload:<CSVUpload id>', 'import:<run>', ...)
+    source = models.CharField(max_length=100, blank=True)
+    user = models.CharField(max_length=150, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['model', 'object_id'])]
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_id}"
+
+
 
 
 
 # models.py
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
+import codecs
 import csv
+from itertools import islice
 from core.models import Plant, CommonName, Phytochemical
+from core.references import ReferenceCache
+from core import changelog, dataversion
+
+
+def detect_encoding(path, block_size=1 << 20):
+    """UTF-8 (with optional BOM) if the whole file decodes as such, else Latin1."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'latin1'
+    return 'utf-8-sig'
+
 
 class CSVUpload(models.Model):
+    PENDING = 'pending'
+    IMPORTING = 'importing'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (IMPORTING, 'Importing'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    ]
+
     file = models.FileField(upload_to='data/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # Import checkpoint: data rows committed so far and the plant that
+    # continuation rows after that offset belong to
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    rows_committed = models.PositiveIntegerField(default=0)
+    current_plant = models.ForeignKey(Plant, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+
     def __str__(self):
         return self.file.name
 
-    def import_csv(self):
+    class AlreadyImporting(Exception):
+        pass
+
+    def reset(self):
+        """Start the import again from the first row (for a replaced file)."""
+        self.status = self.PENDING
+        self.rows_committed = 0
+        self.current_plant = None
+        self.error = ''
+
+    def claim(self, force=False):
+        """
+        Mark this upload IMPORTING unless it is complete or (without
+        ``force``, for taking over from a crashed worker) already being
+        imported, and reload its checkpoint. The status check and update
+        are one UPDATE, so two processes can't both claim it. Returns
+        whether it was claimed.
+        """
+        claimable = CSVUpload.objects.filter(pk=self.pk).exclude(status=self.COMPLETE)
+        if not force:
+            claimable = claimable.exclude(status=self.IMPORTING)
+        if not claimable.update(status=self.IMPORTING, error=''):
+            return False
+        self.refresh_from_db(fields=['status', 'rows_committed', 'current_plant', 'error'])
+        return True
+
+    def validate(self):
+        """
+        Check the file with core.validation and write its reports; raises
+        ValueError if any row is rejected.
+        """
+        from core import validation
+
+        result = validation.validate_csv(self.file.path)
+        written = validation.write_reports(result, validation.REPORT_DIR)
+        if not result.rejected.empty:
+            errors = result.issues.loc[result.issues['severity'] == 'error', 'check']
+            raise ValueError(
+                f"validation rejected {len(result.rejected)} row(s) "
+                f"({', '.join(sorted(set(errors)))}); see {written[-1]}"
+            )
+
+    @dataversion.deferred()
+    def import_csv(self, chunk_size=None, force=False):
         """
         Reads the uploaded CSV and imports Plants, CommonNames, Phytochemicals.
-        Returns a dict with totals for admin messages.
+
+        The upload is claimed first (see ``claim``); AlreadyImporting is
+        raised if another process is importing it.
+
+        With ``CSV_UPLOAD_VALIDATE`` the file is validated (see ``validate``)
+        before the first chunk is written and nothing is imported if any row
+        is rejected. Rows are
+        committed in chunks of ``chunk_size`` (default
+        ``CSV_IMPORT_CHUNK_SIZE``), each chunk in the same transaction as the
+        checkpoint, so calling this again after a failure resumes after the
+        last committed chunk. Returns a dict with totals for admin messages.
         """
-        total_plants = 0
-        total_common_names = 0
-        total_phytochemicals = 0
+        chunk_size = chunk_size or settings.CSV_IMPORT_CHUNK_SIZE
+        totals = {"plants": 0, "common_names": 0, "phytochemicals": 0}
 
-        file_path = self.file.path
+        if self.status == self.COMPLETE:
+            return totals
+        if not self.claim(force):
+            self.refresh_from_db(fields=['status'])
+            if self.status == self.COMPLETE:
+                return totals
+            raise self.AlreadyImporting(f"{self} is already being imported")
+
+        current_plant = self.current_plant
+        references = ReferenceCache()
 
-        # Try UTF-8 first, fallback to Latin1
         try:
-            with open(file_path, encoding='utf-8-sig', newline='') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-        except UnicodeDecodeError:
-            with open(file_path, encoding='latin1', newline='') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-
-        current_plant = None
-
-        for row in rows:
-            # Normalize headers to lowercase
-            row = {k.strip().lower(): (v or '').strip() for k, v in row.items()}
-
-            plant_name = row.get('plant name', '')
-            common_name = row.get('common name', '')
-            compound = row.get('phytochemicals', '')
-            cid = row.get('cid', '').replace('\xa0', '')
-            reference = row.get('reference', '')
-
-            if not compound:
-                continue
-
-            # Create or get Plant
-            if plant_name:
-                current_plant, created = Plant.objects.get_or_create(
-                    scientific_name=plant_name
-                )
-                if created:
-                    total_plants += 1
-
-            if not current_plant:
-                continue
-
-            # Create or get CommonName
-            if common_name:
-                cn_obj, created = CommonName.objects.get_or_create(
-                    plant=current_plant,
-                    name=common_name
-                )
-                if created:
-                    total_common_names += 1
-
-            # Create or get Phytochemical
-            obj, created = Phytochemical.objects.get_or_create(
+            if settings.CSV_UPLOAD_VALIDATE and not self.rows_committed:
+                self.validate()
+            with open(self.file.path, encoding=detect_encoding(self.file.path), newline='') as f:
+                rows = islice(csv.DictReader(f), self.rows_committed, None)
+                while True:
+                    chunk = list(islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    with transaction.atomic(), changelog.source(f"upload:{self.pk}"), changelog.batched():
+                        for row in chunk:
+                            current_plant = self._import_row(row, current_plant, references, totals)
+                        self.rows_committed += len(chunk)
+                        self.current_plant = current_plant
+                        self.save(update_fields=['rows_committed', 'current_plant'])
+        except Exception as e:
+            # Drop the in-memory progress of the chunk that was rolled back
+            self.refresh_from_db(fields=['rows_committed', 'current_plant'])
+            self.status = self.FAILED
+            self.error = f"{type(e).__name__}: {e}"
+            self.save(update_fields=['status', 'error'])
+            raise
+
+        self.status = self.COMPLETE
+        self.save(update_fields=['status'])
+        return totals
+
+    def _import_row(self, row, current_plant, references, totals):
+        """Import one CSV row; returns the plant continuation rows belong to."""
+        # Normalize headers to lowercase
+        row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+
+        plant_name = row.get('plant name', '')
+        common_name = row.get('common name', '')
+        compound = row.get('phytochemicals', '')
+        cid = row.get('cid', '').replace('\xa0', '')
+        reference = row.get('reference', '')
+
+        if not compound:
+            return current_plant
+
+        # Create or get Plant
+        if plant_name:
+            current_plant, created = Plant.objects.get_or_create(
+                scientific_name=plant_name
+            )
+            if created:
+                totals['plants'] += 1
+
+        if not current_plant:
+            return current_plant
+
+        # Create or get CommonName
+        if common_name:
+            cn_obj, created = CommonName.objects.get_or_create(
                 plant=current_plant,
-                compound_name=compound,
-                cid=cid,
-                defaults={'reference': reference}
+                name=common_name
             )
-            if not created and not obj.reference and reference:
-                obj.reference = reference
-                obj.save()
+            if created:
+                totals['common_names'] += 1
 
-            total_phytochemicals += 1
+        # Create or get Phytochemical
+        reference_id = references.resolve(reference)
+        obj, created = Phytochemical.objects.get_or_create(
+            plant=current_plant,
+            compound_name=compound,
+            cid=cid,
+            defaults={'reference_id': reference_id}
+        )
+        if not created and not obj.reference_id and reference_id:
+            obj.reference_id = reference_id
+            obj.save(update_fields=['reference'])
 
-        return {
-            "plants": total_plants,
-            "common_names": total_common_names,
-            "phytochemicals": total_phytochemicals
-        }
+        totals['phytochemicals'] += 1
+        return current_plant
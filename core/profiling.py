@@ -0,0 +1,73 @@
+import time
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        totals = self.timer.totals
+        totals[self.name] = totals.get(self.name, 0.0) + elapsed
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time per named phase::
+
+        with timer.phase('parse'):
+            ...
+
+    A disabled timer hands out a shared no-op context, so instrumented code
+    costs next to nothing when profiling is off.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.totals = {}
+
+    def phase(self, name):
+        return _Phase(self, name) if self.enabled else _NO_PHASE
+
+    def merge(self, other):
+        for name, seconds in other.totals.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def report(self, phases=None):
+        """Lines of ``phase: seconds (share)``, in ``phases`` order if given."""
+        names = phases or sorted(self.totals, key=self.totals.get, reverse=True)
+        total = sum(self.totals.values()) or 1.0
+        return [
+            f"{name:>12}: {self.totals.get(name, 0.0):8.3f} s ({100 * self.totals.get(name, 0.0) / total:5.1f}%)"
+            for name in names
+        ]
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` hook counting executed statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,166 @@
+"""
+Offline PubChem compound properties.
+
+``load_properties`` streams a local property dump into CompoundProperties
+with batched upserts; ``get_properties`` serves lookups from the live
+search snapshot, which carries the properties shown in results, or else
+from an in-process LRU cache, so search results can show them without
+per-request queries or any call to PubChem.
+
+Dumps are the CSV/TSV files PubChem's property downloads produce (a header
+row with CID and any of MolecularFormula, MolecularWeight, InChIKey and
+SMILES/IsomericSMILES/CanonicalSMILES), optionally gzipped.
+"""
+import csv
+import gzip
+import threading
+from collections import OrderedDict, namedtuple
+from itertools import islice
+
+from django.db import transaction
+
+from . import dataversion, releases
+from .models import CompoundProperties, Phytochemical
+
+# dump column (lowercased) -> CompoundProperties field; earlier SMILES
+# columns win
+COLUMNS = {
+    'cid': 'cid',
+    'molecularformula': 'molecular_formula',
+    'molecularweight': 'molecular_weight',
+    'inchikey': 'inchikey',
+    'smiles': 'smiles',
+    'isomericsmiles': 'smiles',
+    'canonicalsmiles': 'smiles',
+    'connectivitysmiles': 'smiles',
+}
+FIELDS = ['molecular_formula', 'molecular_weight', 'inchikey', 'smiles']
+
+Properties = namedtuple('Properties', FIELDS)
+
+
+def open_dump(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def read_properties(f):
+    """
+    Yield ``(cid, {field: value})`` from an open dump, one row at a time.
+    Rows without a numeric CID are skipped.
+    """
+    header = f.readline()
+    delimiter = '\t' if header.count('\t') > header.count(',') else ','
+    names = next(csv.reader([header], delimiter=delimiter))
+
+    columns = {}
+    for i, name in enumerate(names):
+        field = COLUMNS.get(name.strip().strip('"').lower())
+        if field and field not in columns.values():
+            columns[i] = field
+    if 'cid' not in columns.values():
+        raise ValueError("Dump has no CID column")
+
+    for row in csv.reader(f, delimiter=delimiter):
+        values = {field: row[i].strip() for i, field in columns.items() if i < len(row)}
+        cid = values.pop('cid', '')
+        if not cid.isdigit():
+            continue
+        try:
+            values['molecular_weight'] = float(values['molecular_weight'])
+        except (KeyError, ValueError):
+            values['molecular_weight'] = None
+        yield cid, values
+
+
+def load_properties(records, batch_size=1000, only_known=True):
+    """
+    Upsert ``(cid, values)`` records in batches of ``batch_size``. With
+    ``only_known`` (the default) only CIDs used by a Phytochemical are
+    kept, since full PubChem dumps hold over a hundred million compounds.
+    Returns the number of rows written.
+    """
+    if only_known:
+        known = set(Phytochemical.objects.exclude(cid='').values_list('cid', flat=True).iterator())
+        records = ((cid, values) for cid, values in records if cid in known)
+
+    written = 0
+    with dataversion.deferred():
+        while True:
+            batch = [
+                CompoundProperties(cid=cid, **{f: values.get(f, '') for f in FIELDS})
+                for cid, values in islice(records, batch_size)
+            ]
+            if not batch:
+                break
+            with transaction.atomic():
+                CompoundProperties.objects.bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=['cid'],
+                    update_fields=FIELDS + ['updated_at'],
+                )
+            written += len(batch)
+        if written:
+            dataversion.bump()
+    return written
+
+
+class PropertiesCache:
+    """
+    Bounded LRU of ``cid -> Properties`` (or None for unknown CIDs), filled
+    a batch of misses at a time and emptied when the data version moves.
+    """
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_many(self, cids):
+        """``{cid: Properties}`` for those of ``cids`` that have properties."""
+        cids = {c for c in cids if c}
+        version = dataversion.data_version()
+        found = {}
+
+        with self._lock:
+            if self._version != version:
+                self._entries.clear()
+                self._version = version
+            missing = []
+            for cid in cids:
+                if cid in self._entries:
+                    self._entries.move_to_end(cid)
+                    if self._entries[cid] is not None:
+                        found[cid] = self._entries[cid]
+                else:
+                    missing.append(cid)
+
+        if missing:
+            loaded = {}
+            for start in range(0, len(missing), 500):
+                rows = CompoundProperties.objects.filter(cid__in=missing[start:start + 500])
+                for cid, *values in rows.values_list('cid', *FIELDS):
+                    loaded[cid] = Properties(*values)
+            found.update(loaded)
+
+            with self._lock:
+                for cid in missing:
+                    self._entries[cid] = loaded.get(cid)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return found
+
+
+_cache = PropertiesCache()
+
+
+def get_properties(cids):
+    """``{cid: Properties}`` for those of ``cids`` that have properties."""
+    snap = releases.live_snapshot()
+    if snap is not None and snap.has_properties:
+        # Results don't show SMILES, so snapshots leave it out
+        return {cid: Properties(*values, '') for cid, values in snap.properties(cids).items()}
+    return _cache.get_many(cids)
@@ -0,0 +1,96 @@
+"""
+Predicts how many phytochemical rows a search will match before running it.
+
+For every trigram the model keeps the number of rows reachable through a
+searchable string containing it: a plant name counts all of the plant's
+phytochemicals, a compound name or CID counts its rows. A string that
+contains the query contains every trigram of the query, so the smallest of
+those counts is an upper bound on the matches; like pg_trgm selectivity it
+is cheap and usually close for real queries.
+
+When searches are served from a snapshot the counts come from its posting
+lists, so estimating never touches the database; the model is rebuilt when
+the release id (see ``core.releases``) moves.
+"""
+import threading
+
+from django.db.models import Count
+
+from . import releases
+from .fuzzy import normalize, trigrams
+from .models import CommonName, Phytochemical, Plant
+
+
+class CostModel:
+    def __init__(self, weighted_strings, total):
+        self.total = total
+        grams = {}
+        for text, weight in weighted_strings:
+            for gram in trigrams(normalize(text)):
+                grams[gram] = grams.get(gram, 0) + weight
+        self.grams = grams
+
+    @classmethod
+    def from_database(cls):
+        plant_rows = dict(
+            Plant.objects.annotate(n=Count('phytochemicals')).values_list('id', 'n').iterator()
+        )
+        strings = []
+        strings += [
+            (name, plant_rows[pk])
+            for pk, name in Plant.objects.values_list('id', 'scientific_name').iterator()
+        ]
+        strings += [
+            (name, plant_rows[plant_id])
+            for plant_id, name in CommonName.objects.values_list('plant_id', 'name').iterator()
+        ]
+        for field in ('compound_name', 'cid'):
+            strings += (
+                Phytochemical.objects.exclude(**{field: ''})
+                .values(field).annotate(n=Count('id')).order_by()
+                .values_list(field, 'n').iterator()
+            )
+        return cls(strings, sum(plant_rows.values()))
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        # A string's posting list holds the rows searching for it reaches
+        offsets = snap.post_offsets
+        return cls(
+            (
+                (snap.string(sid), offsets[sid + 1] - offsets[sid])
+                for sid in range(len(offsets) - 1)
+                if offsets[sid + 1] > offsets[sid]
+            ),
+            len(snap.row_id),
+        )
+
+    def estimate(self, query):
+        """Upper bound on the rows ``query`` matches (all rows below three characters)."""
+        grams = trigrams(normalize(query))
+        if not grams:
+            return self.total
+        return min(self.total, min(self.grams.get(g, 0) for g in grams))
+
+
+_lock = threading.Lock()
+_model = None
+_model_version = None
+
+
+def get_model():
+    """The process-wide CostModel, rebuilt whenever the release id moves."""
+    global _model, _model_version
+
+    snap = releases.live_snapshot()
+    version = releases.release_id(snap)
+    if _model is None or _model_version != version:
+        with _lock:
+            if _model is None or _model_version != version:
+                _model = CostModel.from_snapshot(snap) if snap is not None else CostModel.from_database()
+                _model_version = version
+    return _model
+
+
+def estimate(query):
+    return get_model().estimate(query)
@@ -0,0 +1,70 @@
+"""
+Per-client token buckets for the public search endpoint.
+
+Each client has a bucket of ``RATELIMIT_BURST`` tokens refilled at
+``RATELIMIT_RATE`` tokens per second; a search takes tokens according to
+its estimated cost. Buckets live in the ``ratelimit`` cache (local memory
+by default, so per worker process).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, cache_alias='ratelimit', prefix='bucket'):
+        self.rate = rate
+        self.burst = burst
+        self.cache_alias = cache_alias
+        self.prefix = prefix
+        # An idle bucket is full again after this long, so it can expire
+        self.timeout = math.ceil(burst / rate) + 1
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1):
+        """
+        Take ``cost`` tokens from ``key``'s bucket. Returns 0 if they were
+        available, else the seconds until they will be (nothing is taken).
+        """
+        cache = caches[self.cache_alias]
+        cache_key = f"{self.prefix}:{key}"
+        cost = min(cost, self.burst)
+
+        with self._lock:
+            now = time.time()
+            tokens, stamp = cache.get(cache_key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens >= cost:
+                cache.set(cache_key, (tokens - cost, now), self.timeout)
+                return 0
+            cache.set(cache_key, (tokens, now), self.timeout)
+            return (cost - tokens) / self.rate
+
+
+def client_key(request):
+    """
+    The client's address. Behind a reverse proxy set ``RATELIMIT_CLIENT_HEADER``
+    (e.g. 'HTTP_X_FORWARDED_FOR'); the last entry, added by the proxy itself,
+    is used so clients can't pick their own bucket.
+    """
+    header = settings.RATELIMIT_CLIENT_HEADER
+    if header and request.META.get(header):
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+_search_bucket = None
+
+
+def throttle_search(request, cost=1):
+    """Seconds the client must wait before this search (0: go ahead)."""
+    global _search_bucket
+
+    if not settings.RATELIMIT_ENABLED:
+        return 0
+    if _search_bucket is None:
+        _search_bucket = TokenBucket(settings.RATELIMIT_RATE, settings.RATELIMIT_BURST, prefix='search')
+    return _search_bucket.take(client_key(request), cost)
@@ -0,0 +1,82 @@
+import re
+from urllib.parse import urlsplit
+
+
+DOI_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)?(10\.\d{4,9}/\S+)$', re.IGNORECASE)
+URL_RE = re.compile(r'^(?:https?://|www\.)\S+$', re.IGNORECASE)
+
+
+def clean_reference(text):
+    """Collapse whitespace (including NBSP) in a raw reference cell."""
+    if not text:
+        return ''
+    return ' '.join(text.replace('\xa0', ' ').split())
+
+
+def normalize_reference(text):
+    """
+    Return the dedup key for a raw reference string.
+
+    DOIs (bare, ``doi:`` or ``doi.org`` links) become ``doi:<lowercased doi>``,
+    web links become ``url:<host><path>`` without scheme, ``www.`` or trailing
+    slash, and anything else becomes ``text:<casefolded text>``.
+    """
+    text = clean_reference(text)
+    if not text:
+        return ''
+
+    m = DOI_RE.match(text)
+    if m:
+        return 'doi:' + m.group(1).rstrip('.').lower()
+
+    if URL_RE.match(text):
+        parts = urlsplit(text if '://' in text else 'http://' + text)
+        host = parts.netloc.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        key = host + parts.path.rstrip('/')
+        if parts.query:
+            key += '?' + parts.query
+        return 'url:' + key
+
+    return 'text:' + text.casefold()
+
+
+def reference_source(key):
+    """Where a Reference key points: 'doi', the link's host, or 'text'."""
+    kind, _, rest = key.partition(':')
+    if kind == 'url':
+        return rest.split('/', 1)[0].split('?', 1)[0] or 'text'
+    return 'doi' if kind == 'doi' else 'text'
+
+
+class ReferenceCache:
+    """
+    In-memory ``key -> Reference id`` map used by the import paths so each
+    distinct reference costs one query at most, instead of one per row.
+    """
+
+    def __init__(self):
+        self._ids = None
+
+    def _load(self):
+        from core.models import Reference
+        self._ids = dict(Reference.objects.values_list('key', 'id'))
+
+    def resolve(self, text):
+        """Return the Reference id for ``text``, creating it if needed."""
+        from core.models import Reference
+
+        key = normalize_reference(text)
+        if not key:
+            return None
+        if self._ids is None:
+            self._load()
+
+        ref_id = self._ids.get(key)
+        if ref_id is None:
+            ref_id = Reference.objects.get_or_create(
+                key=key, defaults={'text': clean_reference(text)}
+            )[0].id
+            self._ids[key] = ref_id
+        return ref_id
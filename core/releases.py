@@ -0,0 +1,174 @@
+"""
+Versioned dataset releases.
+
+Imports and admin edits write to the live tables, which act as staging. A
+release freezes them into a search snapshot: ``problems`` checks they are
+fit to publish, ``publish`` compiles the snapshot, records a
+DatasetRelease and then swaps the snapshot ``CURRENT`` pointer, and
+``rollback`` points it back at the previous release. With
+``SEARCH_BACKEND = 'snapshot'`` (the default) the public search only ever
+sees whole releases, and ``release_id`` gives caches and ETags a key that changes
+exactly when a release is published or rolled back.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core import checks
+from django.db.models import Count
+from django.utils import timezone
+
+from . import dataversion, maintenance, snapshot
+from .models import CSVUpload, DatasetRelease, Phytochemical, Plant
+
+
+def live_snapshot():
+    """The published snapshot public searches are served from, or None."""
+    if settings.SEARCH_BACKEND == 'snapshot':
+        return snapshot.current()
+    return None
+
+
+def check_search_backend(app_configs, **kwargs):
+    """System check: warn while public searches read the live tables."""
+    if settings.SEARCH_BACKEND != 'snapshot':
+        return [checks.Warning(
+            "SEARCH_BACKEND is 'orm': public searches read the live tables, "
+            "including half-imported and failed uploads.",
+            hint="Use SEARCH_BACKEND = 'snapshot' outside development.",
+            id='core.W001',
+        )]
+    if snapshot.current_version() is None:
+        return [checks.Warning(
+            "No release has been published: public searches read the live "
+            "tables until one is.",
+            hint="Run `manage.py publish_release`.",
+            id='core.W002',
+        )]
+    return []
+
+
+def release_id(snap=None):
+    """
+    The version public caches key on: the live release (``snap``, by
+    default the live snapshot) when searches are served from snapshots,
+    else the data version of the live tables.
+    """
+    snap = snap or live_snapshot()
+    if snap is not None:
+        return f"r{snap.version}"
+    return f"d{dataversion.data_version()}"
+
+
+def etag(request):
+    """Weak ETag for a public GET: the release and the full path."""
+    digest = hashlib.sha1(f"{release_id()}:{request.get_full_path()}".encode('utf-8')).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def current_release():
+    """The DatasetRelease ``CURRENT`` points at, or None."""
+    version = snapshot.current_version()
+    return DatasetRelease.objects.filter(version=version).first() if version else None
+
+
+def problems(max_shrink=None):
+    """
+    Reasons the live tables should not be published yet; empty when they
+    can be. Releases that would drop more than ``max_shrink`` (a fraction,
+    default ``RELEASE_MAX_SHRINK``) of the current release's rows count as
+    a problem.
+    """
+    if max_shrink is None:
+        max_shrink = settings.RELEASE_MAX_SHRINK
+    found = []
+
+    for upload in CSVUpload.objects.filter(status__in=[CSVUpload.IMPORTING, CSVUpload.FAILED]):
+        found.append(
+            f"CSV upload {upload} is {upload.status} after {upload.rows_committed} row(s); "
+            "resume or remove it first"
+        )
+
+    if not maintenance.is_postgresql():
+        found += maintenance.integrity_problems(quick=True)
+
+    plants = Plant.objects.count()
+    phytochemicals = Phytochemical.objects.count()
+    if not phytochemicals:
+        found.append("There are no phytochemicals to publish")
+    if Phytochemical.objects.filter(compound_name='').exists():
+        found.append("Some phytochemicals have an empty compound name")
+    empty = Plant.objects.annotate(n=Count('phytochemicals')).filter(n=0).count()
+    if empty:
+        found.append(f"{empty} plant(s) have no phytochemicals")
+
+    live = current_release()
+    if live is not None:
+        for label, before, after in [
+            ('plants', live.plants, plants),
+            ('phytochemicals', live.phytochemicals, phytochemicals),
+        ]:
+            if before and (before - after) / before > max_shrink:
+                found.append(f"{label} would drop from {before} to {after} (more than {max_shrink:.0%})")
+    return found
+
+
+def publish(version=None, notes='', keep=3):
+    """
+    Compile the live tables into a new release and make it current.
+    Callers check ``problems()`` first. Snapshot files beyond the newest
+    ``keep`` are pruned, except the previous release's, which rollback
+    needs. Returns the DatasetRelease.
+    """
+    previous = current_release()
+    stamp = dataversion.data_version()
+    version, counts = snapshot.build(version)
+    release = DatasetRelease.objects.create(
+        version=version,
+        data_version=stamp,
+        plants=counts['plants'],
+        phytochemicals=counts['rows'],
+        notes=notes,
+    )
+
+    snapshot.set_current(version)
+    release.published_at = timezone.now()
+    release.save(update_fields=['published_at'])
+
+    snapshot.prune(keep, protect={version} | ({previous.version} if previous else set()))
+    return release
+
+
+def rollback_target():
+    """The release published before the current one whose snapshot still exists, or None."""
+    live = current_release()
+    candidates = DatasetRelease.objects.filter(published_at__isnull=False, rolled_back_at__isnull=True)
+    if live is not None:
+        candidates = candidates.exclude(pk=live.pk).filter(published_at__lt=live.published_at)
+    for release in candidates.order_by('-published_at'):
+        if snapshot.exists(release.version):
+            return release
+    return None
+
+
+def activate(release):
+    """
+    Make ``release`` current. Moving back from the current release marks
+    that one rolled back, so a later rollback skips it.
+    """
+    live = current_release()
+    snapshot.set_current(release.version)
+    if release.published_at is None:
+        release.published_at = timezone.now()
+    elif live is not None and live.pk != release.pk and live.published_at > release.published_at:
+        live.rolled_back_at = timezone.now()
+        live.save(update_fields=['rolled_back_at'])
+    release.rolled_back_at = None
+    release.save(update_fields=['published_at', 'rolled_back_at'])
+
+
+def rollback():
+    """Step back to the previous release; returns it, or None if there is none."""
+    target = rollback_target()
+    if target is not None:
+        activate(target)
+    return target
@@ -0,0 +1,102 @@
+"""
+Bulk rendering of the search results table. Rows are formatted with plain
+string operations instead of a template loop, and the rendered ``<tbody>``
+is cached per query, facet filters, page and release (see
+``core.releases.release_id``).
+"""
+import hashlib
+from html import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from . import facets, pubchem, releases
+from .search import MAX_RESULTS, search_rows
+
+ROW = (
+    '<tr><td>{}</td><td>{}</td><td>{}</td><td>CID: {}</td>'
+    '<td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>\n'
+)
+NO_PROPERTIES = pubchem.Properties('', None, '', '')
+LINK = '<a href="{}{}{}">Link</a>'
+
+
+def render_rows(rows):
+    """
+    ``<tr>`` markup for ``ResultRow`` tuples; cell for cell the output of
+    the loop bmppd_result.html used to run, plus the compound's PubChem
+    formula, weight and InChIKey. The reference URL is reversed once and
+    the id spliced in per row.
+    """
+    head, tail = reverse('reference', args=[0]).rsplit('0', 1)
+    properties = pubchem.get_properties(row[3] for row in rows)
+
+    def cells(cid):
+        props = properties.get(cid, NO_PROPERTIES)
+        return (
+            escape(props.molecular_formula) or '-',
+            f"{props.molecular_weight:g}" if props.molecular_weight is not None else '-',
+            escape(props.inchikey) or '-',
+        )
+
+    return mark_safe(''.join([
+        ROW.format(
+            escape(plant_name),
+            escape(common_name) if common_name else '-',
+            escape(compound_name),
+            escape(cid) if cid else '-',
+            *cells(cid),
+            LINK.format(head, reference_id, tail) if reference_id else '-',
+        )
+        for plant_name, common_name, compound_name, cid, reference_id in rows
+    ]))
+
+
+def cache_key(query, page, filters=None):
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    rows = f"{page}x{settings.RESULTS_PAGE_SIZE}" if page else f"all{MAX_RESULTS}"
+    if filters:
+        digest += ':' + facets.filters_digest(filters)
+    return f"results:{releases.release_id()}:{rows}:{digest}"
+
+
+def cached_result_table(query, page=None, filters=None):
+    """The cached ``result_table(query, page, filters)``, or None."""
+    hit = cache.get(cache_key(query, page, filters))
+    if hit is None:
+        return None
+    count, html, has_next = hit
+    return count, mark_safe(html), has_next
+
+
+def result_table(query, page=None, filters=None, indexed=True):
+    """
+    ``(row count, rendered <tbody> rows, has next page)`` for ``query``
+    narrowed by the facet ``filters`` (through the facet index unless
+    ``indexed`` is false): the first MAX_RESULTS rows, or page ``page``
+    (1-based) of ``RESULTS_PAGE_SIZE`` rows. Served from the fragment cache
+    when it was rendered since the data last changed.
+    """
+    hit = cached_result_table(query, page, filters)
+    if hit is not None:
+        return hit
+
+    def fetch(limit, offset=0):
+        if filters:
+            return facets.filtered_rows(query, filters, limit, offset, indexed)
+        return search_rows(query, limit, offset)
+
+    if page is None:
+        rows = fetch(MAX_RESULTS)
+        has_next = False
+    else:
+        size = settings.RESULTS_PAGE_SIZE
+        rows = fetch(size + 1, (page - 1) * size)
+        has_next = len(rows) > size
+        rows = rows[:size]
+
+    html = render_rows(rows)
+    cache.set(cache_key(query, page, filters), (len(rows), str(html), has_next), settings.RESULTS_CACHE_TIMEOUT)
+    return len(rows), html, has_next
@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Aggregate, CharField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import snapshot
+from .models import CommonName, Phytochemical, Plant
+
+
+MAX_RESULTS = 800
+
+# One search result row; namedtuples carry no per-instance __dict__
+ResultRow = namedtuple(
+    'ResultRow', ['plant_name', 'common_name', 'compound_name', 'cid', 'reference_id']
+)
+
+
+class GroupConcat(Aggregate):
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, expression, delimiter=', ', **extra):
+        super().__init__(expression, Value(delimiter), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+def common_names_subquery():
+    """Comma-joined common names of the outer row's plant, as one column."""
+    names = (
+        CommonName.objects
+        .filter(plant=OuterRef('plant'))
+        .order_by()
+        .values('plant')
+        .annotate(names=GroupConcat('name'))
+        .values('names')
+    )
+    return Coalesce(Subquery(names), Value(''))
+
+
+def search_queryset(query):
+    """Phytochemicals matching ``query`` on plant, common name, compound or CID."""
+    plants = Plant.objects.filter(
+        Q(scientific_name__icontains=query) |
+        Q(common_names__name__icontains=query)
+    )
+    return Phytochemical.objects.filter(
+        Q(plant__in=plants) |
+        Q(compound_name__icontains=query) |
+        Q(cid__icontains=query)
+    )
+
+
+def search_rows(query, limit=MAX_RESULTS, offset=0):
+    """
+    Return up to ``limit`` ResultRow tuples for ``query``, skipping the first
+    ``offset``, from the configured ``SEARCH_BACKEND``.
+    """
+    if settings.SEARCH_BACKEND == 'snapshot':
+        snap = snapshot.current()
+        if snap is not None:
+            return [ResultRow._make(row) for row in snap.search(query, limit, offset)]
+    return orm_search_rows(query, limit, offset)
+
+
+def orm_search_rows(query, limit=MAX_RESULTS, offset=0):
+    """
+    Only the five displayed columns are selected and rows are streamed with
+    ``iterator()``, so no model instances are built.
+    """
+    qs = (
+        search_queryset(query)
+        .annotate(common_name=common_names_subquery())
+        .order_by('id')
+        .values_list('plant__scientific_name', 'common_name', 'compound_name', 'cid', 'reference_id')
+    )[offset:offset + limit]
+    return [ResultRow._make(row) for row in qs.iterator()]
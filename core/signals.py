@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import changelog, dataversion
+from .models import ChangeLog, CommonName, CompoundProperties, Phytochemical, Plant, Reference
+
+
+@receiver(post_save, sender=Plant)
+@receiver(post_save, sender=CommonName)
+@receiver(post_save, sender=Phytochemical)
+@receiver(post_save, sender=Reference)
+@receiver(post_save, sender=CompoundProperties)
+@receiver(post_delete, sender=Plant)
+@receiver(post_delete, sender=CommonName)
+@receiver(post_delete, sender=Phytochemical)
+@receiver(post_delete, sender=Reference)
+@receiver(post_delete, sender=CompoundProperties)
+def data_changed(sender, **kwargs):
+    dataversion.bump()
+
+
+@receiver(post_save, sender=Plant)
+@receiver(post_save, sender=CommonName)
+@receiver(post_save, sender=Phytochemical)
+def log_save(sender, instance, created, update_fields=None, **kwargs):
+    data = changelog.serialize(instance)
+    if update_fields and not created:
+        # Only the saved columns; update_fields holds field names, data attnames
+        columns = {sender._meta.get_field(name).attname for name in update_fields}
+        data = {k: v for k, v in data.items() if k in columns}
+    changelog.log(sender, instance.pk, ChangeLog.INSERT if created else ChangeLog.UPDATE, data)
+
+
+@receiver(post_delete, sender=Plant)
+@receiver(post_delete, sender=CommonName)
+@receiver(post_delete, sender=Phytochemical)
+def log_delete(sender, instance, **kwargs):
+    changelog.log(sender, instance.pk, ChangeLog.DELETE, changelog.serialize(instance))
+
+
+@receiver(pre_delete, sender=Reference)
+def log_reference_delete(sender, instance, **kwargs):
+    # on_delete=SET_NULL clears Phytochemical.reference with one UPDATE that
+    # sends no signals; this runs inside the delete's transaction
+    pks = Phytochemical.objects.filter(reference=instance).values_list('pk', flat=True)
+    changelog.log_many(Phytochemical, ((pk, {'reference_id': None}) for pk in pks), ChangeLog.UPDATE)
@@ -0,0 +1,196 @@
+"""
+Plant × compound incidence matrix for "similar plants" and compound
+co-occurrence queries.
+
+The matrix is binary and kept in CSR form as two NumPy arrays per
+orientation (plants → compounds and compounds → plants), so a query is a
+``bincount`` over the few thousand entries it touches instead of loading
+every plant's phytochemicals. Compounds are keyed by CID when they have
+one, else by their normalised name. The matrix is built from the live
+snapshot when searches are served from one, else from the tables, and
+rebuilt when the release id (see ``core.releases``) moves.
+"""
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import releases
+from .fuzzy import normalize
+from .models import Phytochemical, Plant
+
+METRICS = ('jaccard', 'cosine')
+
+
+def compound_key(name, cid):
+    return f"cid:{cid}" if cid else f"name:{normalize(name)}"
+
+
+def _csr(rows, cols, n_rows):
+    """``(indptr, indices)`` of the binary matrix with ones at ``(rows, cols)``."""
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols
+
+
+class IncidenceMatrix:
+    def __init__(self, pairs, plant_names):
+        """
+        ``pairs`` are ``(plant id, compound name, cid)``; ``plant_names``
+        maps plant id to scientific name.
+        """
+        if np is None:
+            raise ImproperlyConfigured("Similarity queries need numpy: pip install numpy")
+
+        self.plant_ids = sorted(plant_names)
+        self.plant_names = [plant_names[pk] for pk in self.plant_ids]
+        plant_index = {pk: i for i, pk in enumerate(self.plant_ids)}
+
+        self.compound_keys = []
+        self.compound_labels = []
+        self.name_keys = {}
+        compound_index = {}
+        seen = set()
+        rows, cols = [], []
+        for plant_id, name, cid in pairs:
+            key = compound_key(name, cid)
+            j = compound_index.get(key)
+            if j is None:
+                j = compound_index[key] = len(self.compound_keys)
+                self.compound_keys.append(key)
+                self.compound_labels.append(name)
+            self.name_keys.setdefault(normalize(name), key)
+            i = plant_index[plant_id]
+            if (i, j) not in seen:
+                seen.add((i, j))
+                rows.append(i)
+                cols.append(j)
+        self.compound_index = compound_index
+        self.plant_index = plant_index
+
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        self.plant_ptr, self.plant_compounds = _csr(rows, cols, len(self.plant_ids))
+        self.compound_ptr, self.compound_plants = _csr(cols, rows, len(self.compound_keys))
+        self.plant_sizes = np.diff(self.plant_ptr)
+        self.compound_sizes = np.diff(self.compound_ptr)
+
+    @classmethod
+    def from_database(cls):
+        return cls(
+            Phytochemical.objects.values_list('plant_id', 'compound_name', 'cid').iterator(),
+            dict(Plant.objects.values_list('id', 'scientific_name')),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        plant_ids = snap.plant_id
+        return cls(
+            (
+                (plant_ids[plant], snap.string(compound), snap.string(cid))
+                for plant, compound, cid in zip(snap.row_plant, snap.row_compound, snap.row_cid)
+            ),
+            {pk: snap.string(snap.plant_name[i]) for i, pk in enumerate(plant_ids)},
+        )
+
+    def _gather(self, ptr, indices, selected):
+        """Concatenated index rows ``selected`` of a CSR ``(ptr, indices)``."""
+        if not len(selected):
+            return indices[:0]
+        return np.concatenate([indices[ptr[i]:ptr[i + 1]] for i in selected])
+
+    def similar_plants(self, plant_id, k=10, metric='jaccard'):
+        """
+        Up to ``k`` other plants sharing compounds with ``plant_id``, best
+        first, as dicts with id, name, shared compounds and score.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}")
+        i = self.plant_index[plant_id]
+        compounds = self.plant_compounds[self.plant_ptr[i]:self.plant_ptr[i + 1]]
+        shared = np.bincount(
+            self._gather(self.compound_ptr, self.compound_plants, compounds),
+            minlength=len(self.plant_ids),
+        )
+        shared[i] = 0
+
+        if metric == 'jaccard':
+            scores = shared / np.maximum(self.plant_sizes + self.plant_sizes[i] - shared, 1)
+        else:
+            scores = shared / np.maximum(np.sqrt(self.plant_sizes * self.plant_sizes[i]), 1)
+        return [
+            {
+                'id': self.plant_ids[j],
+                'name': self.plant_names[j],
+                'shared': int(shared[j]),
+                'score': round(float(scores[j]), 4),
+            }
+            for j in self._top(scores, shared, k)
+        ]
+
+    def cooccurring(self, key, k=10):
+        """
+        Up to ``k`` compounds found in the most plants together with the
+        compound ``key`` (see ``compound_key``), with the plant count and
+        Jaccard index over plants (which breaks ties).
+        """
+        j = self.compound_index[key]
+        plants = self.compound_plants[self.compound_ptr[j]:self.compound_ptr[j + 1]]
+        together = np.bincount(
+            self._gather(self.plant_ptr, self.plant_compounds, plants),
+            minlength=len(self.compound_keys),
+        )
+        together[j] = 0
+
+        scores = together / np.maximum(self.compound_sizes + self.compound_sizes[j] - together, 1)
+        return [
+            {
+                'key': self.compound_keys[c],
+                'name': self.compound_labels[c],
+                'plants': int(together[c]),
+                'jaccard': round(float(scores[c]), 4),
+            }
+            for c in self._top(together, scores, k)
+        ]
+
+    @staticmethod
+    def _top(primary, secondary, k):
+        """
+        Indices of the ``k`` best entries with non-zero ``secondary``, by
+        ``primary`` then ``secondary``, ties by index.
+        """
+        candidates = np.flatnonzero(secondary)
+        order = np.lexsort((candidates, -secondary[candidates], -primary[candidates]))
+        return candidates[order[:k]].tolist()
+
+    def find_compound(self, text):
+        """The key for a CID or compound name (any case), or None."""
+        text = text.strip()
+        if f"cid:{text}" in self.compound_index:
+            return f"cid:{text}"
+        return self.name_keys.get(normalize(text))
+
+
+_lock = threading.Lock()
+_matrix = None
+_matrix_version = None
+
+
+def get_matrix():
+    """The process-wide IncidenceMatrix, rebuilt whenever the release id moves."""
+    global _matrix, _matrix_version
+
+    snap = releases.live_snapshot()
+    version = releases.release_id(snap)
+    if _matrix is None or _matrix_version != version:
+        with _lock:
+            if _matrix is None or _matrix_version != version:
+                _matrix = IncidenceMatrix.from_snapshot(snap) if snap is not None else IncidenceMatrix.from_database()
+                _matrix_version = version
+    return _matrix
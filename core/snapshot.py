@@ -0,0 +1,430 @@
+"""
+Read-only search snapshots.
+
+Releases (see ``core.releases``) compile Plant/CommonName/Phytochemical into
+one file of array-backed sections which web workers memory-map, so searches
+are answered from shared pages without touching the database. Layout::
+
+    MAGIC | u64 header length | JSON header | 8-byte aligned sections
+
+Sections:
+
+* ``str_offsets``/``str_blob`` -- sorted string table (UTF-8)
+* ``low_offsets``/``low_blob`` -- the same strings lowercased, for substring scans
+* ``post_offsets``/``postings`` -- per string id, the row indices it matches
+* ``row_*`` -- one column per phytochemical, ordered by id (``row_source``
+  is its reference's source, see ``references.reference_source``)
+* ``plant_*`` -- one column per plant
+* ``prop_*`` -- PubChem properties shown in results (formula, weight,
+  InChIKey) of the CIDs in use, ordered by the CID's string id
+
+The ``CURRENT`` file in ``SNAPSHOT_DIR`` names the published snapshot and is
+replaced atomically, so workers pick up new versions on their next check.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CommonName, CompoundProperties, Phytochemical, Plant, Reference
+from .references import reference_source
+
+
+MAGIC = b'BMPPDSN1'
+POINTER = 'CURRENT'
+SUFFIX = '.snap'
+CHECK_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_dir():
+    return os.fspath(settings.SNAPSHOT_DIR)
+
+
+# ---------- BUILD ----------
+
+def _collect():
+    plants = list(Plant.objects.order_by('id').values_list('id', 'scientific_name'))
+    plant_index = {pk: i for i, (pk, _) in enumerate(plants)}
+
+    common = [[] for _ in plants]
+    for plant_id, name in CommonName.objects.order_by('plant_id', 'name').values_list('plant_id', 'name').iterator():
+        common[plant_index[plant_id]].append(name)
+
+    sources = {pk: reference_source(key) for pk, key in Reference.objects.values_list('id', 'key').iterator()}
+    rows = [
+        (pk, plant_index[plant_id], compound, cid, reference_id or 0, sources.get(reference_id, ''))
+        for pk, plant_id, compound, cid, reference_id in (
+            Phytochemical.objects.order_by('id')
+            .values_list('id', 'plant_id', 'compound_name', 'cid', 'reference_id')
+            .iterator()
+        )
+    ]
+
+    cids = {row[3] for row in rows}
+    properties = {
+        cid: (formula, weight, inchikey)
+        for cid, formula, weight, inchikey in (
+            CompoundProperties.objects
+            .values_list('cid', 'molecular_formula', 'molecular_weight', 'inchikey')
+            .iterator()
+        )
+        if cid in cids
+    }
+    return plants, common, rows, properties
+
+
+def compile_sections():
+    """Read the current tables and return ``(sections, counts)``."""
+    plants, common, rows, properties = _collect()
+    joined = [', '.join(names) for names in common]
+
+    strings = {''}
+    strings.update(name for _, name in plants)
+    strings.update(joined)
+    for names in common:
+        strings.update(names)
+    for _, _, compound, cid, _, source in rows:
+        strings.add(compound)
+        strings.add(cid)
+        strings.add(source)
+    for formula, _, inchikey in properties.values():
+        strings.add(formula)
+        strings.add(inchikey)
+    strings = sorted(strings)
+    sid = {s: i for i, s in enumerate(strings)}
+    props = sorted((sid[cid], values) for cid, values in properties.items())
+
+    # Posting lists: which rows each searchable string matches
+    postings = [[] for _ in strings]
+    plant_rows = [[] for _ in plants]
+    for i, (_, plant_idx, compound, cid, _, _) in enumerate(rows):
+        plant_rows[plant_idx].append(i)
+        postings[sid[compound]].append(i)
+        if cid:
+            postings[sid[cid]].append(i)
+    for plant_idx, (_, name) in enumerate(plants):
+        postings[sid[name]].extend(plant_rows[plant_idx])
+        for common_name in common[plant_idx]:
+            postings[sid[common_name]].extend(plant_rows[plant_idx])
+
+    str_offsets, low_offsets, post_offsets = [0], [0], [0]
+    str_blob, low_blob, flat = bytearray(), bytearray(), array('I')
+    for i, s in enumerate(strings):
+        str_blob += s.encode('utf-8')
+        str_offsets.append(len(str_blob))
+        low_blob += s.lower().encode('utf-8')
+        low_offsets.append(len(low_blob))
+        flat.extend(sorted(set(postings[i])))
+        post_offsets.append(len(flat))
+
+    sections = {
+        'str_offsets': array('Q', str_offsets),
+        'str_blob': bytes(str_blob),
+        'low_offsets': array('Q', low_offsets),
+        'low_blob': bytes(low_blob),
+        'post_offsets': array('Q', post_offsets),
+        'postings': flat,
+        'row_id': array('Q', (r[0] for r in rows)),
+        'row_plant': array('I', (r[1] for r in rows)),
+        'row_compound': array('I', (sid[r[2]] for r in rows)),
+        'row_cid': array('I', (sid[r[3]] for r in rows)),
+        'row_reference': array('Q', (r[4] for r in rows)),
+        'row_source': array('I', (sid[r[5]] for r in rows)),
+        'plant_id': array('Q', (pk for pk, _ in plants)),
+        'plant_name': array('I', (sid[name] for _, name in plants)),
+        'plant_common': array('I', (sid[names] for names in joined)),
+        'prop_cid': array('I', (cid for cid, _ in props)),
+        'prop_formula': array('I', (sid[formula] for _, (formula, _, _) in props)),
+        'prop_weight': array('d', (math.nan if weight is None else weight for _, (_, weight, _) in props)),
+        'prop_inchikey': array('I', (sid[inchikey] for _, (_, _, inchikey) in props)),
+    }
+    counts = {'strings': len(strings), 'plants': len(plants), 'rows': len(rows)}
+    return sections, counts
+
+
+def write_snapshot(path, sections, meta):
+    """Write ``sections`` to ``path`` in the snapshot layout."""
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        nbytes = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        typecode = data.typecode if isinstance(data, array) else 'B'
+        layout[name] = [offset, nbytes, typecode]
+        offset += nbytes + (-nbytes % 8)
+
+    header = json.dumps(dict(meta, sections=layout)).encode('utf-8')
+    base = len(MAGIC) + 8 + len(header)
+    pad = -base % 8
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header) + pad))
+        f.write(header + b' ' * pad)
+        for data in sections.values():
+            raw = data.tobytes() if isinstance(data, array) else data
+            f.write(raw)
+            f.write(b'\0' * (-len(raw) % 8))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def build(version=None):
+    """
+    Compile a snapshot of the current tables without publishing it.
+    Returns ``(version, counts)``.
+    """
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    if not version:
+        version = stamp = time.strftime('%Y%m%d%H%M%S')
+        n = 1
+        while os.path.exists(os.path.join(directory, version + SUFFIX)):
+            version = f'{stamp}-{n}'
+            n += 1
+
+    # One transaction, so chunks committed by a running import mid-build
+    # can't leave the snapshot with half of them
+    with transaction.atomic():
+        sections, counts = compile_sections()
+    final = os.path.join(directory, version + SUFFIX)
+    tmp = final + '.tmp'
+    write_snapshot(tmp, sections, {'version': version, 'created': time.time(), 'counts': counts})
+    os.replace(tmp, final)
+    return version, counts
+
+
+def read_header(path):
+    """The JSON header of the snapshot file at ``path``."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        (header_len,) = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(header_len))
+
+
+def versions():
+    """Versions of the snapshot files on disk, oldest build first."""
+    directory = snapshot_dir()
+    built = []
+    for name in os.listdir(directory):
+        if not name.endswith(SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            created = read_header(path)['created']
+        except (OSError, ValueError, KeyError):
+            created = os.path.getmtime(path)
+        built.append((created, name[:-len(SUFFIX)]))
+    return [version for _, version in sorted(built)]
+
+
+def prune(keep, protect=()):
+    """
+    Remove all but the ``keep`` most recently built snapshot files, never
+    those in ``protect`` or the one ``CURRENT`` points at.
+    """
+    protect = set(protect) | {current_version()}
+    built = versions()
+    for version in built[:-keep] if keep else []:
+        if version not in protect:
+            os.remove(os.path.join(snapshot_dir(), version + SUFFIX))
+
+
+def exists(version):
+    return os.path.exists(os.path.join(snapshot_dir(), version + SUFFIX))
+
+
+def current_version():
+    """The version ``CURRENT`` points at, read from disk, or None."""
+    try:
+        with open(os.path.join(snapshot_dir(), POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(version=None, keep=3):
+    """
+    Compile a snapshot of the current tables, publish it as ``CURRENT`` and
+    prune all but the newest ``keep`` files. Returns ``(version, counts)``.
+    Only for throwaway snapshot directories (benchmarks); the real one is
+    published through ``releases.publish``, which records the release.
+    """
+    version, counts = build(version)
+    set_current(version)
+    prune(keep, protect={version})
+    return version, counts
+
+
+def set_current(version):
+    """Atomically point ``CURRENT`` at ``version``."""
+    directory = snapshot_dir()
+    if not exists(version):
+        raise FileNotFoundError(f"No snapshot {version!r} in {directory}")
+    tmp = os.path.join(directory, POINTER + '.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directory, POINTER))
+
+
+# ---------- READ ----------
+
+class Snapshot:
+    """A memory-mapped snapshot; all columns are zero-copy memoryviews."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+
+        (header_len,) = struct.unpack_from('<Q', self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mm[start:start + header_len])
+        base = start + header_len
+
+        self.version = header['version']
+        self.counts = header['counts']
+        view = memoryview(self._mm)
+        self._starts = {}
+        for name, (offset, nbytes, typecode) in header['sections'].items():
+            section = view[base + offset:base + offset + nbytes]
+            setattr(self, name, section if typecode == 'B' else section.cast(typecode))
+            self._starts[name] = base + offset
+
+    def string(self, sid):
+        return str(self.str_blob[self.str_offsets[sid]:self.str_offsets[sid + 1]], 'utf-8')
+
+    def string_id(self, text):
+        """Id of ``text`` in the (sorted) string table, or None."""
+        target = text.encode('utf-8')
+        offsets, blob = self.str_offsets, self.str_blob
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(blob[offsets[mid]:offsets[mid + 1]]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(offsets) - 1 and bytes(blob[offsets[lo]:offsets[lo + 1]]) == target:
+            return lo
+        return None
+
+    @property
+    def has_properties(self):
+        # Snapshots built before properties were added lack the sections
+        return hasattr(self, 'prop_cid')
+
+    def properties(self, cids):
+        """``{cid: (formula, weight or None, InChIKey)}`` for those of ``cids`` that have properties."""
+        found = {}
+        for cid in set(cids):
+            sid = self.string_id(cid) if cid else None
+            if sid is None:
+                continue
+            i = bisect_left(self.prop_cid, sid)
+            if i < len(self.prop_cid) and self.prop_cid[i] == sid:
+                weight = self.prop_weight[i]
+                found[cid] = (
+                    self.string(self.prop_formula[i]),
+                    None if math.isnan(weight) else weight,
+                    self.string(self.prop_inchikey[i]),
+                )
+        return found
+
+    def matching_strings(self, query):
+        """Ids of strings containing ``query`` (case-insensitive)."""
+        needle = query.lower().encode('utf-8')
+        if not needle:
+            return []
+        mm, offsets = self._mm, self.low_offsets
+        base = self._starts['low_blob']
+        end = base + len(self.low_blob)
+
+        # mmap.find scans in C; map each hit back to its string and skip
+        # hits that straddle two strings
+        found = []
+        pos = mm.find(needle, base, end)
+        while pos != -1:
+            sid = bisect_right(offsets, pos - base) - 1
+            stop = offsets[sid + 1]
+            if pos - base + len(needle) <= stop:
+                found.append(sid)
+                pos = mm.find(needle, base + stop, end)
+            else:
+                pos = mm.find(needle, pos + 1, end)
+        return found
+
+    def matching_rows(self, query):
+        """Sorted row indices matching ``query`` on any searchable field."""
+        # Concatenate the posting lists with memcpy, then dedupe in C
+        rows = array('I')
+        offsets, raw = self.post_offsets, self.postings.cast('B')
+        size = self.postings.itemsize
+        for sid in self.matching_strings(query):
+            rows.frombytes(raw[offsets[sid] * size:offsets[sid + 1] * size])
+        return sorted(set(rows))
+
+    def row(self, i):
+        plant = self.row_plant[i]
+        return (
+            self.string(self.plant_name[plant]),
+            self.string(self.plant_common[plant]),
+            self.string(self.row_compound[i]),
+            self.string(self.row_cid[i]),
+            self.row_reference[i] or None,
+        )
+
+    def search(self, query, limit, offset=0):
+        return [self.row(i) for i in self.matching_rows(query)[offset:offset + limit]]
+
+
+_current = None
+_checked_at = 0.0
+_pointer_stat = None
+
+
+def current():
+    """
+    The published snapshot, or ``None`` if there is none or it can't be
+    loaded (logged as an error). The ``CURRENT`` pointer is re-checked at
+    most once per ``CHECK_INTERVAL`` seconds and a new version is mapped as
+    soon as it is published.
+    """
+    global _current, _checked_at, _pointer_stat
+
+    now = time.monotonic()
+    if now - _checked_at < CHECK_INTERVAL:
+        return _current
+    _checked_at = now
+
+    pointer = os.path.join(snapshot_dir(), POINTER)
+    try:
+        st = os.stat(pointer)
+    except FileNotFoundError:
+        _current = _pointer_stat = None
+        return None
+
+    stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    if stat_key != _pointer_stat:
+        _pointer_stat = stat_key
+        with open(pointer) as f:
+            version = f.read().strip()
+        if _current is None or _current.version != version:
+            try:
+                _current = Snapshot(os.path.join(snapshot_dir(), version + SUFFIX))
+            except (OSError, ValueError):
+                # Searches fall back to the ORM until CURRENT is repointed
+                logger.exception("Can't load snapshot %r named by %s", version, pointer)
+                _current = None
+    return _current
@@ -0,0 +1,23 @@
+"""
+Work a WSGI worker does at boot instead of on its first request.
+"""
+from django.template.loader import get_template
+from django.urls import reverse
+
+PUBLIC_TEMPLATES = [
+    'core/bmppd.html',
+    'core/bmppd_result.html',
+    'core/about.html',
+    'core/acknowledgement.html',
+    'core/reference.html',
+]
+
+
+def warm():
+    """
+    Import the public URLconf and compile the public templates into the
+    cached template loader. The admin stays unloaded (see project/urls.py).
+    """
+    reverse('bmppd')
+    for name in PUBLIC_TEMPLATES:
+        get_template(name)
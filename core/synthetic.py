@@ -0,0 +1,88 @@
+import random
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .models import CommonName, Phytochemical, Plant, Reference
+
+
+SYLLABLES = ['aza', 'di', 'rach', 'ta', 'oci', 'mum', 'cur', 'cu', 'ma', 'lon', 'ga', 'nim', 'bin',
+             'quer', 'ce', 'tin', 'eu', 'ge', 'nol', 'lin', 'a', 'lo', 'ol', 'ur', 'so', 'lic']
+SUFFIXES = ['', ' acid', 'ine', 'ol', 'one', 'oside', ' A', ' B']
+
+
+def _word(rng, parts=3):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts))
+
+
+def generate_dataset(plants=700, compounds_per_plant=160, seed=0):
+    """
+    Bulk-create a synthetic dataset shaped like the curated one: plants with
+    a couple of common names each and compounds drawn from a shared pool so
+    names repeat across plants.
+    """
+    rng = random.Random(seed)
+    pool_size = max(1, plants * compounds_per_plant // 2)
+    pool = list({
+        _word(rng, rng.randint(2, 5)).capitalize() + rng.choice(SUFFIXES): str(rng.randint(1, 10**8))
+        for _ in range(pool_size)
+    }.items())
+
+    Reference.objects.bulk_create(
+        [Reference(key=f'doi:10.1000/synthetic.{i}', text=f'https://doi.org/10.1000/synthetic.{i}')
+         for i in range(max(1, plants // 2))],
+        batch_size=500,
+    )
+    ref_ids = list(Reference.objects.values_list('id', flat=True))
+
+    Plant.objects.bulk_create(
+        [Plant(scientific_name=f'{_word(rng).capitalize()} {_word(rng)} {i}') for i in range(plants)],
+        batch_size=500,
+    )
+    plant_ids = list(Plant.objects.values_list('id', flat=True))
+
+    common_names = []
+    phytochemicals = []
+    for plant_id in plant_ids:
+        for j in range(rng.randint(0, 3)):
+            common_names.append(CommonName(plant_id=plant_id, name=f'{_word(rng, 2).capitalize()} {j}'))
+        for name, cid in rng.sample(pool, min(compounds_per_plant, len(pool))):
+            phytochemicals.append(Phytochemical(
+                plant_id=plant_id,
+                compound_name=name,
+                cid=cid if rng.random() < 0.8 else '',
+                reference_id=rng.choice(ref_ids) if rng.random() < 0.9 else None,
+            ))
+
+    CommonName.objects.bulk_create(common_names, batch_size=1000)
+    Phytochemical.objects.bulk_create(phytochemicals, batch_size=1000)
+    return {
+        'plants': len(plant_ids),
+        'common_names': len(common_names),
+        'phytochemicals': len(phytochemicals),
+    }
+
+
+@contextmanager
+def synthetic_database(plants=700, compounds_per_plant=160, seed=0, path=None):
+    """
+    Run the block against a throwaway test database filled by
+    ``generate_dataset``; the real database is never touched. On SQLite,
+    ``path`` puts it in that file instead of memory so other threads (a
+    test server's request handlers) can open their own connections.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    old_name = connection.settings_dict['NAME']
+    if path:
+        test_settings['NAME'] = str(path)
+    try:
+        # create_test_db returns the new name; destroy_test_db wants the
+        # one to switch back to
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield generate_dataset(plants, compounds_per_plant, seed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
@@ -0,0 +1,11 @@
+from django import template
+
+from core.assets import asset_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor(name):
+    """URL of a third-party asset: ``{% vendor 'bootstrap.css' %}``."""
+    return asset_url(name)
@@ -1,3 +1,1058 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings as django_settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import checks
+from django.core.management import CommandError, call_command
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, URLResolver, get_resolver, include, path, resolve, reverse
+from django.urls.resolvers import RegexPattern
+
+from . import (
+    bulk, changelog, dataversion, facets, fuzzy, loadtest, maintenance, profiling, pubchem, querycost, ratelimit, releases,
+    rendering, similarity, snapshot, validation,
+)
+from .models import ChangeLog, CommonName, CompoundProperties, CSVUpload, DatasetRelease, Phytochemical, Plant, Reference
+from .search import orm_search_rows
+
+
+class TempDirTestCase(TestCase):
+    """Points the snapshot, data version and validation report paths at a temp dir."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        settings = override_settings(
+            SNAPSHOT_DIR=os.path.join(self.tmp, 'snapshots'),
+            DATA_VERSION_FILE=os.path.join(self.tmp, 'data_version'),
+            # No collectstatic manifest in tests
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reports = mock.patch.object(validation, 'REPORT_DIR', os.path.join(self.tmp, 'validation'))
+        reports.start()
+        self.addCleanup(reports.stop)
+        snapshot._current = snapshot._pointer_stat = None
+        snapshot._checked_at = 0.0
+        # Process-wide indexes and caches filled by earlier tests; the data
+        # version stays put since TestCase never commits
+        querycost._model = None
+        facets._index = None
+        fuzzy._index = None
+        similarity._matrix = None
+        cache.clear()
+
+
+class SnapshotTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        ref = Reference.objects.create(key='doi:10.1/x', text='doi:10.1/x')
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        tulsi = Plant.objects.create(scientific_name='Ocimum tenuiflorum')
+        CommonName.objects.create(plant=neem, name='Neem')
+        CommonName.objects.create(plant=tulsi, name='Holy basil')
+        Phytochemical.objects.create(plant=neem, compound_name='Azadirachtin', cid='5281303', reference=ref)
+        Phytochemical.objects.create(plant=neem, compound_name='Nimbin', cid='108058')
+        Phytochemical.objects.create(plant=tulsi, compound_name='Eugenol', cid='3314', reference=ref)
+        Phytochemical.objects.create(plant=tulsi, compound_name='Ursolic acid', cid='')
+
+    def test_round_trip_matches_orm(self):
+        version, counts = snapshot.build('test')
+        self.assertEqual(counts['plants'], 2)
+        self.assertEqual(counts['rows'], 4)
+
+        snap = snapshot.Snapshot(os.path.join(snapshot.snapshot_dir(), version + snapshot.SUFFIX))
+        self.assertEqual(snap.version, 'test')
+        for query in ['neem', 'NIMB', 'basil', 'acid', '3314', 'azadirachta', 'in', 'nothing here']:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    [tuple(row) for row in orm_search_rows(query)],
+                    snap.search(query, 800),
+                )
+        self.assertEqual(snap.search('in', 1, 1), [tuple(orm_search_rows('in', 1, 1)[0])])
+
+    def test_cost_model_from_snapshot(self):
+        snapshot.build('test')
+        snapshot.set_current('test')
+        database = querycost.CostModel.from_database()
+        with override_settings(SEARCH_BACKEND='snapshot'), CaptureQueriesContext(connection) as queries:
+            model = querycost.get_model()
+        self.assertEqual(len(queries), 0)
+        for query in ['neem', 'eugenol', '3314', 'acid', 'ab', 'zzzz']:
+            with self.subTest(query=query):
+                self.assertEqual(model.estimate(query), database.estimate(query))
+
+    def test_properties_render_from_snapshot(self):
+        CompoundProperties.objects.create(
+            cid='3314', molecular_formula='C10H12O2', molecular_weight=164.2,
+            inchikey='RRAFCDWBNXTKKO-UHFFFAOYSA-N',
+        )
+        CompoundProperties.objects.create(cid='108058', molecular_formula='C30H36O9')
+        CompoundProperties.objects.create(cid='1', molecular_formula='unused')
+        snapshot.build('test')
+        snapshot.set_current('test')
+
+        snap = snapshot.current()
+        self.assertEqual(snap.properties(['3314', '108058', '1', '', 'nope']), {
+            '3314': ('C10H12O2', 164.2, 'RRAFCDWBNXTKKO-UHFFFAOYSA-N'),
+            '108058': ('C30H36O9', None, ''),
+        })
+        with override_settings(SEARCH_BACKEND='snapshot'), self.assertNumQueries(0):
+            html = rendering.render_rows([tuple(row) for row in snap.search('eugenol', 10)])
+        self.assertIn('<td>CID: 3314</td><td>C10H12O2</td><td>164.2</td><td>RRAFCDWBNXTKKO-UHFFFAOYSA-N</td>', html)
+
+    @override_settings(SEARCH_BACKEND='snapshot', RATELIMIT_ENABLED=False)
+    def test_snapshot_backend_reads_only_the_release(self):
+        snapshot.build('test')
+        snapshot.set_current('test')
+        # Not in the release, so neither suggested nor similar
+        Plant.objects.create(scientific_name='Nimbinia nova').phytochemicals.create(compound_name='Nimbin')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('bmppd_result'), {'q': 'eugenol'})
+            self.assertEqual(response.context['result_count'], 1)
+            self.assertEqual(
+                [label for label, *_ in dict(response.context['facet_groups'])['Reference source']], ['DOI']
+            )
+
+            response = self.client.get(reverse('bmppd_result'), {'q': 'nimbinx'})
+            self.assertEqual(response.context['suggestions'], ['Nimbin'])
+
+            response = self.client.get(reverse('compound_cooccurrence'), {'compound': 'nimbin'})
+            self.assertEqual([c['name'] for c in response.json()['results']], ['Azadirachtin'])
+
+    def test_throttled_search_shows_no_empty_result(self):
+        with mock.patch('core.ratelimit.throttle_search', return_value=3):
+            response = self.client.get(reverse('bmppd_result'), {'q': 'neem'})
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many searches', status_code=429)
+        self.assertNotContains(response, 'No results found', status_code=429)
+
+    def test_prune_keeps_newest_builds_and_current(self):
+        for name in ['b-old', 'a-middle', 'z-new']:
+            snapshot.build(name)
+            time.sleep(0.01)
+        snapshot.set_current('b-old')
+
+        snapshot.prune(1)
+        self.assertEqual(snapshot.versions(), ['b-old', 'z-new'])
+
+    def test_missing_current_falls_back(self):
+        snapshot.build('gone')
+        snapshot.set_current('gone')
+        os.remove(os.path.join(snapshot.snapshot_dir(), 'gone' + snapshot.SUFFIX))
+
+        with self.assertLogs('core.snapshot', 'ERROR'):
+            self.assertIsNone(snapshot.current())
+
+
+@override_settings(SEARCH_BACKEND='snapshot', RATELIMIT_ENABLED=False)
+class ReleaseTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        self.tulsi = Plant.objects.create(scientific_name='Ocimum tenuiflorum')
+        Phytochemical.objects.create(plant=self.neem, compound_name='Azadirachtin', cid='5281303')
+        Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', cid='108058')
+        Phytochemical.objects.create(plant=self.tulsi, compound_name='Eugenol', cid='3314')
+
+    def live(self):
+        # Re-read CURRENT now instead of after snapshot.CHECK_INTERVAL
+        snapshot._checked_at = 0.0
+        return releases.live_snapshot()
+
+    def test_publish_rollback_and_activate(self):
+        first = releases.publish('one', notes='First')
+        self.assertEqual((first.plants, first.phytochemicals), (2, 3))
+        self.assertIsNotNone(first.published_at)
+        self.assertEqual(releases.current_release(), first)
+        self.assertEqual(releases.release_id(self.live()), 'rone')
+
+        Phytochemical.objects.create(plant=self.tulsi, compound_name='Ursolic acid')
+        second = releases.publish('two')
+        self.assertEqual(second.phytochemicals, 4)
+        self.assertEqual(self.live().search('ursolic', 10)[0][2], 'Ursolic acid')
+        self.assertEqual(releases.rollback_target(), first)
+
+        self.assertEqual(releases.rollback(), first)
+        self.assertEqual(snapshot.current_version(), 'one')
+        self.assertEqual(self.live().search('ursolic', 10), [])
+        second.refresh_from_db()
+        self.assertIsNotNone(second.rolled_back_at)
+        # Nothing was published before the first release
+        self.assertIsNone(releases.rollback_target())
+        self.assertIsNone(releases.rollback())
+
+        releases.activate(second)
+        second.refresh_from_db()
+        self.assertIsNone(second.rolled_back_at)
+        self.assertEqual(releases.current_release(), second)
+        self.assertEqual(releases.release_id(self.live()), 'rtwo')
+
+    def test_problems_refuse_to_publish(self):
+        self.assertEqual(releases.problems(), [])
+
+        CSVUpload.objects.create(file='data/half.csv', status=CSVUpload.FAILED, rows_committed=7)
+        Plant.objects.create(scientific_name='Ocimum basilicum')
+        found = releases.problems()
+        self.assertEqual(len(found), 2)
+        self.assertIn('CSV upload data/half.csv is failed after 7 row(s)', found[0])
+        self.assertEqual(found[1], '1 plant(s) have no phytochemicals')
+        with self.assertRaisesMessage(CommandError, '2 problem(s)'):
+            call_command('publish_release', stdout=StringIO())
+        self.assertFalse(DatasetRelease.objects.exists())
+        self.assertIsNone(snapshot.current_version())
+
+        CSVUpload.objects.all().delete()
+        Plant.objects.filter(scientific_name='Ocimum basilicum').delete()
+        releases.publish('one')
+        Phytochemical.objects.filter(compound_name='Nimbin').delete()
+        self.assertEqual(releases.problems(), ['phytochemicals would drop from 3 to 2 (more than 20%)'])
+        self.assertEqual(releases.problems(max_shrink=0.5), [])
+
+        Phytochemical.objects.all().delete()
+        self.assertIn('There are no phytochemicals to publish', releases.problems())
+
+    def test_etag_changes_with_the_release(self):
+        releases.publish('one')
+        self.live()
+        url = reverse('bmppd_result')
+        response = self.client.get(url, {'q': 'nimbin'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Unchanged release: 304, even after the live tables change
+        Phytochemical.objects.create(plant=self.neem, compound_name='Nimbinin')
+        repeat = self.client.get(url, {'q': 'nimbin'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(self.client.get(url, {'q': 'nimbi'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        releases.publish('two')
+        self.live()
+        fresh = self.client.get(url, {'q': 'nimbin'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+        self.assertEqual(fresh.context['result_count'], 2)
+
+    @override_settings(SEARCH_BACKEND='orm')
+    def test_check_warns_while_searches_read_the_live_tables(self):
+        self.assertEqual([w.id for w in releases.check_search_backend(None)], ['core.W001'])
+        with override_settings(SEARCH_BACKEND='snapshot'):
+            self.assertEqual([w.id for w in releases.check_search_backend(None)], ['core.W002'])
+            releases.publish('one')
+            self.assertEqual(releases.check_search_backend(None), [])
+
+
+class PubChemTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        Phytochemical.objects.create(plant=neem, compound_name='Nimbin', cid='108058')
+        Phytochemical.objects.create(plant=neem, compound_name='Eugenol', cid='3314')
+
+    def test_read_gzipped_tsv_with_smiles_aliases(self):
+        path = os.path.join(self.tmp, 'props.tsv.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(
+                'CID\tMolecularFormula\tMolecularWeight\tIsomericSMILES\tCanonicalSMILES\tInChIKey\n'
+                '3314\tC10H12O2\t164.20\tCOC1=C(C=CC(=C1)CC=C)O\tignored\tRRAFCDWBNXTKKO-UHFFFAOYSA-N\n'
+                'CID-x\tC1\t1\t\t\t\n'
+                '108058\tC30H36O9\tn/a\t\t\t\n'
+            )
+        with pubchem.open_dump(path) as f:
+            records = list(pubchem.read_properties(f))
+
+        self.assertEqual(records, [
+            ('3314', {
+                'molecular_formula': 'C10H12O2', 'molecular_weight': 164.2,
+                'smiles': 'COC1=C(C=CC(=C1)CC=C)O', 'inchikey': 'RRAFCDWBNXTKKO-UHFFFAOYSA-N',
+            }),
+            ('108058', {'molecular_formula': 'C30H36O9', 'molecular_weight': None, 'smiles': '', 'inchikey': ''}),
+        ])
+
+    def test_read_csv_needs_a_cid_column(self):
+        path = os.path.join(self.tmp, 'props.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('"SMILES","MolecularFormula"\n"C","CH4"\n')
+        with pubchem.open_dump(path) as f, self.assertRaisesMessage(ValueError, 'no CID column'):
+            list(pubchem.read_properties(f))
+
+    def test_load_upserts_known_cids(self):
+        CompoundProperties.objects.create(cid='3314', molecular_formula='old', smiles='C')
+        records = [
+            ('3314', {'molecular_formula': 'C10H12O2', 'molecular_weight': 164.2}),
+            ('108058', {'molecular_formula': 'C30H36O9', 'molecular_weight': None}),
+            ('1', {'molecular_formula': 'unused', 'molecular_weight': None}),
+        ]
+
+        self.assertEqual(pubchem.load_properties(iter(records), batch_size=1), 2)
+        self.assertEqual(
+            list(CompoundProperties.objects.order_by('cid').values_list('cid', 'molecular_formula', 'smiles')),
+            [('108058', 'C30H36O9', ''), ('3314', 'C10H12O2', '')],
+        )
+        self.assertEqual(pubchem.load_properties(iter(records), only_known=False), 3)
+
+    def test_admin_edit_refreshes_cached_properties(self):
+        with mock.patch.object(dataversion, 'bump') as bump:
+            props = CompoundProperties.objects.create(cid='3314', molecular_formula='C10H12O2')
+            props.delete()
+        self.assertEqual(bump.call_count, 2)
+
+        props = CompoundProperties.objects.create(cid='3314', molecular_formula='C10H12O2')
+        cache = pubchem.PropertiesCache()
+        self.assertEqual(cache.get_many(['3314'])['3314'].molecular_formula, 'C10H12O2')
+        props.molecular_formula = 'C10H12O3'
+        props.save()
+        # What the bump does once the admin's transaction commits
+        dataversion._write()
+        self.assertEqual(cache.get_many(['3314'])['3314'].molecular_formula, 'C10H12O3')
+
+    def test_rows_show_properties_or_dashes(self):
+        CompoundProperties.objects.create(
+            cid='3314', molecular_formula='C10H12O2', molecular_weight=164.2, inchikey='RRAF<x>',
+        )
+        html = rendering.render_rows([
+            ('Azadirachta indica', 'Neem', 'Eugenol', '3314', None),
+            ('Azadirachta indica', '', 'Nimbin', '108058', None),
+        ])
+        self.assertIn('<td>CID: 3314</td><td>C10H12O2</td><td>164.2</td><td>RRAF&lt;x&gt;</td><td>-</td>', html)
+        self.assertIn('<td>CID: 108058</td><td>-</td><td>-</td><td>-</td><td>-</td>', html)
+
+
+class DataVersionTests(TempDirTestCase):
+    def test_bump_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with dataversion.deferred():
+                Plant.objects.create(scientific_name='Azadirachta indica')
+                Plant.objects.create(scientific_name='Ocimum tenuiflorum')
+            self.assertEqual(dataversion.data_version(), '0')
+        self.assertEqual(callbacks.count(dataversion._write), 1)
+        self.assertNotEqual(dataversion.data_version(), '0')
+
+
+class ChangeLogTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.neem = Plant.objects.create(scientific_name='Azadirachta indica')
+
+    def test_reference_delete_logs_nulled_phytochemicals(self):
+        ref = Reference.objects.create(key='doi:10.1/x', text='doi:10.1/x')
+        nimbin = Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', reference=ref)
+        Phytochemical.objects.create(plant=self.neem, compound_name='Azadirachtin')
+        last = ChangeLog.objects.order_by('id').last().id
+
+        with changelog.source('curator'):
+            ref.delete()
+
+        entries = list(changelog.changes_since(last).values_list('model', 'object_id', 'action', 'data', 'source'))
+        self.assertEqual(entries, [('phytochemical', nimbin.pk, ChangeLog.UPDATE, {'reference_id': None}, 'curator')])
+
+    def test_rolled_back_savepoint_drops_its_entries(self):
+        last = ChangeLog.objects.order_by('id').last().id
+        with transaction.atomic():
+            kept = CommonName.objects.create(plant=self.neem, name='Neem')
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                CommonName.objects.create(plant=self.neem, name='Margosa')
+                raise RuntimeError
+        self.assertEqual(
+            list(changelog.changes_since(last).values_list('model', 'object_id', 'action')),
+            [('commonname', kept.pk, ChangeLog.INSERT)],
+        )
+
+    def test_batched_writes_at_exit_and_drops_rolled_back_savepoints(self):
+        last = ChangeLog.objects.order_by('id').last().id
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries, changelog.batched():
+                first = CommonName.objects.create(plant=self.neem, name='Neem')
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    CommonName.objects.create(plant=self.neem, name='Margosa')
+                    raise RuntimeError
+                with transaction.atomic():
+                    released = CommonName.objects.create(plant=self.neem, name='Nimba')
+                self.assertFalse(ChangeLog.objects.filter(id__gt=last).exists())
+            inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "core_changelog"')]
+            self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            list(changelog.changes_since(last).values_list('object_id', flat=True)),
+            [first.pk, released.pk],
+        )
+
+
+class BulkCleanupTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ref = Reference.objects.create(key='doi:10.1/x', text='doi:10.1/x')
+        self.neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        self.tulsi = Plant.objects.create(scientific_name='Ocimum tenuiflorum')
+
+    def test_merge_keeps_row_with_cid_and_backfills_reference(self):
+        add = Phytochemical.objects.create
+        add(plant=self.neem, compound_name='Nimbin', cid='', reference=self.ref)
+        keeper = add(plant=self.neem, compound_name='NIMBIN', cid='108058')
+        add(plant=self.neem, compound_name='nimbin', cid='108058')
+        # A different CID is a different compound, whatever the name says
+        distinct = add(plant=self.neem, compound_name='nimbin', cid='999')
+        other = add(plant=self.tulsi, compound_name='nimbin', cid='')
+
+        totals = bulk.merge_duplicate_compounds()
+
+        self.assertEqual(totals, {'merged': 2, 'references': 1})
+        self.assertQuerySetEqual(Phytochemical.objects.order_by('id'), [keeper, distinct, other])
+        keeper.refresh_from_db()
+        self.assertEqual(keeper.reference, self.ref)
+        distinct.refresh_from_db()
+        self.assertIsNone(distinct.reference)
+
+    def test_merge_backfills_rows_with_a_cid_from_their_own_cid(self):
+        add = Phytochemical.objects.create
+        add(plant=self.neem, compound_name='Nimbin', cid='108058')
+        second = add(plant=self.neem, compound_name='nimbin', cid='999')
+        add(plant=self.neem, compound_name='NIMBIN', cid='999', reference=self.ref)
+
+        self.assertEqual(bulk.merge_duplicate_compounds(), {'merged': 1, 'references': 1})
+        second.refresh_from_db()
+        self.assertEqual(second.reference, self.ref)
+        self.assertEqual(
+            sorted(Phytochemical.objects.values_list('cid', flat=True)), ['108058', '999']
+        )
+
+    def test_merge_without_cid_keeps_lowest_id(self):
+        first = Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', cid='')
+        Phytochemical.objects.create(plant=self.neem, compound_name='nimbin ', cid='')
+        Phytochemical.objects.create(plant=self.neem, compound_name='nimbin', cid='')
+
+        self.assertEqual(bulk.merge_duplicate_compounds()['merged'], 1)
+        self.assertTrue(Phytochemical.objects.filter(pk=first.pk).exists())
+        self.assertEqual(Phytochemical.objects.count(), 2)
+
+    def test_move_drops_rows_the_target_has(self):
+        Phytochemical.objects.create(plant=self.tulsi, compound_name='Eugenol', cid='3314')
+        clash = Phytochemical.objects.create(plant=self.neem, compound_name='Eugenol', cid='3314')
+        moved = Phytochemical.objects.create(plant=self.neem, compound_name='Eugenol', cid='')
+
+        totals = bulk.move_phytochemicals(Phytochemical.objects.filter(plant=self.neem), self.tulsi)
+
+        self.assertEqual(totals, {'moved': 1, 'dropped': 1})
+        self.assertFalse(Phytochemical.objects.filter(pk=clash.pk).exists())
+        moved.refresh_from_db()
+        self.assertEqual(moved.plant, self.tulsi)
+        self.assertEqual(self.tulsi.phytochemicals.count(), 2)
+
+    def test_backfill_from_mapping(self):
+        nimbin = Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', cid='')
+        eugenol = Phytochemical.objects.create(plant=self.tulsi, compound_name='eugenol', cid='')
+        mapping = os.path.join(self.tmp, 'mapping.csv')
+        with open(mapping, 'w', encoding='utf-8') as f:
+            f.write(
+                "Plant Name,Phytochemicals,CID,Reference\n"
+                ",Nimbin,1,\n"
+                "Azadirachta indica,nimbin,108058,doi:10.1/y\n"
+                ",Eugenol,3314,\n"
+            )
+
+        self.assertEqual(bulk.backfill_from_mapping(mapping), {'cids': 2, 'references': 1})
+        nimbin.refresh_from_db()
+        eugenol.refresh_from_db()
+        # The plant-specific row wins over the global one
+        self.assertEqual(nimbin.cid, '108058')
+        self.assertEqual(nimbin.reference.text, 'doi:10.1/y')
+        self.assertEqual(eugenol.cid, '3314')
+        self.assertIsNone(eugenol.reference)
+
+    def test_admin_backfill_from_uploaded_mapping(self):
+        nimbin = Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', cid='')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        changelist = self.client.get(reverse('admin:core_phytochemical_changelist'))
+        self.assertContains(changelist, reverse('admin:core_phytochemical_backfill'))
+
+        mapping = SimpleUploadedFile('mapping.csv', b"Phytochemicals,CID,Reference\nnimbin,108058,doi:10.1/y\n")
+        response = self.client.post(reverse('admin:core_phytochemical_backfill'), {'mapping': mapping}, follow=True)
+
+        self.assertContains(response, 'Back-filled 1 CID(s) and 1 reference(s).')
+        nimbin.refresh_from_db()
+        self.assertEqual((nimbin.cid, nimbin.reference.text), ('108058', 'doi:10.1/y'))
+        self.assertEqual(
+            list(ChangeLog.objects.filter(object_id=nimbin.pk, action=ChangeLog.UPDATE).values_list('source', 'user')),
+            [('backfill', 'admin')],
+        )
+
+    def test_backfill_rolls_back_on_error(self):
+        nimbin = Phytochemical.objects.create(plant=self.neem, compound_name='Nimbin', cid='')
+        mapping = os.path.join(self.tmp, 'mapping.csv')
+        with open(mapping, 'w', encoding='utf-8') as f:
+            f.write("Phytochemicals,CID\nNimbin,108058\n")
+
+        with mock.patch.object(bulk.changelog, 'log_updates', side_effect=RuntimeError), \
+                self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError):
+                bulk.backfill_from_mapping(mapping)
+        nimbin.refresh_from_db()
+        self.assertEqual(nimbin.cid, '')
+        self.assertEqual(callbacks, [])
+
+        # The temporary table went with the transaction
+        self.assertEqual(bulk.backfill_from_mapping(mapping)['cids'], 1)
+
+
+class CSVUploadAdminTests(TempDirTestCase):
+    CSV = b"Plant Name,Common Name,Phytochemicals,CID,Reference\nAzadirachta indica,Neem,Nimbin,108058,\n,,Azadirachtin,5281303,\n"
+
+    def setUp(self):
+        super().setUp()
+        media = override_settings(MEDIA_ROOT=os.path.join(self.tmp, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def add(self, csv):
+        self.client.post(reverse('admin:core_csvupload_add'), {'file': SimpleUploadedFile('plants.csv', csv)})
+        return CSVUpload.objects.get()
+
+    def import_queued(self, *args):
+        out = StringIO()
+        call_command('import_upload', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_add_queues_for_the_worker(self):
+        upload = self.add(self.CSV)
+        # Nothing is imported in the request
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.PENDING, 0))
+        self.assertEqual(Phytochemical.objects.count(), 0)
+
+        self.assertIn('2 phytochemical(s) imported', self.import_queued())
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.COMPLETE, 2))
+        self.assertEqual(Phytochemical.objects.count(), 2)
+
+    def test_rows_failing_validation_import_by_default(self):
+        upload = self.add(b"Plant Name,Phytochemicals,CID\n,Orphan,\nAzadirachta indica,Nimbin,N/A\n")
+        self.import_queued()
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.COMPLETE, 2))
+        self.assertEqual(list(Phytochemical.objects.values_list('compound_name', 'cid')), [('Nimbin', 'N/A')])
+
+    @override_settings(CSV_UPLOAD_VALIDATE=True)
+    def test_rejected_rows_stop_the_import(self):
+        upload = self.add(self.CSV + b",,Nimbolide,12 34x,\n")
+        with self.assertRaisesMessage(CommandError, '1 upload(s) failed'):
+            self.import_queued()
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.FAILED, 0))
+        self.assertIn('validation rejected 1 row(s) (invalid_cid)', upload.error)
+        self.assertFalse(Plant.objects.exists())
+
+    def test_upload_being_imported_is_not_claimed_twice(self):
+        upload = self.add(self.CSV)
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        CSVUpload.objects.filter(pk=upload.pk).update(status=CSVUpload.IMPORTING, rows_committed=1, current_plant=neem)
+
+        with self.assertRaises(CSVUpload.AlreadyImporting):
+            upload.import_csv()
+        self.assertIn('another process is importing it', self.import_queued(str(upload.pk)))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.IMPORTING, 1))
+        self.assertEqual(Phytochemical.objects.count(), 0)
+
+        # A dead worker's upload is taken over from its checkpoint
+        self.import_queued('--force', str(upload.pk))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.COMPLETE, 2))
+        self.assertEqual(list(Phytochemical.objects.values_list('compound_name', flat=True)), ['Azadirachtin'])
+
+    def test_resume_requeues_failed_uploads(self):
+        failed = CSVUpload.objects.create(file='data/a.csv', status=CSVUpload.FAILED, rows_committed=5, error='x')
+        busy = CSVUpload.objects.create(file='data/b.csv', status=CSVUpload.IMPORTING, rows_committed=3)
+        self.client.post(reverse('admin:core_csvupload_changelist'), {
+            'action': 'resume_import', '_selected_action': [failed.pk, busy.pk],
+        })
+        failed.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((failed.status, failed.rows_committed), (CSVUpload.PENDING, 5))
+        self.assertEqual(busy.status, CSVUpload.IMPORTING)
+
+    def test_chunked_upload_replaces_edited_file(self):
+        upload = CSVUpload.objects.create(file='data/old.csv', status=CSVUpload.FAILED, rows_committed=5)
+        form = self.client.get(reverse('admin:core_csvupload_change', args=[upload.pk]))
+        self.assertContains(form, f'data-chunk-url="{reverse("admin:core_csvupload_upload_chunk")}"')
+        self.assertContains(form, f'data-upload-pk="{upload.pk}"')
+
+        url = reverse('admin:core_csvupload_upload_chunk')
+        upload_id = 'a' * 32
+        self.client.post(url, {
+            'upload_id': upload_id, 'offset': 0, 'chunk': SimpleUploadedFile('blob', self.CSV),
+        })
+        response = self.client.post(url, {
+            'upload_id': upload_id, 'filename': 'plants.csv', 'complete': '1', 'upload_pk': upload.pk,
+        })
+
+        self.assertEqual(response.json()['url'], reverse('admin:core_csvupload_change', args=[upload.pk]))
+        self.assertEqual(CSVUpload.objects.count(), 1)
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_committed), (CSVUpload.PENDING, 0))
+        self.assertTrue(upload.file.name.startswith('data/plants'))
+        # Queued for the worker, not imported in this request
+        self.assertEqual(Phytochemical.objects.count(), 0)
+
+
+class LazyAdminURLTests(TestCase):
+    def named_patterns(self, patterns, namespace=''):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                prefix = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+                yield from self.named_patterns(pattern.url_patterns, prefix)
+            elif pattern.name:
+                params = getattr(pattern.pattern, 'converters', None) or pattern.pattern.regex.groupindex
+                yield namespace + pattern.name, list(params)
+
+    def test_every_named_url_reverses_and_resolves(self):
+        names = list(self.named_patterns(get_resolver().url_patterns))
+        self.assertIn(('admin:core_csvupload_upload_chunk', []), names)
+        self.assertIn(('bmppd_result', []), names)
+
+        for name, params in names:
+            with self.subTest(name=name):
+                # Sample values that fit the int/path/str converters and the
+                # admin's app_label regex
+                for value in ['1', 'core']:
+                    try:
+                        url = reverse(name, kwargs=dict.fromkeys(params, value))
+                        break
+                    except NoReverseMatch:
+                        continue
+                else:
+                    self.fail(f"Can't reverse {name}")
+                match = resolve(url)
+                self.assertEqual(match.view_name, name)
+
+    def test_admin_urlconf_loads_on_first_use(self):
+        from project.urls import lazy_include
+
+        admin = lazy_include('admin/', 'project.admin_urls', 'admin')
+        resolver = URLResolver(RegexPattern(r'^/'), [admin, path('', include('core.urls'))])
+
+        resolver.reverse('bmppd')
+        resolver.resolve('/about/')
+        self.assertNotIn('urlconf_module', admin.__dict__)
+
+        self.assertIn('admin', resolver.namespace_dict)
+        self.assertEqual(resolver.resolve('/admin/core/plant/').url_name, 'core_plant_changelist')
+        self.assertIn('urlconf_module', admin.__dict__)
+
+
+class AdminCheckTests(SimpleTestCase):
+    def test_system_checks_discover_the_model_admins(self):
+        with mock.patch('django.contrib.admin.autodiscover') as autodiscover:
+            checks.run_checks(tags=[checks.Tags.admin])
+        autodiscover.assert_called_once_with()
+
+        self.assertEqual(checks.run_checks(tags=[checks.Tags.admin]), [])
+        self.assertIn(CSVUpload, admin.site._registry)
+
+    def test_broken_model_admin_fails_the_checks(self):
+        site = admin.AdminSite(name='broken')
+        site.register(Plant, list_display=['no_such_field'])
+        self.addCleanup(site.unregister, Plant)
+        self.assertEqual([e.id for e in checks.run_checks(tags=[checks.Tags.admin])], ['admin.E108'])
+
+
+class ValidationTests(TestCase):
+    def test_duplicate_ignores_cid_like_the_import(self):
+        frame = validation.pd.DataFrame({
+            'plant name': ['Azadirachta indica', '', '', 'Ocimum tenuiflorum'],
+            'phytochemicals': ['Nimbin', 'NIMBIN', 'Nimbin', 'nimbin'],
+            'cid': ['108058', '', '999', ''],
+        })
+        frame.insert(0, 'line', range(2, len(frame) + 2))
+        issues = validation.validate_frame(frame)
+        self.assertEqual(issues.loc[issues['check'] == 'duplicate', 'line'].tolist(), [3, 4])
+
+
+class SearchViewTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        for i in range(5):
+            Phytochemical.objects.create(plant=neem, compound_name=f'Limonoid {i}')
+
+    def add_filter_rows(self):
+        """A second plant, CIDs and references of each source kind."""
+        doi = Reference.objects.create(key='doi:10.1/x', text='doi:10.1/x')
+        link = Reference.objects.create(key='url:example.org/paper', text='https://example.org/paper')
+        text = Reference.objects.create(key='text:hooker 1875', text='Hooker 1875')
+        tulsi = Plant.objects.create(scientific_name='Ocimum tenuiflorum')
+        Phytochemical.objects.filter(compound_name='Limonoid 0').update(cid='1', reference=doi)
+        Phytochemical.objects.filter(compound_name='Limonoid 1').update(reference=link)
+        tulsi.phytochemicals.create(compound_name='Limonoid 5', cid='5', reference=text)
+        tulsi.phytochemicals.create(compound_name='Limonoid 6', reference=link)
+        return tulsi
+
+    @override_settings(SEARCH_EXPENSIVE_ROWS=3, RATELIMIT_ENABLED=False)
+    def test_broad_query_filters_in_sql_without_counts(self):
+        tulsi = self.add_filter_rows()
+        with mock.patch('core.facets.facet_counts') as facet_counts, \
+                mock.patch('core.facets.get_index') as get_index:
+            response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid', 'plant': str(tulsi.pk)})
+        facet_counts.assert_not_called()
+        get_index.assert_not_called()
+        self.assertEqual(response.context['page'], 1)
+        self.assertEqual(response.context['result_count'], 2)
+        self.assertNotContains(response, 'Azadirachta indica')
+        self.assertEqual(response.context['filter_query'], f'&plant={tulsi.pk}')
+        self.assertContains(response, 'Clear filters')
+
+    def test_unindexed_filters_match_the_index(self):
+        tulsi = self.add_filter_rows()
+        snapshot.build('test')
+        snapshot.set_current('test')
+        for filters in [
+            {'plant': [tulsi.pk]},
+            {'cid': ['present']},
+            {'cid': ['absent'], 'source': ['example.org']},
+            {'source': ['doi', 'none']},
+            {'source': ['text']},
+            {'plant': [tulsi.pk], 'cid': ['absent', 'present'], 'source': ['example.org', 'text']},
+        ]:
+            for backend in ['orm', 'snapshot']:
+                with self.subTest(filters=filters, backend=backend), override_settings(SEARCH_BACKEND=backend):
+                    facets._index = None
+                    self.assertEqual(
+                        facets.filtered_rows('limonoid', filters, 10, 1, indexed=False),
+                        facets.filtered_rows('limonoid', filters, 10, 1),
+                    )
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_search_without_numpy_has_no_facets(self):
+        tulsi = self.add_filter_rows()
+        with mock.patch.object(facets, 'np', None):
+            response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid', 'plant': str(tulsi.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['facet_groups'], [])
+        self.assertEqual(response.context['result_count'], 2)
+
+    def test_throttled_client_is_not_estimated(self):
+        with mock.patch('core.ratelimit.throttle_search', return_value=2.5), \
+                mock.patch('core.querycost.estimate') as estimate:
+            response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid'})
+        estimate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertContains(response, 'try again in 3 seconds', status_code=429)
+
+    @override_settings(
+        SEARCH_EXPENSIVE_ROWS=3, SEARCH_EXPENSIVE_COST=5, RESULTS_PAGE_SIZE=2,
+        RATELIMIT_ENABLED=True, RATELIMIT_RATE=0.001, RATELIMIT_BURST=6,
+    )
+    def test_expensive_query_is_paged_and_charged(self):
+        ratelimit._search_bucket = None
+        self.addCleanup(setattr, ratelimit, '_search_bucket', None)
+        caches['ratelimit'].clear()
+
+        response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['page'], response.context['result_count']), (1, 2))
+        self.assertTrue(response.context['has_next'])
+
+        # The cached page costs one token, the uncached next page five
+        self.assertEqual(self.client.get(reverse('bmppd_result'), {'q': 'limonoid'}).status_code, 200)
+        response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid', 'page': '2'})
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_narrow_query_has_facets(self):
+        response = self.client.get(reverse('bmppd_result'), {'q': 'limonoid 3'})
+        self.assertEqual(response.context['facet_total'], 1)
+        self.assertTrue(response.context['facet_groups'])
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class FuzzyTests(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        CommonName.objects.create(plant=neem, name='Neem')
+        Phytochemical.objects.create(plant=neem, compound_name='Nimbin', cid='108058')
+        Phytochemical.objects.create(plant=neem, compound_name='Azadirone')
+
+    def test_substring_distance(self):
+        self.assertEqual(fuzzy.substring_distance('azadiracta', 'azadirachta indica', 3), 1)
+        self.assertEqual(fuzzy.substring_distance('indica', 'azadirachta indica', 3), 0)
+        self.assertIsNone(fuzzy.substring_distance('eugenol', 'azadirachta indica', 2))
+
+    def test_suggests_close_names_from_both_backends(self):
+        index = fuzzy.FuzzyIndex.from_database()
+        self.assertEqual(index.suggest('Azadiracta'), ['Azadirachta indica'])
+        self.assertEqual(index.suggest('nimbim'), ['Nimbin'])
+        self.assertEqual(index.suggest('zzzzzz'), [])
+        # Too short to have a trigram
+        self.assertEqual(index.suggest('nm'), [])
+
+        snapshot.build('test')
+        snapshot.set_current('test')
+        with override_settings(SEARCH_BACKEND='snapshot'):
+            self.assertEqual(fuzzy.suggest('Azadiracta'), ['Azadirachta indica'])
+
+    def test_zero_results_offer_suggestions(self):
+        response = self.client.get(reverse('bmppd_result'), {'q': 'Azadiracta'})
+        self.assertEqual(response.context['result_count'], 0)
+        self.assertContains(response, 'No results found')
+        self.assertContains(response, 'Did you mean:')
+        self.assertContains(response, f'<a href="{reverse("bmppd_result")}?q=Azadirachta%20indica">Azadirachta indica</a>', html=True)
+
+        response = self.client.get(reverse('bmppd_result'), {'q': 'qqqqzzzz'})
+        self.assertContains(response, 'No results found')
+        self.assertNotContains(response, 'Did you mean')
+
+
+class ImportProfileTests(TempDirTestCase):
+    CSV = (
+        "Plant Name,Common Name,Phytochemicals,CID,Reference\n"
+        "Azadirachta indica,Neem,Nimbin,108058,doi:10.1/x\n"
+        ",,Azadirachtin,5281303,\n"
+        ",,nimbin,,\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        from core.management.commands import import_csvs
+
+        data = os.path.join(self.tmp, 'data')
+        os.makedirs(data)
+        with open(os.path.join(data, 'plants.csv'), 'w', encoding='utf-8') as f:
+            f.write(self.CSV)
+        for name, value in [
+            ('DATA_DIR', data),
+            ('DETAILED_LOG_FILE', os.path.join(self.tmp, 'import.log')),
+            ('SUMMARY_LOG_FILE', os.path.join(self.tmp, 'summary.log')),
+            ('DUPLICATE_LOG_FILE', os.path.join(self.tmp, 'duplicates.log')),
+        ]:
+            patcher = mock.patch.object(import_csvs, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.phases = import_csvs.PHASES
+
+    def import_csvs(self, *args):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries, mock.patch('sys.stderr', StringIO()):
+            call_command('import_csvs', *args, stdout=out)
+        return out.getvalue().splitlines(), len(queries)
+
+    def test_phase_timer(self):
+        timer = profiling.PhaseTimer()
+        with mock.patch('time.perf_counter', side_effect=[0.0, 3.0, 10.0, 11.0]):
+            with timer.phase('parse'):
+                pass
+            with timer.phase('lookup'):
+                pass
+        other = profiling.PhaseTimer()
+        other.totals = {'lookup': 4.0}
+        timer.merge(other)
+        self.assertEqual(timer.totals, {'parse': 3.0, 'lookup': 5.0})
+        self.assertEqual(timer.report(), [
+            '      lookup:    5.000 s ( 62.5%)',
+            '       parse:    3.000 s ( 37.5%)',
+        ])
+        self.assertEqual(timer.report(['parse', 'decode'])[1], '      decode:    0.000 s (  0.0%)')
+
+        off = profiling.PhaseTimer(enabled=False)
+        with off.phase('parse'):
+            pass
+        self.assertEqual(off.totals, {})
+
+    def test_profile_reports_phases_and_queries(self):
+        lines, executed = self.import_csvs('--profile')
+        self.assertEqual(Phytochemical.objects.count(), 2)
+
+        header = [line for line in lines if line.startswith('--- PROFILE')]
+        self.assertEqual(len(header), 2)
+        self.assertRegex(header[0], r'^--- PROFILE plants\.csv: 3 rows in [\d.]+ s \(\d+ rows/sec\), \d+ queries')
+        self.assertTrue(header[1].startswith('--- PROFILE ALL FILES: 3 rows'))
+        # Every statement the import ran is counted
+        self.assertIn(f", {executed} queries ({executed / 3:.1f}/row)", header[1])
+
+        per_phase = lines[lines.index(header[0]) + 1:lines.index(header[1])]
+        self.assertEqual([line.split(':')[0].strip() for line in per_phase], self.phases)
+        self.assertAlmostEqual(sum(float(line.split('(')[1].rstrip('%)')) for line in per_phase), 100, delta=0.5)
+
+        with open(os.path.join(self.tmp, 'summary.log'), encoding='utf-8') as f:
+            self.assertIn(header[1], f.read())
+
+    def test_no_report_without_profile(self):
+        lines, _ = self.import_csvs()
+        self.assertFalse([line for line in lines if 'PROFILE' in line])
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class SimilarityTests(TempDirTestCase):
+    """
+    A: Xanthone, Yohimbine, Zeta acid   B: Xanthone, Yohimbine
+    C: Yohimbine, Zeta acid, Withanolide   D: Withanolide
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.a, self.b, self.c, self.d = (
+            Plant.objects.create(scientific_name=name) for name in ['Plant A', 'Plant B', 'Plant C', 'Plant D']
+        )
+        for plant, compounds in [
+            (self.a, [('Xanthone', '1'), ('Yohimbine', '2'), ('Zeta acid', '')]),
+            (self.b, [('Xanthone', '1'), ('Yohimbine', '2')]),
+            # No CID, so matched to A's by normalised name
+            (self.c, [('Yohimbine', '2'), ('ZETA  acid', ''), ('Withanolide', '4')]),
+            (self.d, [('Withanolide', '4')]),
+        ]:
+            for name, cid in compounds:
+                Phytochemical.objects.create(plant=plant, compound_name=name, cid=cid)
+
+    def matrices(self):
+        snapshot.build('test')
+        snap = snapshot.Snapshot(os.path.join(snapshot.snapshot_dir(), 'test' + snapshot.SUFFIX))
+        return [
+            ('database', similarity.IncidenceMatrix.from_database()),
+            ('snapshot', similarity.IncidenceMatrix.from_snapshot(snap)),
+        ]
+
+    def test_similar_plants(self):
+        for source, matrix in self.matrices():
+            with self.subTest(source=source):
+                def scores(plant, metric):
+                    return [(r['name'], r['shared'], r['score']) for r in matrix.similar_plants(plant.pk, 10, metric)]
+
+                # Jaccard: shared / |union|; cosine: shared / sqrt(|A| |B|)
+                self.assertEqual(scores(self.a, 'jaccard'), [('Plant B', 2, 0.6667), ('Plant C', 2, 0.5)])
+                self.assertEqual(scores(self.a, 'cosine'), [('Plant B', 2, 0.8165), ('Plant C', 2, 0.6667)])
+                self.assertEqual(scores(self.d, 'jaccard'), [('Plant C', 1, 0.3333)])
+                self.assertEqual(scores(self.d, 'cosine'), [('Plant C', 1, 0.5774)])
+                self.assertEqual(len(matrix.similar_plants(self.a.pk, 1)), 1)
+                with self.assertRaises(ValueError):
+                    matrix.similar_plants(self.a.pk, 10, 'euclid')
+
+    def test_cooccurring(self):
+        for source, matrix in self.matrices():
+            with self.subTest(source=source):
+                self.assertEqual(matrix.find_compound(' 2 '), 'cid:2')
+                self.assertEqual(matrix.find_compound('yohimbine'), 'cid:2')
+                self.assertEqual(matrix.find_compound('zeta ACID'), 'name:zeta acid')
+                self.assertIsNone(matrix.find_compound('Eugenol'))
+
+                # Yohimbine is in A, B, C: Xanthone and Zeta acid share two of
+                # them (Jaccard 2/3, tie broken by first seen), Withanolide
+                # one (1/4)
+                results = matrix.cooccurring('cid:2')
+                self.assertEqual(
+                    [(r['key'], r['plants'], r['jaccard']) for r in results],
+                    [('cid:1', 2, 0.6667), ('name:zeta acid', 2, 0.6667), ('cid:4', 1, 0.25)],
+                )
+                self.assertEqual(results[0]['name'], 'Xanthone')
+                # Withanolide (C, D) shares one plant with each; Zeta acid's
+                # Jaccard (1/3) beats Yohimbine's (1/4)
+                self.assertEqual(
+                    [(r['key'], r['plants'], r['jaccard']) for r in matrix.cooccurring('cid:4')],
+                    [('name:zeta acid', 1, 0.3333), ('cid:2', 1, 0.25)],
+                )
+
+    def test_similar_plants_endpoint(self):
+        url = reverse('similar_plants', args=[self.a.pk])
+        data = self.client.get(url, {'metric': 'cosine', 'k': '1'}).json()
+        self.assertEqual(data, {
+            'plant': {'id': self.a.pk, 'name': 'Plant A'},
+            'metric': 'cosine',
+            'results': [{'id': self.b.pk, 'name': 'Plant B', 'shared': 2, 'score': 0.8165}],
+        })
+        self.assertEqual(self.client.get(url, {'metric': 'euclid'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('similar_plants', args=[self.d.pk + 100])).status_code, 404)
+
+    def test_cooccurrence_endpoint(self):
+        url = reverse('compound_cooccurrence')
+        data = self.client.get(url, {'compound': 'Withanolide'}).json()
+        self.assertEqual(data['compound'], {'key': 'cid:4', 'name': 'Withanolide'})
+        self.assertEqual([(r['name'], r['plants'], r['jaccard']) for r in data['results']], [
+            ('Zeta acid', 1, 0.3333), ('Yohimbine', 1, 0.25),
+        ])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'compound': 'Eugenol'}).status_code, 404)
+
+
+class DBMaintenanceTests(TestCase):
+    def setUp(self):
+        neem = Plant.objects.create(scientific_name='Azadirachta indica')
+        Phytochemical.objects.create(plant=neem, compound_name='Nimbin', cid='108058')
+        Phytochemical.objects.create(plant=neem, compound_name='Oleic acid')
+
+    def db_maintenance(self, *args):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('db_maintenance', *args, stdout=out)
+        return out.getvalue(), [q['sql'] for q in queries]
+
+    def test_report_only_checks_and_changes_nothing(self):
+        output, executed = self.db_maintenance('--report-only')
+        self.assertFalse([sql for sql in executed if sql.upper().startswith(('ANALYZE', 'VACUUM', 'PRAGMA OPTIMIZE'))])
+
+        self.assertIn('Integrity check: ok', output)
+        self.assertRegex(output, r'\n  core_plant +[\d.]+ \w+ +1 rows\n')
+        self.assertRegex(output, r'\n  core_phytochemical +[\d.]+ \w+ +2 rows\n')
+        for label, *_ in maintenance.probe_queries():
+            self.assertIn(f"  {label}:", output)
+        # The per-row and per-page lookups are all served by indexes; only
+        # the substring search scans
+        self.assertNotIn('MISSING INDEX', output)
+        self.assertIn('is inherent to substring search', output)
+
+    def test_integrity_problems_fail_the_command(self):
+        # Foreign keys are only enforced at commit, which a TestCase never reaches
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO core_phytochemical (plant_id, compound_name, cid) VALUES (%s, 'Orphan', '')",
+                [Plant.objects.get().pk + 1000],
+            )
+        try:
+            with self.assertRaisesMessage(CommandError, '1 integrity problem(s)'):
+                self.db_maintenance('--report-only', '--quick')
+        finally:
+            Phytochemical.objects.filter(compound_name='Orphan').delete()
+
+    def test_redundant_indexes(self):
+        found = {
+            'plant_idx': ('core_phytochemical', False, ['plant_id']),
+            'plant_name_uniq': ('core_phytochemical', True, ['plant_id', 'compound_name', 'cid']),
+            'cid_idx': ('core_phytochemical', False, ['cid']),
+            'other_plant_idx': ('core_commonname', False, ['plant_id']),
+        }
+        self.assertEqual(maintenance.redundant_indexes(found), [('plant_idx', 'plant_name_uniq')])
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_synthetic_smoke_run(self):
+        # In a process of its own, as it is run: the synthetic database
+        # replaces the default one, which here is the test database
+        result = subprocess.run(
+            [
+                sys.executable, 'manage.py', 'load_test', '--synthetic-plants', '20', '--compounds-per-plant', '5',
+                '--users', '2', '--requests', '30', '--duration', '60',
+            ],
+            cwd=django_settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('Synthetic data: 20 plants, 100 phytochemicals', result.stdout)
+        rows = {line.split()[0]: line.split() for line in result.stdout.splitlines() if line.startswith('  ')}
+        self.assertEqual(set(rows), {'kind', *loadtest.SCENARIOS, 'all'})
+        self.assertEqual(int(rows['all'][1]), 30)
+        # Every request answered without an error
+        self.assertEqual(rows['all'][3], '0.0%')
@@ -6,5 +6,8 @@ urlpatterns = [
     path('bmppd_result/', views.bmppd_result, name='bmppd_result'),
     path('about/', views.about, name='about'),
     path('acknowledgement/', views.acknowledgement, name='acknowledgement'),
-    path("reference/", views.reference, name="reference"),
+    path("reference/<int:pk>/", views.reference, name="reference"),
+    path("reference/", views.reference_legacy, name="reference_legacy"),
+    path("api/plants/<int:pk>/similar/", views.similar_plants, name="similar_plants"),
+    path("api/compounds/cooccurrence/", views.compound_cooccurrence, name="compound_cooccurrence"),
 ]
@@ -0,0 +1,190 @@
+"""
+Vectorised data-quality checks for import CSVs.
+
+Each file is loaded into a pandas DataFrame and every check runs on whole
+columns at once, so validating a file costs a few passes per column rather
+than a Python loop per row. Nothing here touches the database.
+
+Errors reject a row (it is written to the rejected-rows file); warnings
+are only reported.
+"""
+import os
+import warnings
+from collections import namedtuple
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover - optional dependency
+    pd = None
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import detect_encoding
+
+REPORT_DIR = os.path.join(settings.BASE_DIR, 'validation')
+
+COLUMNS = ['plant name', 'common name', 'phytochemicals', 'cid', 'reference']
+
+# check -> (severity, description)
+CHECKS = {
+    'missing_column': ('error', "required column missing"),
+    'invalid_cid': ('error', "CID is not a positive integer"),
+    'multiple_cids': ('error', "more than one CID in the cell"),
+    'orphan_row': ('error', "continuation row before any plant name"),
+    'duplicate': ('warning', "compound (ignoring case) listed earlier for this plant; import_csvs keeps the first"),
+    'near_duplicate': ('warning', "compound differs from an earlier one only by case, spacing or punctuation"),
+    'no_compound': ('warning', "row has data but no compound; the import skips it"),
+    'encoding_artefact': ('warning', "text looks mis-decoded (mojibake, U+FFFD or control characters)"),
+}
+
+MULTIPLE_CIDS_RE = r'^\d+(?:\s*[,;/|&]\s*\d+|\s+\d+)+$'
+ARTEFACT_RE = 'Ã[\u0080-¿]|Â[\u0080-¿ ]|â€|�|[\x00-\x08\x0b\x0c\x0e-\x1f]'
+
+ValidationResult = namedtuple('ValidationResult', ['path', 'frame', 'issues', 'rejected'])
+
+
+def require_pandas():
+    if pd is None:
+        raise ImproperlyConfigured("CSV validation needs pandas: pip install pandas")
+
+
+def load_frame(path):
+    """
+    The CSV at ``path`` as an all-string frame with lowercased headers,
+    NBSP/whitespace stripped and a ``line`` column (file line, assuming no
+    embedded newlines). Missing optional columns are added empty.
+    """
+    require_pandas()
+    with warnings.catch_warnings():
+        # Rows with more fields than the header would otherwise be truncated
+        warnings.simplefilter('error', pd.errors.ParserWarning)
+        try:
+            frame = pd.read_csv(
+                path, dtype=str, keep_default_na=False, encoding=detect_encoding(path),
+                skip_blank_lines=False, index_col=False,
+            )
+        except pd.errors.ParserWarning as e:
+            raise ValueError(str(e))
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    for column in frame.columns:
+        frame[column] = frame[column].str.replace('\xa0', '', regex=False).str.strip()
+    frame.insert(0, 'line', range(2, len(frame) + 2))
+    return frame
+
+
+def _issues(frame, mask, check, column):
+    hits = frame.loc[mask, ['line', column]]
+    return pd.DataFrame({
+        'line': hits['line'],
+        'column': column,
+        'check': check,
+        'severity': CHECKS[check][0],
+        'value': hits[column],
+    })
+
+
+def validate_frame(frame):
+    """
+    Run every check on ``frame`` (from ``load_frame``). Returns a frame of
+    issues with ``line, column, check, severity, value``, ordered by line.
+    """
+    found = []
+
+    missing = [c for c in ('plant name', 'phytochemicals') if c not in frame.columns]
+    if missing:
+        return pd.DataFrame({
+            'line': 1, 'column': missing, 'check': 'missing_column',
+            'severity': 'error', 'value': '',
+        })
+    for column in COLUMNS:
+        if column not in frame.columns:
+            frame[column] = ''
+
+    text = frame[COLUMNS]
+    blank = (text == '').all(axis=1)
+    compound = frame['phytochemicals']
+    has_compound = compound != ''
+
+    # CID format
+    cid = frame['cid']
+    multiple = cid.str.fullmatch(MULTIPLE_CIDS_RE)
+    invalid = (cid != '') & ~cid.str.fullmatch(r'[1-9]\d*') & ~multiple
+    found.append(_issues(frame, has_compound & multiple, 'multiple_cids', 'cid'))
+    found.append(_issues(frame, has_compound & invalid, 'invalid_cid', 'cid'))
+
+    # Plant carry-forward: continuation rows take the last named plant
+    plant = frame['plant name'].mask(frame['plant name'] == '').ffill()
+    found.append(_issues(frame, has_compound & plant.isna(), 'orphan_row', 'phytochemicals'))
+    found.append(_issues(frame, ~has_compound & ~blank, 'no_compound', 'phytochemicals'))
+
+    # Duplicates within the file, per carried-forward plant
+    keyed = pd.DataFrame({
+        'plant': plant.fillna(''),
+        'name': compound.str.casefold(),
+        'loose': compound.str.casefold().str.replace(r'[\W_]+', '', regex=True),
+        'compound': compound,
+    })[has_compound]
+    # Same key as import_csvs' per-plant compound_name__iexact lookup,
+    # whatever the CID. CSVUpload imports get_or_create the exact
+    # (plant, name, CID) instead, so there each spelling or CID gets a row
+    duplicate = keyed.duplicated(['plant', 'name'])
+    first_spelling = keyed.groupby(['plant', 'loose'])['compound'].transform('first')
+    near = ~duplicate & (keyed['compound'] != first_spelling)
+    found.append(_issues(frame, duplicate.reindex(frame.index, fill_value=False), 'duplicate', 'phytochemicals'))
+    found.append(_issues(frame, near.reindex(frame.index, fill_value=False), 'near_duplicate', 'phytochemicals'))
+
+    # Encoding artefacts in any text column
+    for column in COLUMNS:
+        found.append(_issues(frame, frame[column].str.contains(ARTEFACT_RE, regex=True), 'encoding_artefact', column))
+
+    issues = pd.concat(found, ignore_index=True)
+    return issues.sort_values(['line', 'check'], kind='stable').reset_index(drop=True)
+
+
+def validate_csv(path):
+    """Load and check one file; ``rejected`` holds the rows with errors."""
+    frame = load_frame(path)
+    issues = validate_frame(frame)
+
+    if (issues['check'] == 'missing_column').any():
+        # Without the key columns no row can be imported
+        rejected = frame.assign(issues='missing_column')
+        return ValidationResult(path, frame, issues, rejected)
+
+    errors = issues[issues['severity'] == 'error']
+    reasons = errors.groupby('line')['check'].agg('; '.join)
+    rejected = frame[frame['line'].isin(reasons.index)].copy()
+    rejected['issues'] = rejected['line'].map(reasons)
+    return ValidationResult(path, frame, issues, rejected)
+
+
+def summary(result):
+    """One line per check that fired: ``check (severity): count - description``."""
+    counts = result.issues['check'].value_counts()
+    return [
+        f"{check} ({CHECKS[check][0]}): {int(counts[check])} - {CHECKS[check][1]}"
+        for check in CHECKS if check in counts
+    ]
+
+
+def write_reports(result, out_dir):
+    """
+    Write ``<name>.issues.csv`` and, if any row was rejected,
+    ``<name>.rejected.csv`` to ``out_dir``. Returns the paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(result.path))[0]
+
+    written = [os.path.join(out_dir, f"{stem}.issues.csv")]
+    result.issues.to_csv(written[0], index=False)
+
+    rejected_path = os.path.join(out_dir, f"{stem}.rejected.csv")
+    if not result.rejected.empty:
+        result.rejected.to_csv(rejected_path, index=False)
+        written.append(rejected_path)
+    elif os.path.exists(rejected_path):
+        # Left over from an earlier run of a since-fixed file
+        os.remove(rejected_path)
+    return written
@@ -1,7 +1,4 @@
 from django.shortcuts import render
-from django.db.models import Q
-from .models import Phytochemical
-from django.db.models import Count
 
 def bmppd(request):
     return render(request, 'core/bmppd.html')
@@ -41,52 +38,133 @@ def bmppd(request):
 
 
 
-from django.shortcuts import render
-from django.db.models import Q, Prefetch
-from .models import Phytochemical
+import hashlib
+import math
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.cache import get_conditional_response
+from .models import Reference
+from .references import normalize_reference
+from .rendering import cached_result_table, result_table
+from . import facets, fuzzy, querycost, ratelimit, releases, similarity
+
+def _release_etag(view):
+    """Answer repeat GETs with 304 until the release (see core.releases) changes."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        etag = releases.etag(request)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+    return wrapped
+
+def _facet_groups(query, filters, counts):
+    """
+    ``[(title, [(label, count, selected, href)])]`` for the facet sidebar;
+    each href toggles its value and goes back to the first page.
+    """
+    groups = []
+    for facet, title in facets.FACETS.items():
+        links = []
+        for value, label, count in counts[facet]:
+            selected = value in filters.get(facet, [])
+            values = [v for v in filters.get(facet, []) if v != value] if selected else filters.get(facet, []) + [value]
+            toggled = {**filters, facet: values}
+            href = f"?{urlencode({'q': query})}{facets.querystring({f: v for f, v in toggled.items() if v})}"
+            links.append((label, count, selected, href))
+        if links:
+            groups.append((title, links))
+    return groups
+
+def _throttled_search(request, query, wait):
+    response = render(
+        request, 'core/bmppd_result.html',
+        {
+            'query': query,
+            'throttled': True,
+            'warnings': [f"Too many searches. Please try again in {math.ceil(wait)} seconds."],
+        },
+        status=429,
+    )
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
 
+@_release_etag
 def bmppd_result(request):
     query = request.GET.get('q', '').strip()
-    results = []
+    page = request.GET.get('page', '')
+    page = int(page) if page.isdigit() and int(page) > 0 else None
+    filters = facets.parse_filters(request.GET)
+    result_count = 0
+    result_rows = ''
+    has_next = False
+    facet_total = 0
+    facet_groups = []
+    uncounted_filters = False
+    suggestions = []
     warnings = []
-    max_results = 800
 
     # Check if query is too short
     if not query or len(query) < 4:
         warnings.append("Too short query to search.")
     else:
-        # Filter the queryset
-        qs = (
-            Phytochemical.objects
-            .filter(
-                Q(plant__scientific_name__icontains=query) |
-                Q(plant__common_names__name__icontains=query) |
-                Q(compound_name__icontains=query) |
-                Q(cid__icontains=query)
-            )
-            .select_related('plant')
-            .prefetch_related(Prefetch('plant__common_names'))
-            .distinct()[:max_results]
-        )
-
-        # Prepare results
-        for p in qs:
-            common_name = ", ".join(c.name for c in p.plant.common_names.all())
-            results.append({
-                'plant_name': p.plant.scientific_name,
-                'common_name': common_name,
-                'compound_name': p.compound_name,
-                'cid': p.cid,
-                'reference': p.reference,
-            })
+        # Charge a plain search before anything else, so throttled clients
+        # can't make the worker estimate (and maybe rebuild the cost model)
+        wait = ratelimit.throttle_search(request)
+        if wait:
+            return _throttled_search(request, query, wait)
+
+        expensive = querycost.estimate(query) > settings.SEARCH_EXPENSIVE_ROWS
+        # Facet counts need numpy and the id of every match; from the tables
+        # that is the full scan paging avoids, so broad queries get no
+        # counts there and their filters are applied in SQL instead
+        faceted = facets.available() and (not expensive or releases.live_snapshot() is not None)
+        uncounted_filters = bool(filters) and not faceted
+
+        # Queries estimated to match many rows are served a page at a time
+        # and, unless that page is cached, cost the rest of their tokens
+        if expensive:
+            page = page or 1
+        table = cached_result_table(query, page, filters)
+        if table is None and expensive:
+            wait = ratelimit.throttle_search(request, settings.SEARCH_EXPENSIVE_COST - 1)
+            if wait:
+                return _throttled_search(request, query, wait)
+
+        result_count, result_rows, has_next = table or result_table(query, page, filters, indexed=faceted)
+
+        if faceted and (result_count or filters):
+            facet_total, counts = facets.facet_counts(query, filters)
+            facet_groups = _facet_groups(query, filters, counts)
+
+        # Nothing matched: offer close spellings instead
+        if not result_count and not page and not filters:
+            suggestions = fuzzy.suggest(query)
 
         # Warn if results hit the limit
-        # if len(results) == max_results:
-        #     warnings.append(f"Showing only the first {max_results} results. Please refine your search to see more.")
+        # if len(results) == MAX_RESULTS:
+        #     warnings.append(f"Showing only the first {MAX_RESULTS} results. Please refine your search to see more.")
 
     context = {
         'query': query,
-        'results': results,
+        'result_count': result_count,
+        'result_rows': result_rows,
+        'page': page,
+        'has_next': has_next,
+        'first_row': (page - 1) * settings.RESULTS_PAGE_SIZE + 1 if page else 1,
+        'filter_query': facets.querystring(filters),
+        'facet_total': facet_total,
+        'facet_groups': facet_groups,
+        'uncounted_filters': uncounted_filters,
+        'suggestions': suggestions,
         'warnings': warnings,
     }
 
@@ -102,8 +180,17 @@ def bmppd_result(request):
 
 
 
-def reference(request):
+def reference(request, pk):
+    ref = get_object_or_404(Reference, pk=pk)
+    return render(request, 'core/reference.html', {'reference': ref.text})
+
+def reference_legacy(request):
+    # Old result pages linked with the full reference text in ?ref=
     ref = request.GET.get("ref", "")
+    key = normalize_reference(ref)
+    pk = Reference.objects.filter(key=key).values_list('id', flat=True).first() if key else None
+    if pk is not None:
+        return redirect('reference', pk=pk)
     return render(request, 'core/reference.html', {'reference': ref})
 
 def about(request):
@@ -129,6 +216,72 @@ def acknowledgement(request):
     )
 
 
-
-
-
+# ---------- SIMILARITY API ----------
+
+def _top_k(request):
+    k = request.GET.get('k', '')
+    return min(int(k), 100) if k.isdigit() and int(k) > 0 else 10
+
+
+def _throttled_json(request):
+    wait = ratelimit.throttle_search(request)
+    if not wait:
+        return None
+    response = JsonResponse({'error': "Too many requests"}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def similar_plants(request, pk):
+    """Plants with the most similar compound profile to plant ``pk``."""
+    metric = request.GET.get('metric', 'jaccard')
+    if metric not in similarity.METRICS:
+        return JsonResponse({'error': f"metric must be one of {', '.join(similarity.METRICS)}"}, status=400)
+    k = _top_k(request)
+
+    throttled = _throttled_json(request)
+    if throttled:
+        return throttled
+
+    key = f"similar:{releases.release_id()}:{pk}:{metric}:{k}"
+    data = cache.get(key)
+    if data is None:
+        matrix = similarity.get_matrix()
+        if pk not in matrix.plant_index:
+            raise Http404("No such plant")
+        data = {
+            'plant': {'id': pk, 'name': matrix.plant_names[matrix.plant_index[pk]]},
+            'metric': metric,
+            'results': matrix.similar_plants(pk, k, metric),
+        }
+        cache.set(key, data, settings.RESULTS_CACHE_TIMEOUT)
+    return JsonResponse(data)
+
+
+def compound_cooccurrence(request):
+    """Compounds most often found in the same plants as ``?compound=`` (CID or name)."""
+    text = request.GET.get('compound', '').strip()
+    if not text:
+        return JsonResponse({'error': "compound is required"}, status=400)
+    k = _top_k(request)
+
+    throttled = _throttled_json(request)
+    if throttled:
+        return throttled
+
+    matrix = similarity.get_matrix()
+    compound = matrix.find_compound(text)
+    if compound is None:
+        raise Http404("No such compound")
+
+    # Name keys can hold spaces, which memcached keys may not
+    digest = hashlib.sha1(compound.encode('utf-8')).hexdigest()
+    key = f"cooccurrence:{releases.release_id()}:{digest}:{k}"
+    data = cache.get(key)
+    if data is None:
+        data = {
+            'compound': {'key': compound, 'name': matrix.compound_labels[matrix.compound_index[compound]]},
+            'results': matrix.cooccurring(compound, k),
+        }
+        cache.set(key, data, settings.RESULTS_CACHE_TIMEOUT)
+    return JsonResponse(data)
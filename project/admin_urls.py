@@ -0,0 +1,12 @@
+"""
+Admin URLconf, imported on the first request under /admin/ rather than at
+worker start (see project/urls.py). Admin modules are discovered here
+because INSTALLED_APPS uses project.apps.LazyAdminConfig, which skips
+autodiscovery at startup.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+app_name = 'admin'
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,23 @@
+from django.contrib.admin.apps import SimpleAdminConfig
+from django.contrib.admin.checks import check_admin_app, check_dependencies
+from django.core import checks
+
+
+def check_discovered_admin(app_configs, **kwargs):
+    """check_admin_app, after loading the admin modules it would check."""
+    from django.contrib import admin
+
+    admin.autodiscover()
+    return check_admin_app(app_configs)
+
+
+class LazyAdminConfig(SimpleAdminConfig):
+    """
+    Admin without autodiscovery at startup (admin_urls.py loads the
+    ModelAdmins on the first admin request). System checks, which web
+    workers never run, still discover and check them.
+    """
+
+    def ready(self):
+        checks.register(check_dependencies, checks.Tags.admin)
+        checks.register(check_discovered_admin, checks.Tags.admin)
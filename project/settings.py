@@ -42,7 +42,9 @@ else:
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Skips admin autodiscovery at startup (project/urls.py loads the admin
+    # lazily) but not in system checks
+    'project.apps.LazyAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -58,6 +60,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ChangeSourceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,13 +71,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR/'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates are parsed once per process in every environment;
+            # runserver's autoreloader clears the cache when one changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -140,9 +150,71 @@ else:
     MEDIA_ROOT = BASE_DIR / 'media'
 
 STATICFILES_DIRS = [BASE_DIR/'static']
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# STATICFILES_STORAGE is ignored since Django 5.1; STORAGES replaces it
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 ####
 
+# Serve jQuery/Bootstrap/DataTables/Font Awesome from static/vendor (fetched
+# by `vendor_assets`) instead of the public CDNs
+SELF_HOSTED_ASSETS = env.bool('SELF_HOSTED_ASSETS', default=False)
+
+# Search backend: 'snapshot' answers from the memory-mapped snapshot of the
+# release published by `publish_release`; 'orm' queries the live tables on
+# every search, so it serves half-imported and failed uploads and is only for
+# development. Until a release is published 'snapshot' falls back to the
+# live tables too; both cases are reported by `manage.py check`
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='snapshot')
+SNAPSHOT_DIR = env('SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+
+# publish_release refuses releases that would drop more than this share of
+# the current release's plants or phytochemicals (override with --force)
+RELEASE_MAX_SHRINK = env.float('RELEASE_MAX_SHRINK', default=0.2)
+
+# Stamp file rewritten on every data change (see core.dataversion); shared
+# by all workers so in-process indexes know when to rebuild
+DATA_VERSION_FILE = env('DATA_VERSION_FILE', default=str(BASE_DIR / '.data_version'))
+
+
+# Rendered search result tables are cached per query and release;
+# rate-limit buckets stay in each worker's memory
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ratelimit',
+    },
+}
+RESULTS_CACHE_TIMEOUT = env.int('RESULTS_CACHE_TIMEOUT', default=600)
+
+# Search rate limit: a bucket of RATELIMIT_BURST tokens per client, refilled
+# at RATELIMIT_RATE tokens/second. Set RATELIMIT_CLIENT_HEADER (e.g.
+# 'HTTP_X_FORWARDED_FOR') when behind a reverse proxy
+RATELIMIT_ENABLED = env.bool('RATELIMIT_ENABLED', default=True)
+RATELIMIT_RATE = env.float('RATELIMIT_RATE', default=0.5)
+RATELIMIT_BURST = env.int('RATELIMIT_BURST', default=20)
+RATELIMIT_CLIENT_HEADER = env('RATELIMIT_CLIENT_HEADER', default='')
+
+# Searches estimated (core.querycost) to match more rows than this cost
+# SEARCH_EXPENSIVE_COST tokens and are paginated unless already cached
+SEARCH_EXPENSIVE_ROWS = env.int('SEARCH_EXPENSIVE_ROWS', default=5000)
+SEARCH_EXPENSIVE_COST = env.int('SEARCH_EXPENSIVE_COST', default=5)
+RESULTS_PAGE_SIZE = env.int('RESULTS_PAGE_SIZE', default=200)
+
+
+# Rows per transaction (and checkpoint) when importing a CSVUpload
+CSV_IMPORT_CHUNK_SIZE = env.int('CSV_IMPORT_CHUNK_SIZE', default=1000)
+# Validate CSVUploads first (needs pandas; see validate_csvs) and import
+# nothing from a file with rejected rows, like `import_csvs --validate`
+CSV_UPLOAD_VALIDATE = env.bool('CSV_UPLOAD_VALIDATE', default=False)
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -192,6 +264,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'core': {
+            'handlers': ['file'],
+            'level': 'ERROR',
+            'propagate': True,
+        },
     },
 }
 
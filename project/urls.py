@@ -1,11 +1,37 @@
-from django.contrib import admin
-from django.urls import path, include
+from django.urls import URLResolver, include, path
+from django.urls.resolvers import RoutePattern
 from django.conf.urls.static import static
 from django.conf import settings
 
+
+class LazyURLResolver(URLResolver):
+    """
+    Namespaced include whose URLconf is imported on first use. The root
+    resolver populates every child when anything is reversed; this one
+    skips that until its own namespace is reversed or a path under it is
+    resolved.
+
+    This overrides URLResolver internals, not public API; core.tests
+    reverses and resolves every named URL through it, so a Django upgrade
+    that changes them fails the tests rather than breaking links.
+    """
+
+    def _populate(self):
+        if 'urlconf_module' in self.__dict__:
+            super()._populate()
+
+    @property
+    def reverse_dict(self):
+        self.urlconf_module
+        return super().reverse_dict
+
+
+def lazy_include(route, urlconf, namespace):
+    return LazyURLResolver(RoutePattern(route), urlconf, app_name=namespace, namespace=namespace)
+
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Public traffic never imports django.contrib.admin's views or the ModelAdmins
+    lazy_include('admin/', 'project.admin_urls', 'admin'),
     path('', include('core.urls')), 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Load the URLconf and compile templates now, so the first request doesn't
+# pay for them
+from core.startup import warm  # noqa: E402
+warm()
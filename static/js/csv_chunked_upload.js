@@ -0,0 +1,72 @@
+// Upload large CSVs to the admin in resumable chunks instead of one request.
+(function () {
+    var CHUNK_SIZE = 4 * 1024 * 1024;
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var form = document.getElementById('csvupload_form');
+        var input = form && form.querySelector('input[type=file][name=file]');
+        if (!input || !input.dataset.chunkUrl || !window.fetch) {
+            return;
+        }
+        // Set by CSVUploadAdmin.get_form
+        var endpoint = input.dataset.chunkUrl;
+        var uploadPk = input.dataset.uploadPk;
+        var csrf = form.querySelector('input[name=csrfmiddlewaretoken]').value;
+
+        function post(data) {
+            data.append('csrfmiddlewaretoken', csrf);
+            return fetch(endpoint, {method: 'POST', body: data, credentials: 'same-origin'});
+        }
+
+        async function upload(file) {
+            // One id per file, so a reload can resume the same partial upload
+            var key = 'csvupload:' + file.name + ':' + file.size + ':' + file.lastModified;
+            var id = localStorage.getItem(key);
+            if (!id) {
+                id = crypto.randomUUID().replace(/-/g, '');
+                localStorage.setItem(key, id);
+            }
+
+            var res = await fetch(endpoint + '?upload_id=' + id, {credentials: 'same-origin'});
+            var offset = (await res.json()).offset;
+
+            while (offset < file.size) {
+                var data = new FormData();
+                data.append('upload_id', id);
+                data.append('offset', offset);
+                data.append('chunk', file.slice(offset, offset + CHUNK_SIZE));
+                res = await post(data);
+                if (!res.ok && res.status !== 409) {
+                    throw new Error('Chunk upload failed: ' + res.status);
+                }
+                offset = (await res.json()).offset;
+                input.title = Math.round(100 * offset / file.size) + '% uploaded';
+            }
+
+            var done = new FormData();
+            done.append('upload_id', id);
+            done.append('filename', file.name);
+            done.append('complete', '1');
+            if (uploadPk) {
+                done.append('upload_pk', uploadPk);
+            }
+            res = await post(done);
+            if (!res.ok) {
+                throw new Error('Completing upload failed: ' + res.status);
+            }
+            localStorage.removeItem(key);
+            window.location = (await res.json()).url;
+        }
+
+        form.addEventListener('submit', function (event) {
+            var file = input.files[0];
+            if (!file || file.size <= CHUNK_SIZE) {
+                return;
+            }
+            event.preventDefault();
+            upload(file).catch(function (err) {
+                alert(err.message + '. Submit again to resume.');
+            });
+        });
+    });
+})();